@@ -5,30 +5,42 @@ Exposes shared utilities for searching and downloading files from Libgen
 along with CLI/GUI entry points.
 """
 
-from .config import BASE_URL, SESSION, set_proxy  # noqa: F401
-from .search import search, smart_search, filter_results  # noqa: F401
-from .download import (  # noqa: F401
-    build_filename_from_result,
-    clean_filename,
-    download_file_from_get_url,
-    download_for_result,
-    fetch_download_link_from_page,
-)
-from .pipeline import process_single_item  # noqa: F401
-from .errors import DownloadError  # noqa: F401
-
-__all__ = [
-    "BASE_URL",
-    "SESSION",
-    "set_proxy",
-    "search",
-    "smart_search",
-    "filter_results",
-    "build_filename_from_result",
-    "clean_filename",
-    "download_file_from_get_url",
-    "download_for_result",
-    "fetch_download_link_from_page",
-    "process_single_item",
-    "DownloadError",
-]
+from importlib import import_module
+
+# search 既是子模块名又是导出的函数：子模块一旦被导入（例如 cli 导入 .search），导入系统会把包属性
+# search 绑定为模块，因此在这里先导入并把函数绑定回去
+from .search import search  # noqa: F401
+
+# 公开名称 -> 所在子模块，首次访问时才导入（PEP 562），导入包本身或 libgen-cli --help 不加载其后的模块
+_EXPORTS = {
+    "BASE_URL": "config",
+    "SESSION": "config",
+    "set_proxy": "config",
+    "smart_search": "search",
+    "filter_results": "search",
+    "SearchResult": "results",
+    "build_filename_from_result": "download",
+    "clean_filename": "download",
+    "download_file_from_get_url": "download",
+    "download_for_result": "download",
+    "fetch_download_link_from_page": "download",
+    "process_single_item": "pipeline",
+    "DownloadError": "errors",
+    "SearchCancelled": "errors",
+    "BUS": "events",
+}
+
+__all__ = ["search", *_EXPORTS]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
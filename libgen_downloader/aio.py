@@ -0,0 +1,572 @@
+"""
+Optional asyncio engine (aiohttp) for search, resolve and download.
+"""
+
+import asyncio
+import shutil
+from http.client import IncompleteRead
+from pathlib import Path
+from threading import Event
+from urllib.parse import urljoin
+
+from .config import BASE_URL, DEFAULT_HEADERS, ENGINES, get_proxy
+from .download import (
+    LINK_CACHE,
+    Transfer,
+    accept_download,
+    extract_download_link,
+    link_resolved,
+    mirror_failed,
+    plan_entries,
+)
+from .diskspace import DISK_SPACE, WAIT_INTERVAL
+from .errors import DownloadError, InsufficientSpace, SearchError, TransferStalled
+from .events import (
+    CandidateTried,
+    DiskSpaceWait,
+    FallbackLevel,
+    ItemDone,
+    ItemStarted,
+    MirrorTried,
+    ResolveFailed,
+    SearchDone,
+    SearchFailed,
+    SearchStarted,
+    StageError,
+    emit,
+    item_logger,
+)
+from .metrics import METRICS, host_of
+from .pipeline import (
+    candidate_failed,
+    candidate_succeeded,
+    candidates_failed,
+    candidates_from_search,
+    md5_candidates,
+    negative_key,
+    search_params,
+    skip_negative,
+)
+from .results import SearchResult
+from .search import (
+    PLANNER,
+    SEARCH_CACHE,
+    SEARCH_TIMEOUT,
+    build_search_params,
+    filter_results,
+    parse_search_results,
+    search_cache_key,
+)
+from .stall import StallPolicy, policy_from_args
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _require_aiohttp():
+    try:
+        import aiohttp  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("需要安装 aiohttp 才能使用 asyncio 引擎（pip install aiohttp）") from e
+    return aiohttp
+
+
+def _cancelled(cancel_event) -> bool:
+    return cancel_event is not None and cancel_event.is_set()
+
+
+class AsyncEngine:
+    """
+    asyncio 版的搜索/解析/下载。需在 async with 中使用（负责创建/关闭 aiohttp 会话）：
+        async with AsyncEngine(max_connections=256) as engine:
+            path = await engine.download_for_result(result, out_dir="downloads")
+    cancel_event 可以是 threading.Event 或 asyncio.Event（只调用 is_set()）。
+    各步骤的判定与线程版共用（download.Transfer、plan_entries/accept_download 以及 pipeline 中的候选处理），
+    这里只实现网络 I/O，发出相同的事件和指标；一个事件循环驱动数百个连接，而不是每个传输一个线程。
+    """
+
+    def __init__(self, max_connections: int = 256, limit_per_host: int = 0, proxy: str | None = None):
+        self.aiohttp = _require_aiohttp()
+        self.max_connections = max_connections
+        self.limit_per_host = limit_per_host
+        # 默认沿用全局代理设置（--proxy / LIBGEN_PROXY）
+        self.proxy = proxy if proxy is not None else get_proxy()
+        self.session = None
+        self._inflight: dict = {}
+
+    async def __aenter__(self):
+        connector = self.aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.limit_per_host)
+        self.session = self.aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        return False
+
+    @property
+    def network_errors(self):
+        return (self.aiohttp.ClientError, asyncio.TimeoutError)
+
+    # --- 搜索 ---
+    async def search(
+        self,
+        query: str,
+        limit: int = 25,
+        columns=None,
+        objects=None,
+        topics=None,
+        order=None,
+        ordermode=None,
+        filesuns: str = "all",
+        use_cache: bool = True,
+        stop_after: int | None = None,
+        plan=None,
+    ) -> list:
+        """与 search.search 相同：plan 带有下推条件时先按 plan.req 搜索，没有结果再按原查询重新搜索。"""
+        args = (limit, columns, objects, topics, order, ordermode, filesuns, use_cache, stop_after)
+        if plan is not None and plan.pushed:
+            try:
+                results = await self._search_req(plan.req, *args)
+                if results:
+                    PLANNER.check(plan, results)
+                    return results
+                plan.retried = True
+                results = await self._search_req(query, *args)
+                PLANNER.check_retry(plan, results)
+                return results
+            finally:
+                PLANNER.release(plan)
+        return await self._search_req(query, *args)
+
+    async def _search_req(self, req, limit, columns, objects, topics, order, ordermode, filesuns, use_cache, stop_after) -> list:
+        params = build_search_params(req, limit, columns, objects, topics, order, ordermode, filesuns)
+        cache_key = search_cache_key(params)
+        if stop_after:
+            cache_key += (("stop_after", stop_after),)
+        if use_cache:
+            cached = SEARCH_CACHE.get(cache_key)
+            if cached is not None:
+                METRICS.inc("search", host=host_of(BASE_URL), outcome="cached")
+                return [SearchResult.from_tuple(t) for t in cached]
+
+        url = urljoin(BASE_URL, "/index.php")
+        host = host_of(url)
+        query_items = [(k, v) for k, values in params.items() for v in (values if isinstance(values, (list, tuple)) else [values])]
+        timeout = self.aiohttp.ClientTimeout(sock_connect=SEARCH_TIMEOUT[0], sock_read=SEARCH_TIMEOUT[1])
+        outcome = "error"
+        try:
+            with METRICS.timer("search", host=host):
+                with METRICS.timer("search_ttfb", host=host):
+                    resp = await self.session.get(url, params=query_items, timeout=timeout, proxy=self.proxy)
+                async with resp:
+                    resp.raise_for_status()
+                    html = await resp.text(errors="replace")
+                    METRICS.inc("search_bytes", resp.content_length or len(html), host=host)
+                results = parse_search_results(html)
+                if stop_after:
+                    results = results[:stop_after]
+            outcome = "ok" if results else "empty"
+        finally:
+            METRICS.inc("search", host=host, outcome=outcome)
+        METRICS.inc("search_rows", len(results), host=host)
+        if use_cache:
+            SEARCH_CACHE.set(cache_key, [r.to_tuple() for r in results])
+        return results
+
+    async def smart_search(
+        self,
+        query: str,
+        limit: int = 25,
+        columns=None,
+        objects=None,
+        topics=None,
+        order=None,
+        ordermode=None,
+        filesuns: str = "all",
+        language=None,
+        ext=None,
+        year_min=None,
+        year_max=None,
+        author=None,
+        author_exact: bool = False,
+        logger=None,
+        stop_after: int | None = None,
+        raise_errors: bool = False,
+    ) -> list:
+        """
+        与 search.smart_search 相同的回退顺序：原始参数 → 忽略年份（Level 1）→ 再忽略扩展名（Level 3）。
+        raise_errors=True 时搜索请求失败抛出 SearchError，而不是返回空列表。
+        """
+        level = 0
+        while True:
+            emit(SearchStarted(query, level, language, ext, year_min, year_max, author), logger=logger)
+            plan = PLANNER.plan(query, columns, language, ext, year_min, year_max)
+            try:
+                results = await self.search(
+                    query, limit, columns, objects, topics, order, ordermode, filesuns, stop_after=stop_after, plan=plan
+                )
+            except self.network_errors as e:
+                emit(SearchFailed(query, level, e), logger=logger)
+                emit(SearchDone(query, level, "error", pushed=plan.effective))
+                if raise_errors:
+                    raise SearchError(f"搜索请求失败：{e}") from e
+                return []
+            if not results:
+                emit(SearchDone(query, level, "empty", pushed=plan.effective))
+                return []
+
+            filtered = filter_results(
+                results,
+                language=language,
+                ext=ext,
+                year_min=year_min,
+                year_max=year_max,
+                author=author,
+                author_exact=author_exact,
+            )
+            if not filtered and level < 3:
+                emit(SearchDone(query, level, "filtered_out", raw=len(results), pushed=plan.effective))
+                emit(FallbackLevel(query, level), logger=logger)
+                year_min = year_max = None
+                if level == 1:
+                    ext = None
+                level = 1 if level == 0 else 3
+                continue
+            emit(
+                SearchDone(
+                    query,
+                    level,
+                    "hit" if filtered else "filtered_out",
+                    raw=len(results),
+                    matched=len(filtered),
+                    pushed=plan.effective,
+                )
+            )
+            return filtered
+
+    # --- 入口页解析 ---
+    async def fetch_download_link(self, entry_url: str):
+        host = host_of(entry_url)
+        outcome = "error"
+        timeout = self.aiohttp.ClientTimeout(sock_connect=SEARCH_TIMEOUT[0], sock_read=SEARCH_TIMEOUT[1])
+        try:
+            with METRICS.timer("resolve", host=host):
+                async with self.session.get(entry_url, timeout=timeout, proxy=self.proxy) as resp:
+                    resp.raise_for_status()
+                    if not resp.headers.get("Content-Type", "").lower().startswith("text/html"):
+                        link = str(resp.url)
+                    else:
+                        link = extract_download_link(await resp.text(errors="replace"), str(resp.url))
+            outcome = "ok" if link else "no_link"
+            return link
+        finally:
+            METRICS.inc("resolve", host=host, outcome=outcome)
+
+    async def resolve_download_link(self, entry_url: str, md5=None):
+        """带 LINK_CACHE 的解析；同一入口的并发解析合并为一次请求，网络错误不缓存。"""
+        hit, link = LINK_CACHE.lookup(entry_url, md5)
+        if hit:
+            return link
+        key = LINK_CACHE.key(entry_url, md5)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        task = asyncio.ensure_future(self.fetch_download_link(entry_url))
+        self._inflight[key] = task
+        try:
+            link = await asyncio.shield(task)
+            LINK_CACHE.store(entry_url, md5, link)
+            return link
+        finally:
+            self._inflight.pop(key, None)
+
+    # --- 下载 ---
+    async def _reserve(self, paths, nbytes, cancel_event=None, logger=None):
+        """DISK_SPACE.reserve 的异步版本：空间不足时让出事件循环轮询，而不是阻塞线程。"""
+        waited = False
+        while True:
+            reservation = DISK_SPACE.try_reserve(paths, nbytes)
+            if reservation is not None:
+                return reservation
+            if _cancelled(cancel_event):
+                raise DownloadError("下载已被取消")
+            if not waited:
+                waited = True
+                emit(DiskSpaceWait(str(paths[0]), max(0, nbytes or 0), shutil.disk_usage(paths[0]).free), logger=logger)
+            await asyncio.sleep(WAIT_INTERVAL)
+
+    async def download_file(
+        self,
+        get_url: str,
+        out_dir=".",
+        filename=None,
+        max_retries: int = 3,
+        timeout: int = 60,
+        logger=None,
+        progress_cb=None,
+        cancel_event=None,
+        temp_dir=None,
+        md5=None,
+        stall: StallPolicy | None = None,
+        expected_size: int | None = None,
+    ) -> str:
+        """
+        与 download_file_from_get_url 相同：.part 续传（给出 md5 时要求一致），网络/5xx 重试，4xx 直接失败，
+        速度持续过低时抛出 TransferStalled 并保留 .part，取消时删除临时文件。
+        续传、状态码、预留、记账与发布的判定都在 download.Transfer 中，这里只负责请求与读写；
+        aiohttp 的分块读取有数据即返回，停滞检查直接在读取循环中进行。空间不足时等待（不占用线程）或抛出 InsufficientSpace。
+        """
+        transfer = Transfer(get_url, out_dir, filename, temp_dir, md5, stall, expected_size, logger, progress_cb)
+        client_timeout = self.aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+        cancelled = False
+        reservation = await self._reserve(transfer.reserve_paths, expected_size, cancel_event, logger)
+        try:
+            transfer.claim(reservation)
+            for attempt in range(1, max_retries + 1):
+                try:
+                    headers = transfer.begin_attempt(attempt)
+                    with METRICS.timer("transfer_ttfb", host=transfer.host):
+                        resp = await self.session.get(get_url, headers=headers or None, timeout=client_timeout, proxy=self.proxy)
+                    async with resp:
+                        retry = transfer.check_status(resp.status)
+                        if retry is not None:
+                            if retry:
+                                continue
+                            break
+                        mode = transfer.begin_body(resp.headers, resp.status)
+                        with open(transfer.temp_path, mode) as f:
+                            transfer.open_part(f)
+                            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                                if _cancelled(cancel_event):
+                                    raise asyncio.CancelledError()
+                                f.write(chunk)
+                                transfer.feed(len(chunk))
+                        transfer.check_complete()
+
+                    # 同一文件系统上只是 link + unlink；暂存目录只能放在别的磁盘时会复制，放到线程里执行
+                    return await asyncio.to_thread(transfer.publish)
+                except TransferStalled as e:
+                    transfer.stalled(e)
+                    break
+                except InsufficientSpace as e:
+                    transfer.error(e, "no_space")
+                    break
+                except (*self.network_errors, IncompleteRead) as e:
+                    transfer.error(e, type(e).__name__)
+                    continue
+                except OSError as e:
+                    no_space = transfer.write_failed(e)
+                    if no_space is None:
+                        raise
+                    transfer.error(no_space, "no_space")
+                    break
+                except asyncio.CancelledError:
+                    # 取消（cancel_event 或任务被取消）：与线程版一致，删除未完成的临时文件
+                    cancelled = True
+                    transfer.last_exc = DownloadError("下载已被取消")
+                    transfer.discard()
+                    if not _cancelled(cancel_event):
+                        METRICS.inc("transfer", host=transfer.host, outcome="cancelled")
+                        raise
+                    break
+                finally:
+                    transfer.end_attempt()
+
+            transfer.raise_failure(cancelled)
+        finally:
+            transfer.close()
+
+    async def download_for_result(
+        self,
+        result: dict,
+        out_dir=".",
+        max_entry_urls: int = 5,
+        max_get_retries: int = 3,
+        logger=None,
+        progress_cb=None,
+        cancel_event=None,
+        stall: StallPolicy | None = None,
+    ) -> str:
+        """与 download.download_for_result 相同：依次尝试入口，解析、下载并校验，失败则换下一个镜像。"""
+        filename, expected_ext, entries = plan_entries(result, max_entry_urls, logger=logger)
+        last_err = None
+        for i, entry_url in enumerate(entries):
+            emit(MirrorTried(i + 1, entry_url), logger=logger)
+            try:
+                get_url = await self.resolve_download_link(entry_url, result.get("md5"))
+            except self.network_errors as e:
+                emit(ResolveFailed(entry_url, e), logger=logger)
+                last_err = e
+                continue
+            if not link_resolved(entry_url, get_url, logger=logger):
+                continue
+
+            try:
+                path = await self.download_file(
+                    get_url,
+                    out_dir=out_dir,
+                    filename=filename,
+                    max_retries=max_get_retries,
+                    logger=logger,
+                    progress_cb=progress_cb,
+                    cancel_event=cancel_event,
+                    temp_dir=Path(out_dir) / ".partial",
+                    md5=result.get("md5"),
+                    stall=stall,
+                    expected_size=result.get("size_bytes"),
+                )
+            except InsufficientSpace:
+                raise
+            except DownloadError as e:
+                mirror_failed(entry_url, result, e, logger=logger)
+                last_err = e
+                if _cancelled(cancel_event):
+                    break
+                continue
+            if accept_download(path, entry_url, result, expected_ext, logger=logger):
+                return path
+
+        raise DownloadError(f"该条目所有尝试的镜像/入口均下载失败: {last_err}")
+
+    # --- 条目 ---
+    async def process_item(self, item: dict, args, logger=None, cancel_event=None) -> dict:
+        """
+        搜索并下载一个批量条目，写入 status/path（与 BatchPipeline 的条目格式相同）。
+        条目带 md5 时跳过搜索，带 isbn 时只在 ISBN 列搜索；各步骤的判定与 pipeline 的线程版共用。
+        """
+        query = item["query"]
+        md5 = item.get("md5")
+        emit(ItemStarted(query), logger=logger)
+        key = negative_key(
+            query,
+            args,
+            item.get("language"),
+            item.get("ext"),
+            item.get("year_min"),
+            item.get("year_max"),
+            item.get("author"),
+            item.get("author_exact"),
+            md5=md5,
+            isbn=item.get("isbn"),
+        )
+        if skip_negative(query, args, key=key, logger=logger):
+            item["status"] = "skipped"
+            return item
+        if md5:
+            candidates = md5_candidates(query, md5, args, ext=item.get("ext"), logger=logger)
+        else:
+            try:
+                filtered = await self.smart_search(**self._search_params(item, args), logger=logger)
+            except SearchError as e:
+                # 镜像故障不是“没有结果”，不记入 NEGATIVE_CACHE
+                item["status"] = "failed"
+                item["error"] = str(e)
+                emit(ItemDone(query, "failed", error=str(e)), logger=logger)
+                return item
+            candidates = candidates_from_search(
+                filtered, query, args, key, author=item.get("author"), ext=item.get("ext"), cancel_event=cancel_event, logger=logger
+            )
+            if not candidates:
+                item["status"] = "not_found"
+                return item
+            if skip_negative(query, args, candidates=candidates, logger=logger):
+                item["status"] = "skipped"
+                return item
+
+        exhausted = True
+        for pos, chosen in enumerate(candidates):
+            emit(CandidateTried(pos + 1, chosen["title"] or chosen.get("_fallback_title", "")), logger=logger)
+            try:
+                path = await self.download_for_result(
+                    chosen,
+                    out_dir=args.out_dir,
+                    max_entry_urls=args.max_entry_urls,
+                    max_get_retries=args.max_retries,
+                    logger=logger,
+                    cancel_event=cancel_event,
+                    stall=policy_from_args(args),
+                )
+            except DownloadError as e:
+                if candidate_failed(chosen, e, cancel_event, logger=logger):
+                    exhausted = False
+                    break
+                continue
+            candidate_succeeded(chosen, query, path, logger=logger)
+            item["status"] = "success"
+            item["path"] = path
+            return item
+
+        item["status"] = candidates_failed(candidates, query, exhausted, cancel_event, logger=logger)
+        return item
+
+    @staticmethod
+    def _search_params(item: dict, args) -> dict:
+        return search_params(
+            item["query"],
+            args,
+            item.get("language"),
+            item.get("ext"),
+            item.get("year_min"),
+            item.get("year_max"),
+            item.get("author"),
+            item.get("author_exact"),
+            isbn=item.get("isbn"),
+        )
+
+    async def run_batch(self, items, args, concurrency: int = 64, logger=None, cancel_event=None) -> list[dict]:
+        """
+        以 concurrency 个并发条目处理批量任务，返回写入了 status/path 的条目列表。
+        与 BatchPipeline 一样通过有界队列逐条读入条目（在途条目不超过 concurrency 的两倍），大 CSV 不会一次性建出全部任务。
+        """
+        concurrency = max(1, concurrency)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        fed = []
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                await self._run_item(item, args, logger, cancel_event)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            for item in items:
+                if _cancelled(cancel_event):
+                    break
+                item.setdefault("seq", len(fed) + 1)
+                fed.append(item)
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        return fed
+
+    async def _run_item(self, item: dict, args, logger=None, cancel_event=None) -> None:
+        log = item_logger(item.get("seq"), logger)
+        if _cancelled(cancel_event):
+            item["status"] = "cancelled"
+            emit(ItemDone(item["query"], "cancelled"), logger=log)
+            return
+        try:
+            await self.process_item(item, args, logger=log, cancel_event=cancel_event)
+        except Exception as e:  # noqa: BLE001
+            item["status"] = "cancelled" if _cancelled(cancel_event) else "failed"
+            item["error"] = str(e)
+            emit(StageError("async", item["query"], e), logger=log)
+            emit(ItemDone(item["query"], item["status"]))
+
+
+def run_batch(items, args, concurrency: int = 64, logger=None, cancel_event: Event | None = None) -> list[dict]:
+    """同步入口：在新的事件循环中用 AsyncEngine 处理批量条目（连接池上限随并发数放大）。"""
+
+    async def main():
+        async with AsyncEngine(max_connections=max(100, concurrency * 2)) as engine:
+            return await engine.run_batch(items, args, concurrency=concurrency, logger=logger, cancel_event=cancel_event)
+
+    return asyncio.run(main())
+
+
+__all__ = ["ENGINES", "AsyncEngine", "run_batch"]
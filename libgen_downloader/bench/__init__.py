@@ -0,0 +1,3 @@
+"""
+Benchmark tooling: a local Libgen stand-in server and load/micro benchmarks.
+"""
@@ -0,0 +1,147 @@
+"""
+Import-time budget for CLI startup (python -X importtime).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PACKAGE = "libgen_downloader"
+# (名称, 导入语句, 默认预算毫秒)；延迟导入前 cli 约 220 ms，预算给慢机器留有余量
+TARGETS = [
+    ("cli", f"import {PACKAGE}.cli", 150.0),
+    ("package", f"import {PACKAGE}", 60.0),
+    ("clean_filename", f"from {PACKAGE} import clean_filename", 120.0),
+]
+# 只应在真正需要时才加载的模块（顶层包名）
+HEAVY_MODULES = ("requests", "urllib3", "bs4", "asyncio", "aiohttp", "PyQt6")
+# 导入 cli 并访问全部延迟导出后，公开名称不能变成同名子模块（如 search 函数被 search 模块遮蔽）
+EXPORTS_CHECK = f"""
+import types
+import {PACKAGE}.cli
+import {PACKAGE} as pkg
+shadowed = [n for n in pkg.__all__ if isinstance(getattr(pkg, n), types.ModuleType)]
+shadowed += [n for n in pkg.__all__ if isinstance(getattr(__import__("{PACKAGE}", fromlist=[n]), n), types.ModuleType)]
+print(",".join(sorted(set(shadowed))))
+"""
+
+
+def _env() -> dict:
+    root = str(Path(__file__).resolve().parents[2])
+    path = os.environ.get("PYTHONPATH")
+    env = dict(os.environ, PYTHONPATH=f"{root}{os.pathsep}{path}" if path else root)
+    # 需要写出 .pyc，否则每次都在重新编译源码，量到的不是安装后的启动耗时
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def parse_importtime(stderr: str) -> tuple[float, set]:
+    """
+    解析 -X importtime 的输出，返回 (本包顶层导入的累计毫秒数, 加载过的全部模块名)。
+    顶层导入指缩进最浅的行（由 -c 语句直接触发，或 PEP 562 __getattr__ 中的延迟导入）。
+    """
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # 表头
+        name = parts[2].rstrip()
+        module = name.strip()
+        modules.add(module)
+        top_level = len(name) - len(name.lstrip()) <= 1
+        if top_level and (module == PACKAGE or module.startswith(f"{PACKAGE}.")):
+            total_us += int(parts[1])
+    return total_us / 1000, modules
+
+
+def measure_import(statement: str, repeat: int) -> tuple[list, set]:
+    """在 repeat 个新解释器中执行 statement，返回 (每次的毫秒数, 加载过的模块名并集)。第一次运行只用于生成 .pyc，不计时。"""
+    times = []
+    modules = set()
+    for i in range(repeat + 1):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            env=_env(),
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"导入失败：{statement}\n{proc.stderr[-2000:]}")
+        ms, loaded = parse_importtime(proc.stderr)
+        if i:
+            times.append(ms)
+        modules |= loaded
+    return times, modules
+
+
+def measure_help(repeat: int) -> list:
+    """libgen-cli --help 的端到端耗时（毫秒，含解释器启动）。"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", f"{PACKAGE}.cli", "--help"], env=_env(), stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def check_exports() -> list:
+    """返回被同名子模块遮蔽的公开名称（应为空）。"""
+    proc = subprocess.run([sys.executable, "-c", EXPORTS_CHECK], env=_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"导出检查失败\n{proc.stderr[-2000:]}")
+    return [name for name in proc.stdout.strip().split(",") if name]
+
+
+def main(argv=None):
+    """
+    每个目标在新解释器中导入并取中位数；超出预算、加载了 HEAVY_MODULES 或公开名称被同名子模块遮蔽时退出码为 1。
+    脚本会成千上万次调用 libgen-cli，argparse 运行前的导入耗时会累积起来。
+    """
+    parser = argparse.ArgumentParser(prog="libgen-importbench", description="CLI 启动导入耗时预算（python -X importtime）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个目标的运行次数（取中位数），默认 5")
+    parser.add_argument("--budget-ms", type=float, help="统一的预算毫秒数，覆盖各目标的默认预算")
+    parser.add_argument("--only", nargs="+", help="只运行名称包含任一子串的目标")
+    parser.add_argument("--no-help", action="store_true", help="不测量 libgen-cli --help 的端到端耗时")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'目标':<18}{'中位数 ms':>12}{'最小 ms':>10}{'预算 ms':>10}")
+    for name, statement, budget in TARGETS:
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        budget = args.budget_ms if args.budget_ms is not None else budget
+        times, modules = measure_import(statement, max(1, args.repeat))
+        median = statistics.median(times)
+        flag = ""
+        if median > budget:
+            flag = "  <-- 超出预算"
+            failed = True
+        print(f"{name:<18}{median:>12.1f}{min(times):>10.1f}{budget:>10.1f}{flag}")
+        heavy = sorted({m.split(".")[0] for m in modules} & set(HEAVY_MODULES))
+        if heavy:
+            print(f"[!] {name} 加载了应延迟导入的模块：{', '.join(heavy)}")
+            failed = True
+
+    shadowed = check_exports()
+    if shadowed:
+        print(f"[!] 公开名称被同名子模块遮蔽：{', '.join(shadowed)}")
+        failed = True
+
+    if not args.no_help:
+        times = measure_help(max(1, args.repeat))
+        print(f"{'cli --help（端到端）':<18}{statistics.median(times):>12.1f}{min(times):>10.1f}")
+
+    if failed:
+        print("[!] 启动导入超出预算")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
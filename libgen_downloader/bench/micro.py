@@ -0,0 +1,156 @@
+"""
+Micro-benchmarks for the pure-Python hot paths (parsing, filtering, filename building).
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+from .server import render_index_page
+
+# (名称, 查询词/标题, 作者列表)
+SCRIPTS = [
+    ("latin", "Structure and Interpretation of Computer Programs", ["Harold Abelson; Gerald Jay Sussman", "Donald E. Knuth", "Brian W. Kernighan, Dennis M. Ritchie"]),
+    ("cjk", "深入理解计算机系统 第三版", ["兰德尔·E·布莱恩特; 大卫·R·奥哈拉伦", "龚奕利 / 贺莲", "周志明"]),
+    ("cyrillic", "Война и мир. Полное собрание сочинений", ["Лев Николаевич Толстой", "Фёдор Достоевский; Антон Чехов", "Михаил Булгаков"]),
+    ("long", "A Very Long Title " * 12 + "(Proceedings of the International Conference on Extremely Verbose Naming, Volume 3)", ["Author With A Quite Long Name; Second Author With A Long Name / Third Author"]),
+]
+SIZES = [10, 100, 500]
+
+
+def build_corpus():
+    """生成 {名称: HTML} 的固定语料：每种文字 × 每种页面大小。"""
+    corpus = {}
+    for name, query, authors in SCRIPTS:
+        for rows in SIZES:
+            corpus[f"{name}-{rows}"] = render_index_page(query, rows, authors=authors)
+    return corpus
+
+
+def _measure(func, units: int, min_time: float, repeat: int) -> float:
+    """多轮计时取最快一轮，返回每秒处理的单元数（行/文件名等）。"""
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter() - t0)
+    return units * loops / best if best > 0 else float("inf")
+
+
+def run_benchmarks(min_time: float = 0.2, repeat: int = 3, only=None) -> dict:
+    """在固定语料上测量 parse_search_results / filter_results / build_filename_from_result / clean_filename，返回 {名称: 每秒次数}。"""
+    from ..download import build_filename_from_result, clean_filename
+    from ..search import filter_results, parse_search_results
+
+    results = {}
+
+    def bench(name, func, units):
+        if only and not any(pattern in name for pattern in only):
+            return
+        results[name] = _measure(func, units, min_time, repeat)
+
+    for page_name, html in build_corpus().items():
+        rows = parse_search_results(html)
+        n = len(rows)
+        script = page_name.split("-")[0]
+        author = next(a for s, _q, authors in SCRIPTS if s == script for a in authors[:1])
+        first_author = author.split(";")[0].split(",")[0].split("/")[0].strip()
+
+        bench(f"parse/{page_name}", lambda html=html: parse_search_results(html), n)
+        bench(f"filter_author_contains/{page_name}", lambda rows=rows, a=first_author: filter_results(rows, author=a), n)
+        bench(
+            f"filter_author_exact/{page_name}",
+            lambda rows=rows, a=first_author: filter_results(rows, author=a, author_exact=True),
+            n,
+        )
+        bench(
+            f"filter_lang_ext_year/{page_name}",
+            lambda rows=rows: filter_results(rows, language="english", ext="pdf", year_min=2000, year_max=2020),
+            n,
+        )
+        bench(f"build_filename/{page_name}", lambda rows=rows: [build_filename_from_result(r) for r in rows], n)
+
+    for script, query, _authors in SCRIPTS:
+        name = query * 2
+        bench(f"clean_filename/{script}", lambda name=name: clean_filename(name), 1)
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """返回 (报告行, 是否存在回退)；吞吐低于 baseline × (1 - threshold) 视为回退。"""
+    lines = []
+    regressed = False
+    for name, value in sorted(current.items()):
+        base = baseline.get(name)
+        if not base:
+            lines.append(f"{name:<45}{value:>14,.0f}{'':>14}   (新增)")
+            continue
+        ratio = value / base
+        flag = ""
+        if ratio < 1 - threshold:
+            flag = "  <-- 回退"
+            regressed = True
+        lines.append(f"{name:<45}{value:>14,.0f}{base:>14,.0f}{ratio:>8.2f}x{flag}")
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="libgen-microbench", description="解析/筛选/文件名构建的微基准（单位：每秒处理数）")
+    parser.add_argument("--save-baseline", metavar="PATH", help="把本次结果保存为基线 JSON")
+    parser.add_argument("--compare", metavar="PATH", help="与基线 JSON 对比，吞吐回退超过阈值时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=0.15, help="允许的吞吐下降比例，默认 0.15")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮最少计时秒数，默认 0.2")
+    parser.add_argument("--repeat", type=int, default=3, help="计时轮数（取最快），默认 3")
+    parser.add_argument("--only", nargs="+", help="只运行名称包含任一子串的基准")
+    parser.add_argument("--dump-corpus", metavar="DIR", help="把生成的语料页面写入目录后退出")
+    args = parser.parse_args(argv)
+
+    if args.dump_corpus:
+        out = Path(args.dump_corpus)
+        out.mkdir(parents=True, exist_ok=True)
+        for name, html in build_corpus().items():
+            (out / f"{name}.html").write_text(html, encoding="utf-8")
+        print(f"[*] 语料已写入 {out}")
+        return
+
+    current = run_benchmarks(min_time=args.min_time, repeat=args.repeat, only=args.only)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressed = compare(current, baseline.get("results", {}), args.threshold)
+        print(f"{'基准':<45}{'当前/s':>14}{'基线/s':>14}{'比值':>9}")
+        print("\n".join(lines))
+        if regressed:
+            print(f"[!] 存在超过 {args.threshold:.0%} 的吞吐回退")
+            sys.exit(1)
+    else:
+        for name, value in sorted(current.items()):
+            print(f"{name:<45}{value:>14,.0f}/s")
+
+    if args.save_baseline:
+        payload = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": current,
+        }
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        print(f"[*] 基线已保存到 {args.save_baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+End-to-end load benchmark: drives the real CLI against the local stand-in server.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .server import StandInServer, add_config_arguments, config_from_args
+
+PHASES = ["search", "resolve", "transfer"]
+
+
+def percentile(samples, pct: float) -> float:
+    """最近秩法百分位数；无样本时返回 0。"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def peak_rss_bytes() -> int | None:
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="libgen-bench",
+        description="在本地 stand-in 服务器上运行完整 CLI 流程并统计吞吐/分阶段延迟。未识别的参数原样传给 libgen-cli。",
+        epilog="示例：libgen-bench --items 100 --latency 0.05 --bandwidth 2000000 -- --pipeline --transfer-workers 4",
+    )
+    parser.add_argument("--items", type=int, default=50, help="批量条目数（生成的 CSV 行数），默认 50")
+    parser.add_argument("--json", help="把报告另存为 JSON 文件")
+    parser.add_argument("--keep", action="store_true", help="保留临时下载目录")
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=["thread", "async"],
+        help="依次用不同执行引擎（libgen-cli --engine）运行同一批条目并对比，例如 --engines thread async",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    add_config_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, cli_args = parser.parse_known_args(argv)
+    if cli_args[:1] == ["--"]:
+        cli_args = cli_args[1:]
+
+    if args.child:
+        _run_child(args.child, cli_args)
+        return
+
+    if args.engines:
+        reports = []
+        for engine in args.engines:
+            print(f"== engine: {engine} ==")
+            reports.append(run_once(args, [*cli_args, "--engine", engine]))
+            print()
+        print_comparison(args.engines, reports)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(dict(zip(args.engines, reports)), f, ensure_ascii=False, indent=2)
+        return
+
+    report = run_once(args, cli_args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def run_once(args, cli_args) -> dict:
+    """
+    启动 stand-in 服务器，在子进程中运行一次 CLI 并返回（同时打印）报告。
+    服务器留在本进程，CLI 通过 LIBGEN_BASE_URL 指向它，峰值内存和耗时不受服务器影响。
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="libgen-bench-"))
+    csv_path = workdir / "items.csv"
+    out_dir = workdir / "downloads"
+    report_path = workdir / "report.json"
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["书名"])
+        for i in range(args.items):
+            writer.writerow([f"bench item {i}"])
+
+    with StandInServer(config_from_args(args)) as server:
+        env = dict(os.environ, LIBGEN_BASE_URL=server.base_url, LIBGEN_CACHE_DIR=str(workdir / "cache"))
+        cmd = [
+            sys.executable,
+            "-m",
+            "libgen_downloader.bench.runner",
+            "--child",
+            str(report_path),
+            "--",
+            "--csv",
+            str(csv_path),
+            "-o",
+            str(out_dir),
+            *cli_args,
+        ]
+        started = time.perf_counter()
+        proc = subprocess.run(cmd, env=env)
+        elapsed = time.perf_counter() - started
+        server_requests = dict(server.requests)
+        server_bytes = server.bytes_sent
+
+    if proc.returncode != 0 or not report_path.exists():
+        print(f"[!] 基准子进程失败（退出码 {proc.returncode}），临时目录: {workdir}")
+        sys.exit(proc.returncode or 1)
+
+    with open(report_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    report["items"] = args.items
+    report["process_wall_s"] = elapsed
+    report["server"] = {"requests": server_requests, "bytes_sent": server_bytes}
+    report["cli_args"] = cli_args
+
+    print_report(report)
+    if not args.keep:
+        import shutil
+
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(report: dict) -> None:
+    wall = report["wall_s"] or 1e-9
+    print(f"条目: {report['items']}  成功: {report['succeeded']}  耗时: {report['wall_s']:.2f}s")
+    print(f"吞吐: {report['succeeded'] / wall:.2f} items/s  {report['bytes'] / wall / 1024 / 1024:.2f} MB/s")
+    print(f"{'阶段':<10}{'次数':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for phase in PHASES:
+        stats = report["phases"][phase]
+        print(f"{phase:<10}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+    rss = report.get("peak_rss_bytes")
+    print(f"峰值 RSS: {rss / 1024 / 1024:.1f} MB" if rss else "峰值 RSS: 不可用")
+
+
+def print_comparison(names, reports) -> None:
+    print(f"{'引擎':<10}{'成功':>6}{'耗时 s':>10}{'items/s':>10}{'MB/s':>8}{'峰值 RSS MB':>14}{'transfer p95 ms':>18}")
+    for name, report in zip(names, reports):
+        wall = report["wall_s"] or 1e-9
+        rss = report.get("peak_rss_bytes")
+        print(
+            f"{name:<10}{report['succeeded']:>6}{report['wall_s']:>10.2f}{report['succeeded'] / wall:>10.2f}"
+            f"{report['bytes'] / wall / 1024 / 1024:>8.2f}{(rss / 1024 / 1024 if rss else 0):>14.1f}"
+            f"{report['phases']['transfer']['p95'] * 1000:>18.1f}"
+        )
+
+
+def _run_child(report_path: str, cli_args) -> None:
+    from .. import cli
+    from ..metrics import METRICS
+
+    METRICS.enable()
+    sys.argv = ["libgen-cli", *cli_args]
+    started = time.perf_counter()
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        cli.main()
+    wall = time.perf_counter() - started
+
+    phases = {}
+    for phase in PHASES:
+        values = METRICS.samples(phase)
+        phases[phase] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+    report = {
+        "wall_s": wall,
+        "succeeded": int(METRICS.counter_total("items", outcome="success")),
+        "bytes": int(METRICS.counter_total("transfer_bytes")),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "phases": phases,
+        "metrics": METRICS.snapshot(),
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+Local stand-in for the Libgen endpoints (index.php, ads.php, get.php) used by the benchmarks.
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+EXTENSIONS = ["pdf", "epub", "djvu", "mobi"]
+LANGUAGES = ["English", "Chinese", "Russian", "German"]
+# slow-loris 模式下每秒发送的字节数
+SLOW_LORIS_BYTES = 32
+PAYLOAD_MAGIC = {"pdf": b"%PDF-1.4\n", "epub": b"PK\x03\x04", "mobi": b"BOOKMOBI", "djvu": b"AT&TFORM"}
+# 带 ext:/lang:/year: 条件的查询从这么多倍于每页行数的候选中筛选，模拟服务器端索引
+CORPUS_FACTOR = 8
+_FILTER_RE = re.compile(r'\b(ext|lang|year):("[^"]*"|\S+)')
+
+
+class StandInConfig:
+    """
+    stand-in 服务器行为参数（延迟、带宽、Range 支持、故障注入）。概率类参数取值 0~1，对每个请求独立抽样。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        bandwidth: int = 0,
+        rows: int = 25,
+        min_size: int = 64 * 1024,
+        max_size: int = 2 * 1024 * 1024,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        truncate_rate: float = 0.0,
+        html_error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        seed: int = 0,
+        pushdown: bool = True,
+    ):
+        self.latency = latency  # 每个请求在响应头之前的延迟（秒）
+        self.bandwidth = bandwidth  # 每个连接的字节/秒上限，0 表示不限速
+        self.rows = rows  # index.php 每页最多返回的行数（同时受 res 参数限制）
+        self.min_size = min_size
+        self.max_size = max_size
+        self.error_rate = error_rate  # 返回 5xx 的概率
+        self.throttle_rate = throttle_rate  # 返回 429 的概率
+        self.truncate_rate = truncate_rate  # get.php 只发送一半内容后断开的概率
+        self.html_error_rate = html_error_rate  # get.php 返回 200 + HTML 错误页的概率
+        self.slow_rate = slow_rate  # get.php 发送四分之一内容后降到每秒几十字节（slow-loris 镜像）的概率
+        self.seed = seed
+        self.pushdown = pushdown  # 是否支持查询串中的 ext:/lang:/year: 条件；不支持时当作普通关键词（没有结果）
+
+
+def md5_for(query: str, i: int) -> str:
+    return hashlib.md5(f"{query}\x00{i}".encode("utf-8")).hexdigest()
+
+
+def payload_size(md5: str, config: StandInConfig) -> int:
+    span = max(0, config.max_size - config.min_size)
+    return config.min_size + (int(md5[:8], 16) % (span + 1))
+
+
+def payload_extension(md5: str) -> str:
+    return EXTENSIONS[int(md5[8:10], 16) % len(EXTENSIONS)]
+
+
+def payload_bytes(md5: str, start: int, end: int) -> bytes:
+    """返回确定性文件内容的 [start, end) 片段：开头是扩展名对应的魔数，其余为重复的 md5。"""
+    magic = PAYLOAD_MAGIC[payload_extension(md5)]
+    filler = md5.encode("ascii")
+    out = bytearray()
+    pos = start
+    while pos < end:
+        if pos < len(magic):
+            out += magic[pos : min(end, len(magic))]
+            pos = min(end, len(magic))
+            continue
+        offset = (pos - len(magic)) % len(filler)
+        take = min(end - pos, len(filler) - offset)
+        out += filler[offset : offset + take]
+        pos += take
+    return bytes(out)
+
+
+def human_size(n: int) -> str:
+    if n >= 1024 * 1024:
+        return f"{n / 1024 / 1024:.0f} MB"
+    return f"{max(1, n // 1024)} kB"
+
+
+def split_filters(query: str) -> tuple[str, dict]:
+    """把查询串拆成关键词与 ext:/lang:/year: 条件。"""
+    filters = {name: value.strip('"') for name, value in _FILTER_RE.findall(query or "")}
+    return " ".join(_FILTER_RE.sub(" ", query or "").split()), filters
+
+
+def _row_matches(ext: str, lang: str, year: int, filters: dict) -> bool:
+    if "ext" in filters and ext != filters["ext"].lower():
+        return False
+    if "lang" in filters and lang.lower() != filters["lang"].lower():
+        return False
+    if "year" in filters:
+        lo, _sep, hi = filters["year"].partition("-")
+        try:
+            if lo and year < int(lo):
+                return False
+            if (hi and year > int(hi)) or (not _sep and year != int(lo)):
+                return False
+        except ValueError:
+            return False
+    return True
+
+
+def render_index_page(query: str, rows: int, config: StandInConfig | None = None, authors=None, filters=None) -> str:
+    """
+    生成与 Libgen index.php 结构一致的结果页（table#tablelibgen，9 列）。
+    authors 可提供作者名列表（按行轮换），默认为 "Author n; Co Author m"。
+    filters（见 split_filters）给出时只输出满足条件的行，直到凑满 rows 行或扫完 rows × CORPUS_FACTOR 个候选；
+    同一行的 md5 与不带条件时相同。
+    """
+    config = config or StandInConfig()
+    words = query or "book"
+    out = [
+        "<html><head><title>Library Genesis</title></head><body>",
+        '<table id="tablelibgen" class="table table-striped"><thead><tr>',
+        "".join(f"<th>{h}</th>" for h in ["Title", "Author(s)", "Publisher", "Year", "Language", "Pages", "Size", "Ext.", "Mirrors"]),
+        "</tr></thead><tbody>",
+    ]
+    emitted = 0
+    for i in range(rows * CORPUS_FACTOR if filters else rows):
+        if emitted >= rows:
+            break
+        md5 = md5_for(query, i)
+        ext = payload_extension(md5)
+        lang = LANGUAGES[int(md5[10:12], 16) % len(LANGUAGES)]
+        year = 1990 + int(md5[12:14], 16) % 35
+        if filters and not _row_matches(ext, lang, year, filters):
+            continue
+        emitted += 1
+        title = escape(f"{words} volume {i}")
+        out.append(
+            "<tr>"
+            f'<td><a href="index.php?req={escape(words)}&amp;columns%5B%5D=t">{title}</a>'
+            f' <font color="green"><i>ISBN: 978{int(md5[:6], 16):07d}</i></font>'
+            f' <span class="badge">{ext}</span> <a href="edition.php?id={i + 1}">e</a></td>'
+            f"<td>{escape(authors[i % len(authors)]) if authors else f'Author {i % 7}; Co Author {i % 3}'}</td>"
+            f"<td>Publisher {i % 5}</td>"
+            f"<td>{year}</td>"
+            f"<td>{lang}</td>"
+            f"<td>{100 + int(md5[14:16], 16)}</td>"
+            f'<td><a href="file.php?id={int(md5[:6], 16)}">{human_size(payload_size(md5, config))}</a></td>'
+            f"<td>{ext}</td>"
+            f'<td><a href="/ads.php?md5={md5}" title="libgen">[1]</a>'
+            f' <a href="/book/{md5}" title="mirror">[2]</a></td>'
+            "</tr>"
+        )
+    out.append("</tbody></table></body></html>")
+    return "\n".join(out)
+
+
+def render_ads_page(md5: str) -> str:
+    return (
+        "<html><body><table><tr><td>"
+        f'<a href="/get.php?md5={md5}&amp;key=K{md5[:8].upper()}"><h2>GET</h2></a>'
+        "</td></tr></table></body></html>"
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "LibgenStandIn/1.0"
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def do_HEAD(self):
+        self._dispatch(head=True)
+
+    def do_GET(self):
+        self._dispatch(head=False)
+
+    def _dispatch(self, head: bool):
+        server: StandInServer = self.server.owner  # type: ignore[attr-defined]
+        config = server.config
+        url = urlparse(self.path)
+        qs = parse_qs(url.query)
+        server.count(url.path)
+
+        if config.latency:
+            time.sleep(config.latency)
+        if server.chance(config.throttle_rate):
+            return self._send_simple(429, b"Too Many Requests", "text/plain", head, {"Retry-After": "1"})
+        if server.chance(config.error_rate):
+            return self._send_simple(503, b"Service Unavailable", "text/plain", head)
+
+        if url.path == "/index.php":
+            query = (qs.get("req") or [""])[0]
+            try:
+                res = int((qs.get("res") or ["25"])[0])
+            except ValueError:
+                res = 25
+            terms, filters = split_filters(query)
+            if filters and not config.pushdown:
+                terms, res = query, 0  # 不认识的语法当作关键词：没有匹配
+            body = render_index_page(terms, min(res, config.rows), config, filters=filters).encode("utf-8")
+            return self._send_simple(200, body, "text/html; charset=utf-8", head, throttle=True)
+        if url.path == "/ads.php" or url.path.startswith("/book/"):
+            md5 = (qs.get("md5") or [url.path[len("/book/") :]])[0].lower()
+            if not re.fullmatch(r"[0-9a-f]{32}", md5):
+                return self._send_simple(404, b"not found", "text/plain", head)
+            return self._send_simple(200, render_ads_page(md5).encode("utf-8"), "text/html; charset=utf-8", head)
+        if url.path == "/get.php":
+            md5 = (qs.get("md5") or [""])[0].lower()
+            if not re.fullmatch(r"[0-9a-f]{32}", md5):
+                return self._send_simple(404, b"not found", "text/plain", head)
+            if server.chance(config.html_error_rate):
+                body = b"<html><body><h1>Error</h1><p>Download limit reached</p></body></html>"
+                return self._send_simple(200, body, "text/html; charset=utf-8", head)
+            return self._send_payload(md5, head)
+        return self._send_simple(404, b"not found", "text/plain", head)
+
+    def _send_simple(self, status, body: bytes, content_type: str, head: bool, extra=None, throttle=False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (extra or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if not head:
+            self._write(body, throttle=throttle)
+
+    def _send_payload(self, md5: str, head: bool):
+        server: StandInServer = self.server.owner  # type: ignore[attr-defined]
+        total = payload_size(md5, server.config)
+        start, end = 0, total
+        status = 200
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", "").strip())
+        if m:
+            start = int(m.group(1))
+            end = min(total, int(m.group(2)) + 1) if m.group(2) else total
+            if start >= total:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{total}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        ext = payload_extension(md5)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Disposition", f'attachment; filename="{md5}.{ext}"')
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{total}")
+        self.end_headers()
+        if head:
+            return
+
+        stop = end
+        if server.chance(server.config.truncate_rate):
+            stop = start + (end - start) // 2
+            self.close_connection = True
+        slow_from = start + (end - start) // 4 if server.chance(server.config.slow_rate) else None
+        pos = start
+        while pos < stop:
+            if slow_from is not None and pos >= slow_from:
+                # 连接不断、偶尔有数据：读超时永远不会触发
+                block = payload_bytes(md5, pos, min(stop, pos + SLOW_LORIS_BYTES))
+                time.sleep(1)
+            else:
+                block = payload_bytes(md5, pos, min(stop, pos + 64 * 1024, slow_from or stop))
+            if not self._write(block, throttle=True):
+                return
+            pos += len(block)
+            server.add_bytes(len(block))
+
+    def _write(self, data: bytes, throttle: bool) -> bool:
+        bandwidth = self.server.owner.config.bandwidth  # type: ignore[attr-defined]
+        step = 16 * 1024 if (throttle and bandwidth) else len(data) or 1
+        try:
+            for i in range(0, len(data), step):
+                piece = data[i : i + step]
+                self.wfile.write(piece)
+                if throttle and bandwidth:
+                    time.sleep(len(piece) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return False
+        return True
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # 默认 backlog 只有 5，asyncio 引擎的数百个并发连接会被丢弃 SYN 后延迟重连
+    request_queue_size = 1024
+
+
+class StandInServer:
+    """
+    在后台线程中运行的 stand-in HTTP 服务器。
+
+        with StandInServer(StandInConfig(latency=0.05)) as server:
+            os.environ["LIBGEN_BASE_URL"] = server.base_url
+    """
+
+    def __init__(self, config: StandInConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StandInConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = Lock()
+        self.requests: dict = {}
+        self.bytes_sent = 0
+        self.httpd = _HTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self  # type: ignore[attr-defined]
+        self._thread: Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def chance(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < probability
+
+    def count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def add_bytes(self, n: int) -> None:
+        with self._lock:
+            self.bytes_sent += n
+
+    def start(self) -> "StandInServer":
+        self._thread = Thread(target=self.httpd.serve_forever, name="libgen-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的额外延迟（秒）")
+    parser.add_argument("--bandwidth", type=int, default=0, help="每个连接的带宽上限（字节/秒），0 为不限")
+    parser.add_argument("--rows", type=int, default=25, help="每页最多返回的结果行数")
+    parser.add_argument("--min-size", type=int, default=64 * 1024, help="get.php 文件最小字节数")
+    parser.add_argument("--max-size", type=int, default=2 * 1024 * 1024, help="get.php 文件最大字节数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="get.php 中途断开的概率")
+    parser.add_argument("--html-error-rate", type=float, default=0.0, help="get.php 返回 HTML 错误页的概率")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="get.php 传输中途降到每秒几十字节的概率（slow-loris 镜像）")
+    parser.add_argument("--seed", type=int, default=0, help="故障注入随机种子")
+    parser.add_argument(
+        "--no-pushdown", action="store_true", help="不支持查询串中的 ext:/lang:/year: 条件（当作普通关键词，返回空结果）"
+    )
+
+
+def config_from_args(args) -> StandInConfig:
+    return StandInConfig(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        rows=args.rows,
+        min_size=args.min_size,
+        max_size=args.max_size,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        truncate_rate=args.truncate_rate,
+        html_error_rate=args.html_error_rate,
+        slow_rate=args.slow_rate,
+        seed=args.seed,
+        pushdown=not args.no_pushdown,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Libgen stand-in 服务器（index.php / ads.php / get.php）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandInServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"[*] stand-in 服务器已启动: {server.base_url}  (LIBGEN_BASE_URL={server.base_url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Caches shared by search/download helpers (in-memory, optionally persisted).
+"""
+
+import atexit
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    线程安全的内存缓存：条目按 TTL 过期，超过 maxsize 时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+_MISSING = object()
+
+
+class _PersistentCache:
+    """
+    按 LRU 顺序保存条目、可持久化到 JSON 文件的缓存基类（过期时间使用墙钟时间，便于跨进程复用）。
+    调用 enable_persistence(path) 后从文件加载，并在 save()/进程退出时写回；
+    子类实现 _restore(raw)（持锁调用，载入未过期的条目）与 _snapshot()（持锁调用，返回要写出的 dict）。
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.path: Optional[Path] = None
+        self._data: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self._dirty = False
+        self._atexit_registered = False
+
+    def _put(self, key: str, value) -> None:
+        """持锁调用：写入条目并淘汰最久未使用的条目。"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        self._dirty = True
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._dirty = True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def enable_persistence(self, path) -> None:
+        self.path = Path(path)
+        self.load()
+        if not self._atexit_registered:
+            atexit.register(self.save)
+            self._atexit_registered = True
+
+    def load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(raw, dict):
+            return
+        with self._lock:
+            self._restore(raw)
+
+    def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            snapshot = self._snapshot()
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            self._dirty = True
+
+    def _restore(self, raw: dict) -> None:
+        raise NotImplementedError
+
+    def _snapshot(self) -> dict:
+        raise NotImplementedError
+
+
+class ResolvedLinkCache(_PersistentCache):
+    """
+    入口页 URL（+ md5）到最终 get.php 链接的缓存。
+    - 解析成功的链接保留 ttl 秒；入口页中找不到链接（负结果）只保留 negative_ttl 秒；
+    - 调用 enable_persistence(path) 后从 JSON 文件加载，并在 save()/进程退出时写回，供下次运行复用。
+    """
+
+    def __init__(self, ttl: float = 600, negative_ttl: float = 120, maxsize: int = 4096):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def key(entry_url: str, md5: Optional[str] = None) -> str:
+        return f"{(md5 or '').lower()}|{entry_url}"
+
+    def lookup(self, entry_url: str, md5: Optional[str] = None) -> tuple[bool, Optional[str]]:
+        """返回 (是否命中, 链接)；命中负结果时链接为 None。"""
+        k = self.key(entry_url, md5)
+        with self._lock:
+            item = self._data.get(k)
+            if item is None:
+                return False, None
+            expires, link = item
+            if expires <= time.time():
+                del self._data[k]
+                self._dirty = True
+                return False, None
+            self._data.move_to_end(k)
+            return True, link
+
+    def store(self, entry_url: str, md5: Optional[str], link: Optional[str]) -> None:
+        expires = time.time() + (self.ttl if link else self.negative_ttl)
+        k = self.key(entry_url, md5)
+        with self._lock:
+            self._put(k, (expires, link))
+
+    def invalidate(self, entry_url: str, md5: Optional[str] = None) -> None:
+        self._discard(self.key(entry_url, md5))
+
+    def _restore(self, raw: dict) -> None:
+        now = time.time()
+        for k, (expires, link) in raw.items():
+            if expires > now:
+                self._data[k] = (expires, link)
+
+    def _snapshot(self) -> dict:
+        now = time.time()
+        return {k: [expires, link] for k, (expires, link) in self._data.items() if expires > now}
+
+
+class NegativeCache(_PersistentCache):
+    """
+    反复失败的条目：搜索无结果的查询（含筛选条件）与所有入口均下载失败的 md5。
+    每次失败后在 base_interval * 2^(失败次数-1)（不超过 max_interval）内视为仍会失败，
+    调用方据此跳过或延后；成功后 forget() 清除记录。
+    """
+
+    def __init__(self, base_interval: float = 6 * 3600, max_interval: float = 30 * 24 * 3600, maxsize: int = 20000):
+        super().__init__(maxsize)
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+
+    @staticmethod
+    def query_key(query: str, **filters) -> str:
+        """查询词（规范化空白与大小写）+ 非空筛选条件。"""
+        parts = [" ".join(str(query or "").lower().split())]
+        parts += [f"{k}={str(v).lower()}" for k, v in sorted(filters.items()) if v not in (None, "", False)]
+        return "q|" + "|".join(parts)
+
+    @staticmethod
+    def md5_key(md5: str) -> str:
+        return f"md5|{md5.lower()}"
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """仍在退避期内时返回记录（kind/label/failures/last/next），否则返回 None。"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry["next"] <= time.time():
+                return None
+            return dict(entry)
+
+    def record(self, key: str, kind: str, label: Optional[str] = None) -> dict:
+        now = time.time()
+        with self._lock:
+            entry = self._data.pop(key, None) or {"kind": kind, "label": label, "failures": 0}
+            entry["failures"] += 1
+            entry["kind"] = kind
+            entry["label"] = label or entry.get("label")
+            entry["last"] = now
+            entry["next"] = now + min(self.max_interval, self.base_interval * 2 ** (entry["failures"] - 1))
+            self._put(key, entry)
+            return dict(entry)
+
+    def forget(self, key: str) -> None:
+        self._discard(key)
+
+    def _restore(self, raw: dict) -> None:
+        # 退避期结束后再过 max_interval 仍未重试的记录视为过时，失败次数不再累计
+        stale = time.time() - self.max_interval
+        for k, entry in sorted(raw.items(), key=lambda kv: kv[1].get("last", 0) if isinstance(kv[1], dict) else 0):
+            if isinstance(entry, dict) and entry.get("next", 0) > stale:
+                self._data[k] = entry
+
+    def _snapshot(self) -> dict:
+        return dict(self._data)
+
+
+__all__ = ["TTLCache", "ResolvedLinkCache", "NegativeCache"]
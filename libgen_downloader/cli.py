@@ -4,11 +4,31 @@ Command line entry point for Libgen downloader.
 
 import argparse
 import csv
+import json
 import os
+import sys
 from pathlib import Path
 
-from .config import set_proxy
-from .pipeline import process_single_item
+from .config import CACHE_DIR, DEFAULT_LISTEN, ENGINES, set_proxy
+from .diskspace import DEFAULT_MARGIN as DISK_DEFAULT_MARGIN, DISK_SPACE
+from .download import LINK_CACHE
+from .events import BUS, print_sink
+from .export import EXPORT_FORMATS, import_downloads, resolve_only
+from .metrics import METRICS
+from .partials import (
+    DEFAULT_MAX_AGE as DEFAULT_PARTIALS_MAX_AGE,
+    DEFAULT_MAX_BYTES as DEFAULT_PARTIALS_MAX_BYTES,
+    PARTIALS,
+    budget_from_args,
+    partial_roots,
+)
+from .pipeline import NEGATIVE_CACHE, BatchPipeline, process_single_item
+from .search import PLANNER, normalize_isbn, normalize_md5
+from .profiling import MODES as PROFILE_MODES, Profiler
+from .ranking import DEFAULT_PREFERRED_EXTS
+from .scheduler import POLICIES as SCHEDULE_POLICIES, format_bytes
+from .shard import ShardJournal, format_report, merge_journals, parse_shard
+from .stall import DEFAULT_STALL_POLICY
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -23,8 +43,15 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--col-ext", default="类型", help="CSV 中作为扩展名筛选的列名，默认 '类型'")
     parser.add_argument("--col-year-min", help="CSV 中作为年份最小值的列名")
     parser.add_argument("--col-year-max", help="CSV 中作为年份最大值的列名")
+    parser.add_argument("--col-md5", help="CSV 中的 md5 列：有 md5 的行跳过搜索，直接解析 ads.php?md5= 入口下载")
+    parser.add_argument("--col-isbn", help="CSV 中的 ISBN 列：有 ISBN 的行只在 ISBN 字段搜索，取到候选后即停止读取结果页")
 
-    parser.add_argument("-n", "--index", type=int, default=0, help="选择第几条结果作为优先下载目标（从 0 开始，默认 0）")
+    parser.add_argument(
+        "-n",
+        "--index",
+        type=int,
+        help="按页面顺序选择第几条结果作为优先下载目标（从 0 开始）；默认取去重排序后得分最高的结果",
+    )
     parser.add_argument("-o", "--out-dir", default="downloads", help="文件保存目录，默认 ./downloads")
     parser.add_argument("--limit", type=int, default=25, help="搜索返回的最大条数（对应 res 参数），默认 25")
     parser.add_argument("--language", help="只保留指定语言的结果，例如 Chinese、English")
@@ -33,6 +60,11 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--ext", help="只保留指定扩展名的结果，例如 pdf、mobi（不区分大小写）")
     parser.add_argument("--year-min", type=int, help="筛选条件：年份 >= year_min")
     parser.add_argument("--year-max", type=int, help="筛选条件：年份 <= year_max")
+    parser.add_argument(
+        "--pushdown",
+        action="store_true",
+        help="把扩展名/语言/年份条件写进查询串（ext:/lang:/year:）交给服务器筛选；仅适用于支持该语法的镜像，不支持时自动改回本地筛选",
+    )
     parser.add_argument(
         "--columns",
         nargs="+",
@@ -64,6 +96,15 @@ def build_parser() -> argparse.ArgumentParser:
         default=3,
         help="最多尝试多少个不同的搜索结果进行下载（包含主结果），默认 3",
     )
+    parser.add_argument(
+        "--prefer-ext",
+        help=f"排序候选时偏好的扩展名，逗号分隔、靠前优先（--ext 指定的格式总在最前），默认 {','.join(DEFAULT_PREFERRED_EXTS)}",
+    )
+    parser.add_argument(
+        "--no-rank",
+        action="store_true",
+        help="不按标题/作者相似度、格式、大小与镜像健康度排序候选，只合并相同 md5 的结果并保持页面顺序",
+    )
     parser.add_argument(
         "--max-entry-urls",
         type=int,
@@ -71,65 +112,474 @@ def build_parser() -> argparse.ArgumentParser:
         help="每个结果最多尝试多少个镜像/入口链接，默认 5",
     )
     parser.add_argument("--max-retries", type=int, default=3, help="每个下载链接最多重试次数，默认 3")
+    parser.add_argument(
+        "--stall-speed",
+        type=float,
+        default=DEFAULT_STALL_POLICY.min_speed / 1024,
+        help=f"传输速度下限（KB/s）：窗口内平均速度低于该值即放弃当前镜像并在下一个镜像续传，0 为关闭，默认 {DEFAULT_STALL_POLICY.min_speed / 1024:g}",
+    )
+    parser.add_argument(
+        "--stall-seconds",
+        type=float,
+        default=DEFAULT_STALL_POLICY.window,
+        help=f"计算平均速度的窗口（秒），即低速持续多久判定为停滞，默认 {DEFAULT_STALL_POLICY.window:g}",
+    )
+    parser.add_argument(
+        "--stall-grace",
+        type=float,
+        default=DEFAULT_STALL_POLICY.grace,
+        help=f"每次传输开始后的宽限期（秒），期间不做判定，默认 {DEFAULT_STALL_POLICY.grace:g}",
+    )
+    parser.add_argument(
+        "--min-free",
+        type=float,
+        default=DISK_DEFAULT_MARGIN / 1024 / 1024,
+        help=f"下载目录与 .partial 目录所在磁盘始终保留的空闲空间（MB）：扣除进行中下载的预留后不足时新的下载等待，已知大小且无论如何都放不下时才放弃，默认 {DISK_DEFAULT_MARGIN // 1024 // 1024}",
+    )
+    parser.add_argument("--no-preallocate", action="store_true", help="已知文件大小时不预分配磁盘空间（fallocate）")
     parser.add_argument("--proxy", help="使用 http(s) 代理，例如 http://127.0.0.1:7890")
+    parser.add_argument(
+        "--link-cache",
+        nargs="?",
+        const=str(CACHE_DIR / "links.json"),
+        help="将已解析的下载链接缓存持久化到 JSON 文件，供重试/下次运行复用（不带路径时使用缓存目录下的 links.json）",
+    )
+    parser.add_argument(
+        "--negative-cache",
+        nargs="?",
+        const=str(CACHE_DIR / "negative.json"),
+        help="持久化反复失败的条目（搜索无结果的查询、所有镜像都失败的 md5），下次运行在退避期内（6 小时起按失败次数翻倍，最长 30 天）直接跳过（不带路径时使用缓存目录下的 negative.json）",
+    )
+    parser.add_argument("--force", action="store_true", help="忽略失败记录，强制处理近期反复失败的条目")
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="CSV 批量时使用 搜索→解析→传输 分级流水线并行处理（配合 --search-workers 等参数）",
+    )
+    parser.add_argument("--search-workers", type=int, default=4, help="流水线搜索线程数，默认 4")
+    parser.add_argument("--resolve-workers", type=int, default=8, help="流水线入口页解析线程数，默认 8")
+    parser.add_argument("--transfer-workers", type=int, default=3, help="流水线并行传输数，默认 3")
+    parser.add_argument(
+        "--schedule",
+        choices=SCHEDULE_POLICIES,
+        default="fifo",
+        help="CSV 批量的传输顺序：fifo=按输入顺序（默认）；sjf=小文件优先；balanced=限制同时下载的大文件数，其余并行槽处理小文件（非 fifo 时隐含 --pipeline）",
+    )
+    parser.add_argument("--probe-size", action="store_true", help="解析出下载链接后用 HEAD 请求获取准确文件大小，用于调度与进度/剩余时间估算")
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="thread",
+        help="执行引擎：thread=线程（默认）；async=asyncio 单线程处理大量并发连接（需要 aiohttp）",
+    )
+    parser.add_argument("--async-concurrency", type=int, default=64, help="async 引擎同时处理的条目数，默认 64")
+    parser.add_argument("--metrics-json", metavar="PATH", help="记录分阶段耗时/计数指标，结束时写入 JSON 文件")
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="PATH",
+        help="记录分阶段耗时/计数指标，结束时写入 Prometheus textfile（供 node_exporter textfile collector 读取）",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="剖析本次运行（包括所有工作线程），结束时写入 pstats（cprofile 模式）或折叠栈文件（sample 模式）并打印摘要",
+    )
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="cprofile", help="剖析方式，默认 cprofile")
+    parser.add_argument("--profile-top", type=int, default=20, help="剖析摘要显示的函数数，默认 20")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="sample 模式的采样间隔（秒），默认 0.005")
+
+    daemon = parser.add_argument_group("守护进程", "常驻进程复用会话/缓存；CLI 与 GUI 可作为瘦客户端提交任务")
+    daemon.add_argument("--daemon", action="store_true", help="以守护进程方式运行，在 --listen 地址提供本地任务 API")
+    daemon.add_argument("--listen", default=DEFAULT_LISTEN, help=f"守护进程监听/连接地址，默认 {DEFAULT_LISTEN}")
+    daemon.add_argument("--daemon-workers", type=int, default=3, help="守护进程并行任务数，默认 3")
+    daemon.add_argument("--submit", action="store_true", help="把查询或 CSV 条目提交给守护进程，并跟随输出直到全部完成")
+    daemon.add_argument("--detach", action="store_true", help="配合 --submit：只提交并打印任务编号，不等待完成")
+    daemon.add_argument("--jobs", action="store_true", help="列出守护进程中的任务状态")
+    daemon.add_argument("--cancel", metavar="JOB_ID", help="取消守护进程中的指定任务")
+
+    shard = parser.add_argument_group("分片", "多个节点/代理按哈希分担同一个 CSV，各自写日志，最后合并")
+    shard.add_argument("--shard", metavar="I/N", help="只处理哈希落在第 I 个（共 N 个）分片的 CSV 条目，例如 1/4")
+    shard.add_argument(
+        "--journal",
+        metavar="DIR",
+        help="把每个条目的结果追加到 DIR/shard-I-of-N.jsonl 并写出 manifest；重跑时跳过已成功的条目（使用 --shard 时默认为输出目录）",
+    )
+    shard.add_argument("--merge", nargs="+", metavar="PATH", help="合并多个分片日志（文件或目录），报告重复与冲突")
+    shard.add_argument("--merge-out", metavar="PATH", help="配合 --merge：把合并后的记录写入 JSONL 文件")
+
+    external = parser.add_argument_group("外部下载器", "只做搜索与链接解析，把传输交给 aria2 等下载器，完成后再校验导入")
+    external.add_argument(
+        "--resolve-only",
+        metavar="OUT",
+        help="不下载：并行搜索并解析 get 链接（线程数同 --resolve-workers），写出 aria2 输入文件或 JSONL",
+    )
+    external.add_argument("--resolve-format", choices=EXPORT_FORMATS, default="aria2", help="导出格式，默认 aria2（aria2c -i OUT）")
+    external.add_argument("--resolve-dir", metavar="DIR", help="导出记录中的下载目录（aria2 的 dir=），默认为输出目录")
+    external.add_argument(
+        "--aria2-import",
+        metavar="FILE",
+        help="读取 --resolve-only 导出的文件，校验外部下载器完成的文件 md5 后移入输出目录",
+    )
+    external.add_argument("--import-from", metavar="DIR", help="配合 --aria2-import：文件实际所在目录（覆盖记录中的 dir）")
+
+    partials = parser.add_argument_group("未完成的下载", "中断留下的 .part 按 md5 复用，超出时间/空间预算的自动清理")
+    partials.add_argument(
+        "--gc",
+        nargs="*",
+        metavar="DIR",
+        help="清理未完成的下载（.partial/.staging 中的 .part）后退出；不指定目录时清理输出目录",
+    )
+    partials.add_argument(
+        "--partials-max-size",
+        type=float,
+        default=DEFAULT_PARTIALS_MAX_BYTES / 1024 / 1024,
+        help=f"未完成文件的总量上限（MB），超出时先删除完成度最低、最旧的，0 为不限，默认 {DEFAULT_PARTIALS_MAX_BYTES // 1024 // 1024}",
+    )
+    partials.add_argument(
+        "--partials-max-age",
+        type=float,
+        default=DEFAULT_PARTIALS_MAX_AGE / 24 / 3600,
+        help=f"超过多少天未写入的 .part 直接删除，0 为不限，默认 {DEFAULT_PARTIALS_MAX_AGE // 24 // 3600:.0f}",
+    )
+    partials.add_argument("--gc-dry-run", action="store_true", help="配合 --gc：只列出将被删除的文件")
+    partials.add_argument("--keep-partials", action="store_true", help="批量任务结束后（以及守护进程中）不自动清理未完成的下载")
     return parser
 
 
+def iter_csv_items(args):
+    """
+    按 --col-* 映射读取 CSV，逐行产出任务 dict（query/language/ext/year_min/year_max/author/author_exact/md5/isbn）。
+    md5/ISBN 列有效时该行可以没有关键词（以 md5/ISBN 作为 query）。
+    """
+    col_md5 = getattr(args, "col_md5", None)
+    col_isbn = getattr(args, "col_isbn", None)
+    with open(args.csv, mode="r", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            md5 = normalize_md5(row.get(col_md5)) if col_md5 else None
+            isbn = normalize_isbn(row.get(col_isbn)) if col_isbn and not md5 else None
+            query = (row.get(args.col_query) or "").strip() or md5 or isbn
+            if not query:
+                continue
+
+            lang = row.get(args.col_language) if args.col_language else None
+            author = row.get(args.col_author) if args.col_author else None
+            ext = row.get(args.col_ext) if args.col_ext else None
+
+            y_min = None
+            if args.col_year_min and row.get(args.col_year_min):
+                try:
+                    y_min = int(row[args.col_year_min])
+                except Exception:
+                    pass
+
+            y_max = None
+            if args.col_year_max and row.get(args.col_year_max):
+                try:
+                    y_max = int(row[args.col_year_max])
+                except Exception:
+                    pass
+
+            yield {
+                "query": query,
+                "language": lang,
+                "ext": ext,
+                "year_min": y_min,
+                "year_max": y_max,
+                "author": author,
+                "author_exact": args.author_exact,
+                "md5": md5,
+                "isbn": isbn,
+            }
+
+
 def main():
     parser = build_parser()
     args = parser.parse_args()
+    BUS.add_text_sink(print_sink)
+
+    if args.submit or args.jobs or args.cancel:
+        run_client(args, parser)
+        return
+    if args.merge:
+        run_merge(args)
+        return
+    if args.aria2_import:
+        run_import(args)
+        return
+    if args.gc is not None:
+        run_gc(args)
+        return
 
     if args.proxy:
         set_proxy(args.proxy)
+    if args.link_cache:
+        LINK_CACHE.enable_persistence(args.link_cache)
+    if args.negative_cache:
+        NEGATIVE_CACHE.enable_persistence(args.negative_cache)
+    DISK_SPACE.configure(margin=int(args.min_free * 1024 * 1024), preallocate=not args.no_preallocate)
+    PLANNER.enabled = args.pushdown
+
+    if args.metrics_json or args.metrics_prom:
+        METRICS.enable()
+    profiler = Profiler(args.profile_mode, interval=args.profile_interval).start() if args.profile else None
+    try:
+        run(args, parser)
+    finally:
+        if args.metrics_json:
+            METRICS.write_json(args.metrics_json)
+        if args.metrics_prom:
+            METRICS.write_prometheus(args.metrics_prom)
+        if profiler is not None:
+            profiler.stop()
+            profiler.write(args.profile)
+            print(profiler.summary(args.profile_top), file=sys.stderr)
+            print(f"[*] 剖析结果已写入 {args.profile}", file=sys.stderr)
+
+
+def run(args, parser):
+    """执行一次 CLI 任务（单条查询或 CSV 批量），或以守护进程方式常驻"""
+    if args.daemon:
+        from .daemon import DownloadDaemon, parse_listen
+
+        host, port = parse_listen(args.listen)
+        daemon = DownloadDaemon(args, host=host, port=port, workers=args.daemon_workers)
+        print(f"[*] 守护进程已启动：{daemon.base_url}（Ctrl+C 退出）")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            print("\n[*] 守护进程退出，取消未完成的任务")
+        return
 
     if args.csv:
         if not os.path.exists(args.csv):
             print(f"[!] CSV 文件不存在: {args.csv}")
             return
 
-        with open(args.csv, mode="r", encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                query = row.get(args.col_query)
-                if not query:
-                    continue
-
-                lang = row.get(args.col_language) if args.col_language else None
-                author = row.get(args.col_author) if args.col_author else None
-                ext = row.get(args.col_ext) if args.col_ext else None
-
-                y_min = None
-                if args.col_year_min and row.get(args.col_year_min):
-                    try:
-                        y_min = int(row[args.col_year_min])
-                    except Exception:
-                        pass
-
-                y_max = None
-                if args.col_year_max and row.get(args.col_year_max):
-                    try:
-                        y_max = int(row[args.col_year_max])
-                    except Exception:
-                        pass
-
-                print(f"\n{'='*40}")
-                print(f"[*] 正在处理: {query}")
-                process_single_item(
-                    query,
-                    args,
-                    language=lang,
-                    ext=ext,
-                    year_min=y_min,
-                    year_max=y_max,
-                    author=author,
-                    author_exact=args.author_exact,
-                )
+        journal = open_journal(args, parser)
+        items = iter_csv_items(args)
+        if journal is not None:
+            items = (item for item in items if journal.accepts(item))
+        try:
+            run_csv(args, items)
+        finally:
+            if not args.keep_partials:
+                auto_gc(args)
+            if journal is not None:
+                journal.close()
+                print(f"[*] 分片 {journal.index}/{journal.count}：处理 {journal.selected} 条，跳过已完成 {journal.skipped} 条，日志 {journal.path}")
     else:
         if not args.query:
             parser.print_help()
             return
+        if args.resolve_only:
+            run_resolve_only(args, [{"query": args.query}])
+            return
+        if args.engine == "async":
+            run_async(args, [{"query": args.query}])
+            return
         process_single_item(args.query, args)
 
 
+def open_journal(args, parser):
+    """按 --shard / --journal 打开本分片的日志；两者都未指定时返回 None"""
+    if not (args.shard or args.journal):
+        return None
+    index, count = 1, 1
+    if args.shard:
+        try:
+            index, count = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    return ShardJournal(args.journal or args.out_dir, index, count, source=args.csv, out_dir=os.path.abspath(args.out_dir))
+
+
+def run_csv(args, items):
+    """处理 CSV 条目：只解析导出、asyncio 引擎、流水线并行或逐条顺序处理"""
+    if args.resolve_only:
+        run_resolve_only(args, items)
+        return
+    if args.engine == "async":
+        run_async(args, items)
+        return
+    if args.pipeline or args.schedule != "fifo" or args.probe_size:
+        pipeline = BatchPipeline(
+            args,
+            search_workers=args.search_workers,
+            resolve_workers=args.resolve_workers,
+            transfer_workers=args.transfer_workers,
+            schedule=args.schedule,
+            probe_sizes=args.probe_size,
+        )
+        results = pipeline.run(items)
+        done = sum(1 for item in results if item.get("status") == "success")
+        skipped = sum(1 for item in results if item.get("status") == "skipped")
+        print(f"\n[*] 流水线完成：成功 {done} / {len(results)}" + (f"，跳过近期失败的 {skipped} 个" if skipped else ""))
+        return
+
+    for item in items:
+        print(f"\n{'='*40}")
+        print(f"[*] 正在处理: {item['query']}")
+        process_single_item(
+            item["query"],
+            args,
+            language=item["language"],
+            ext=item["ext"],
+            year_min=item["year_min"],
+            year_max=item["year_max"],
+            author=item["author"],
+            author_exact=item["author_exact"],
+            md5=item.get("md5"),
+            isbn=item.get("isbn"),
+        )
+
+
+def run_async(args, items):
+    """用 asyncio 引擎处理条目（语义与线程版 download_for_result 相同）"""
+    from . import aio  # asyncio 只在选用 async 引擎时导入
+
+    try:
+        results = aio.run_batch(items, args, concurrency=args.async_concurrency)
+    except RuntimeError as e:
+        print(f"[!] {e}")
+        return
+    done = sum(1 for item in results if item.get("status") == "success")
+    skipped = sum(1 for item in results if item.get("status") == "skipped")
+    print(f"\n[*] asyncio 引擎完成：成功 {done} / {len(results)}" + (f"，跳过近期失败的 {skipped} 个" if skipped else ""))
+
+
+def run_resolve_only(args, items):
+    """只搜索并解析下载链接，写出供外部下载器使用的导出文件"""
+    counts = resolve_only(
+        items,
+        args,
+        args.resolve_only,
+        fmt=args.resolve_format,
+        out_dir=args.resolve_dir or args.out_dir,
+        workers=args.resolve_workers,
+    )
+    print(f"\n[*] 已导出 {counts['exported']} 个下载链接到 {args.resolve_only}，失败 {counts['failed']} 个")
+    if args.resolve_format == "aria2":
+        print(f"[*] 下载：aria2c -i {args.resolve_only}；完成后导入：libgen-cli --aria2-import {args.resolve_only} -o {args.out_dir}")
+
+
+def run_import(args):
+    """校验外部下载器完成的文件并移入输出目录"""
+    if not os.path.exists(args.aria2_import):
+        print(f"[!] 导出文件不存在: {args.aria2_import}")
+        return
+    counts = import_downloads(args.aria2_import, args.out_dir, source_dir=args.import_from)
+    summary = "，".join(f"{k} {v}" for k, v in sorted(counts.items()))
+    print(f"\n[*] 导入完成：{summary or '没有条目'}")
+
+
+def run_gc(args):
+    """按时间/空间预算清理未完成的下载"""
+    roots = [root for directory in (args.gc or [args.out_dir]) for root in partial_roots(directory)]
+    max_bytes, max_age = budget_from_args(args)
+    report = PARTIALS.gc(roots, max_bytes=max_bytes, max_age=max_age, dry_run=args.gc_dry_run)
+    verb = "将删除" if args.gc_dry_run else "已删除"
+    for entry in report["removed"]:
+        reason = "过期" if entry["reason"] == "age" else "超出空间预算"
+        print(f"[*] {verb}（{reason}，完成 {entry['completion']:.0%}，{format_bytes(entry['size'])}）: {entry['path']}")
+    print(
+        f"\n[*] 清理完成：{verb} {len(report['removed'])} 个，释放 {format_bytes(report['freed'])}；"
+        f"保留 {report['kept']} 个，共 {format_bytes(report['kept_bytes'])}"
+    )
+
+
+def auto_gc(args):
+    """批量任务结束后清理本次用到的暂存目录中超出预算的 .part（刚中断的文件在宽限期内，不会被删除）"""
+    max_bytes, max_age = budget_from_args(args)
+    report = PARTIALS.gc(max_bytes=max_bytes, max_age=max_age)
+    if report["removed"]:
+        print(f"[*] 清理了 {len(report['removed'])} 个超出预算的未完成下载，释放 {format_bytes(report['freed'])}")
+
+
+def run_merge(args):
+    """合并各分片日志并报告重复/冲突"""
+    merged, report = merge_journals(args.merge)
+    print(format_report(report))
+    if args.merge_out:
+        with open(args.merge_out, "w", encoding="utf-8") as f:
+            for record in merged:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"[*] 合并结果已写入 {args.merge_out}")
+
+
+def run_client(args, parser):
+    """作为瘦客户端访问守护进程：提交任务 / 列出任务 / 取消任务"""
+    from .daemon import TERMINAL, DaemonClient
+
+    client = DaemonClient(args.listen)
+    try:
+        if args.jobs:
+            for job in client.jobs():
+                progress = ""
+                if job.get("total"):
+                    progress = f" {job['downloaded'] / job['total']:.0%}"
+                print(f"#{job['id']:<6}{job['status']:<11}{progress:<6}{job.get('query') or ''}  {job.get('path') or job.get('error') or ''}")
+            return
+        if args.cancel:
+            ok = client.cancel(args.cancel)
+            print(f"[*] 任务 #{args.cancel} 已请求取消" if ok else f"[!] 任务 #{args.cancel} 已结束，无需取消")
+            return
+
+        if args.csv:
+            if not os.path.exists(args.csv):
+                print(f"[!] CSV 文件不存在: {args.csv}")
+                return
+            specs = list(iter_csv_items(args))
+        elif args.query:
+            specs = [
+                {
+                    "query": args.query,
+                    "language": args.language,
+                    "ext": args.ext,
+                    "year_min": args.year_min,
+                    "year_max": args.year_max,
+                    "author": args.author,
+                    "author_exact": args.author_exact,
+                }
+            ]
+        else:
+            parser.print_help()
+            return
+        # 未指定 -o 时使用守护进程自己的 --out-dir；指定时必须位于其中
+        if args.out_dir != parser.get_default("out_dir"):
+            out_dir = os.path.abspath(args.out_dir)
+            for spec in specs:
+                spec["out_dir"] = out_dir
+
+        if args.detach:
+            for job in client.submit(specs):
+                print(f"[*] 已提交任务 #{job['id']}: {job.get('query')}")
+            return
+
+        events = client.events()
+        next(events)  # 等待订阅生效后再提交，避免漏掉早结束任务的记录
+        pending = {job["id"]: job for job in client.submit(specs)}
+        total = len(pending)
+        print(f"[*] 已提交 {total} 个任务到 {client.base_url}")
+        done = 0
+        for record in events:
+            job_id = record.get("job")
+            if job_id not in pending:
+                continue
+            if record["type"] == "log":
+                print(f"[#{job_id}] {record['message']}")
+            elif record["type"] == "job" and record["data"]["status"] in TERMINAL:
+                job = pending.pop(job_id)
+                status = record["data"]["status"]
+                if status == "success":
+                    done += 1
+                print(f"[#{job_id}] 结束：{status} {record['data'].get('path') or record['data'].get('error') or job.get('query')}")
+                if not pending:
+                    break
+        print(f"\n[*] 守护进程任务完成：成功 {done} / {total}")
+    except OSError as e:
+        print(f"[!] 守护进程请求失败 {client.base_url}: {e}")
+
+
 if __name__ == "__main__":
     main()
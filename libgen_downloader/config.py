@@ -1,18 +1,34 @@
 import os
+from pathlib import Path
+from threading import Lock
 from typing import Optional
 
-import requests
-
 # 默认搜索主站域名，可通过环境变量覆盖
 BASE_URL: str = os.getenv("LIBGEN_BASE_URL", "https://libgen.vg")
 
+# 持久化缓存（链接缓存等）默认存放目录
+CACHE_DIR: Path = Path(os.getenv("LIBGEN_CACHE_DIR") or Path.home() / ".cache" / "libgen_downloader")
+
+# 可选的执行引擎（--engine）：thread=线程池，async=asyncio + aiohttp（见 aio.py）
+ENGINES = ("thread", "async")
+
+# 守护进程默认监听/连接地址（--listen）
+DEFAULT_LISTEN = "127.0.0.1:8765"
+
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; LibgenScript/2.0)",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
 }
 
+# 当前代理；Session 创建前调用 set_proxy 时先记在这里
+_proxy_url: Optional[str] = os.getenv("LIBGEN_PROXY") or None
+_session = None
+_session_lock = Lock()
+
+
+def _create_session(proxy_url: Optional[str] = None):
+    import requests  # 导入 requests 约占 CLI 启动时间的一半，推迟到第一次请求
 
-def _create_session(proxy_url: Optional[str] = None) -> requests.Session:
     session = requests.Session()
     session.headers.update(DEFAULT_HEADERS)
     if proxy_url:
@@ -20,15 +36,42 @@ def _create_session(proxy_url: Optional[str] = None) -> requests.Session:
     return session
 
 
-# 全局共享 Session，避免重复 TCP/TLS 握手
-SESSION: requests.Session = _create_session(os.getenv("LIBGEN_PROXY"))
+def get_session():
+    """
+    全局共享的 requests.Session（避免重复 TCP/TLS 握手），第一次调用时创建。
+    """
+    global _session
+    session = _session
+    if session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session(_proxy_url)
+            session = _session
+    return session
+
+
+def get_proxy() -> Optional[str]:
+    """当前代理地址（--proxy / LIBGEN_PROXY），未设置时为 None；不会创建 Session。"""
+    return _proxy_url
 
 
 def set_proxy(proxy_url: Optional[str]) -> None:
     """
     更新全局代理配置。传入 None/空串时清空代理。
     """
-    if proxy_url:
-        SESSION.proxies.update({"http": proxy_url, "https": proxy_url})
-    else:
-        SESSION.proxies.clear()
+    global _proxy_url
+    with _session_lock:
+        _proxy_url = proxy_url or None
+        if _session is None:
+            return
+        if proxy_url:
+            _session.proxies.update({"http": proxy_url, "https": proxy_url})
+        else:
+            _session.proxies.clear()
+
+
+def __getattr__(name):
+    # 兼容旧代码中的 config.SESSION / from .config import SESSION
+    if name == "SESSION":
+        return get_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
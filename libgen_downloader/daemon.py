@@ -0,0 +1,512 @@
+"""
+Long-running download daemon with a local JSON/HTTP job API.
+"""
+
+import argparse
+import hmac
+import itertools
+import json
+import os
+import secrets
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+from .config import CACHE_DIR, DEFAULT_LISTEN
+from .partials import PARTIALS, budget_from_args
+from .pipeline import download_candidates, search_candidates
+from .search import normalize_isbn, normalize_md5
+
+TERMINAL = {"success", "not_found", "failed", "cancelled"}
+JOB_FIELDS = ("query", "md5", "isbn", "language", "ext", "year_min", "year_max", "author", "author_exact", "out_dir")
+PROGRESS_INTERVAL = 0.5  # 同一任务进度事件的最小间隔（秒）
+PING_INTERVAL = 1.0
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1", "[::1]"}
+
+
+def token_path(port: int) -> Path:
+    """守护进程访问令牌文件：每次启动重新生成，只有本机同一用户可读；客户端从这里读取。"""
+    return CACHE_DIR / f"daemon-{port}.token"
+
+
+def read_token(port: int):
+    try:
+        return token_path(port).read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def _write_token(port: int) -> str:
+    token = secrets.token_urlsafe(32)
+    path = token_path(port)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def _within(path: Path, root: Path) -> bool:
+    return path == root or root in path.parents
+
+
+class JobManager:
+    """
+    任务队列：workers 个线程依次执行任务，每个任务有独立的取消标志；
+    状态变化、日志与（节流后的）进度以 dict 记录推送给所有订阅者。
+    任务 spec 为 query/md5/isbn/language/ext/year_min/year_max/author/author_exact/out_dir
+    （有 md5 时跳过搜索，入口链接由守护进程自己构造；有 isbn 时只按 ISBN 搜索）。
+    out_dir 必须位于守护进程的 --out-dir 之内，省略时使用 --out-dir。
+    """
+
+    def __init__(self, args, workers: int = 3, keep_finished: int = 1000):
+        self.args = args
+        self.out_root = Path(getattr(args, "out_dir", None) or "downloads").resolve()
+        self.keep_finished = keep_finished
+        self._lock = Lock()
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._cancel: dict = {}
+        self._queue: Queue = Queue()
+        self._listeners: list = []
+        self._ids = itertools.count(1)
+        self._threads = [Thread(target=self._worker, name=f"daemon-worker-{n}", daemon=True) for n in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    # --- 对外接口 ---
+    def submit(self, spec: dict) -> dict:
+        if not isinstance(spec, dict) or not (spec.get("query") or spec.get("md5") or spec.get("isbn")):
+            raise ValueError("任务需要 query、md5 或 isbn 字段")
+        job = {k: spec.get(k) for k in JOB_FIELDS if spec.get(k) is not None}
+        if "md5" in job:
+            job["md5"] = normalize_md5(job["md5"])
+            if not job["md5"]:
+                raise ValueError(f"无效的 md5：{spec['md5']}")
+        if "isbn" in job:
+            job["isbn"] = normalize_isbn(job["isbn"])
+            if not job["isbn"]:
+                raise ValueError(f"无效的 ISBN：{spec['isbn']}")
+        job.setdefault("query", job.get("md5") or job.get("isbn"))
+        job["out_dir"] = str(self._out_dir(job.get("out_dir")))
+        with self._lock:
+            job_id = str(next(self._ids))
+            job.update(id=job_id, status="queued", created=time.time(), path=None, error=None, downloaded=0, total=None)
+            self._jobs[job_id] = job
+            self._cancel[job_id] = Event()
+            self._trim()
+        self._publish_job(job)
+        self._queue.put(job_id)
+        return self._snapshot(job)
+
+    def list(self) -> list:
+        with self._lock:
+            return [self._snapshot(job) for job in self._jobs.values()]
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            event = self._cancel.get(job_id)
+            if job is None or job["status"] in TERMINAL:
+                return False
+            event.set()
+            queued = job["status"] == "queued"
+            if queued:
+                job["status"] = "cancelled"
+                job["finished"] = time.time()
+        if queued:
+            self._publish_job(job)
+        return True
+
+    def shutdown(self) -> None:
+        for job in self.list():
+            self.cancel(job["id"])
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def subscribe(self, maxsize: int = 10000) -> Queue:
+        q: Queue = Queue(maxsize=maxsize)
+        with self._lock:
+            self._listeners.append(q)
+        return q
+
+    def unsubscribe(self, q: Queue) -> None:
+        with self._lock:
+            if q in self._listeners:
+                self._listeners.remove(q)
+
+    # --- 内部实现 ---
+    def _out_dir(self, requested) -> Path:
+        if not requested:
+            return self.out_root
+        path = Path(str(requested)).expanduser()
+        path = (path if path.is_absolute() else self.out_root / path).resolve()
+        if not _within(path, self.out_root):
+            raise ValueError(f"out_dir 必须位于守护进程的输出目录 {self.out_root} 之内")
+        return path
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        return dict(job)
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in TERMINAL]
+        for job_id in finished[: max(0, len(finished) - self.keep_finished)]:
+            self._jobs.pop(job_id, None)
+            self._cancel.pop(job_id, None)
+
+    def _publish(self, record: dict) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for q in listeners:
+            try:
+                q.put_nowait(record)
+            except Full:  # 消费过慢的客户端丢弃记录，不阻塞任务线程
+                pass
+
+    def _publish_job(self, job: dict) -> None:
+        with self._lock:
+            snap = self._snapshot(job)
+        self._publish({"type": "job", "job": snap["id"], "data": snap})
+
+    def _worker(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            with self._lock:
+                job = self._jobs.get(job_id)
+                cancel_event = self._cancel.get(job_id)
+                if job is None or job["status"] != "queued":
+                    continue
+                job["status"] = "running"
+                job["started"] = time.time()
+            self._publish_job(job)
+            self._run(job, cancel_event)
+            with self._lock:
+                job["finished"] = time.time()
+            self._publish_job(job)
+            if not getattr(self.args, "keep_partials", False):
+                # 常驻进程中 .part 会不断累积：任务结束后按预算清理（间隔 GC_INTERVAL）
+                max_bytes, max_age = budget_from_args(self.args)
+                PARTIALS.maybe_gc(PARTIALS.roots(), max_bytes=max_bytes, max_age=max_age)
+
+    def _run(self, job: dict, cancel_event: Event) -> None:
+        job_id = job["id"]
+        args = argparse.Namespace(**vars(self.args))
+        args.out_dir = job["out_dir"]
+        last_progress = [0.0]
+
+        def logger(level, message):
+            self._publish({"type": "log", "job": job_id, "level": level, "message": message})
+
+        def progress_cb(downloaded, total):
+            job["downloaded"] = downloaded
+            job["total"] = total
+            now = time.monotonic()
+            if now - last_progress[0] >= PROGRESS_INTERVAL:
+                last_progress[0] = now
+                self._publish({"type": "progress", "job": job_id, "downloaded": downloaded, "total": total})
+
+        try:
+            candidates = search_candidates(
+                job["query"],
+                args,
+                language=job.get("language"),
+                ext=job.get("ext"),
+                year_min=job.get("year_min"),
+                year_max=job.get("year_max"),
+                author=job.get("author"),
+                author_exact=job.get("author_exact"),
+                logger=logger,
+                cancel_event=cancel_event,
+                md5=job.get("md5"),
+                isbn=job.get("isbn"),
+            )
+            if not candidates:
+                job["status"] = "cancelled" if cancel_event.is_set() else "not_found"
+                return
+            path = download_candidates(
+                candidates,
+                args,
+                logger=logger,
+                progress_cb=progress_cb,
+                cancel_event=cancel_event,
+                query=job.get("query"),
+            )
+            job["path"] = path
+            job["status"] = "success" if path else ("cancelled" if cancel_event.is_set() else "failed")
+        except Exception as e:  # noqa: BLE001
+            job["status"] = "cancelled" if cancel_event.is_set() else "failed"
+            job["error"] = str(e)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    本地 JSON API。每个请求都要带 Authorization: Bearer <令牌>（见 token_path），Host 必须是监听地址，
+    不接受带 Origin 的请求（浏览器页面），POST 的请求体必须是 application/json：
+        GET    /health            守护进程状态
+        POST   /jobs              提交一个任务 spec 或 {"items": [spec, ...]}
+        GET    /jobs              列出任务
+        GET    /jobs/<id>         单个任务
+        DELETE /jobs/<id>         取消任务
+        GET    /events[?job=<id>] 任务/日志/进度记录的 NDJSON 流
+    """
+
+    server_version = "libgen-daemon"
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    @property
+    def manager(self) -> JobManager:
+        return self.server.owner.manager  # type: ignore[attr-defined]
+
+    def _authorized(self) -> bool:
+        """
+        拒绝浏览器页面发来的请求：text/plain 的简单 POST 不会触发 CORS 预检，DNS 重绑定又能让页面读取响应，
+        因此同时检查 Origin、Host 与令牌。
+        """
+        if self.headers.get("Origin") is not None:
+            self._send_json(403, {"error": "不接受跨源请求"})
+            return False
+        host, port = self.server.server_address[:2]  # type: ignore[attr-defined]
+        allowed = {f"{host}:{port}"}
+        if host in LOOPBACK_HOSTS:
+            allowed |= {f"{name}:{port}" for name in LOOPBACK_HOSTS}
+        if host not in ("0.0.0.0", "::") and (self.headers.get("Host") or "").lower() not in allowed:
+            self._send_json(403, {"error": "Host 与监听地址不符"})
+            return False
+        token = self.server.owner.token  # type: ignore[attr-defined]
+        auth = self.headers.get("Authorization") or ""
+        if not (auth.startswith("Bearer ") and hmac.compare_digest(auth[7:].strip(), token)):
+            self._send_json(401, {"error": f"缺少或错误的访问令牌（见 {token_path(port)}）"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["health"]:
+            jobs = self.manager.list()
+            active = sum(1 for j in jobs if j["status"] not in TERMINAL)
+            return self._send_json(200, {"ok": True, "jobs": len(jobs), "active": active})
+        if parts == ["jobs"]:
+            return self._send_json(200, {"jobs": self.manager.list()})
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = self.manager.get(parts[1])
+            return self._send_json(200, job) if job else self._send_json(404, {"error": "任务不存在"})
+        if parts == ["events"]:
+            job_id = (parse_qs(url.query).get("job") or [None])[0]
+            return self._stream_events(job_id)
+        self._send_json(404, {"error": "未知路径"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self._send_json(404, {"error": "未知路径"})
+        content_type = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+        if content_type != "application/json":
+            return self._send_json(415, {"error": "请求体必须是 application/json"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            specs = body["items"] if isinstance(body, dict) and "items" in body else [body]
+            jobs = [self.manager.submit(spec) for spec in specs]
+        except (ValueError, TypeError, KeyError) as e:
+            return self._send_json(400, {"error": str(e)})
+        self._send_json(201, {"jobs": jobs})
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self._send_json(404, {"error": "未知路径"})
+        if self.manager.get(parts[1]) is None:
+            return self._send_json(404, {"error": "任务不存在"})
+        self._send_json(200, {"cancelled": self.manager.cancel(parts[1])})
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, job_id) -> None:
+        q = self.manager.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            if job_id is not None:
+                # 先发送当前状态，避免订阅前任务已经结束而收不到终态
+                job = self.manager.get(job_id)
+                if job is None:
+                    self._write_line({"type": "error", "job": job_id, "error": "任务不存在"})
+                    return
+                self._write_line({"type": "job", "job": job_id, "data": job})
+                if job["status"] in TERMINAL:
+                    return
+            else:
+                # 订阅已生效的确认：客户端可在收到后再提交任务，不会漏掉任何记录
+                self._write_line({"type": "hello"})
+            while not self.server.owner.stopping.is_set():  # type: ignore[attr-defined]
+                try:
+                    record = q.get(timeout=PING_INTERVAL)
+                except Empty:
+                    self._write_line({"type": "ping"})
+                    continue
+                if job_id is not None and record.get("job") != job_id:
+                    continue
+                self._write_line(record)
+                if job_id is not None and record["type"] == "job" and record["data"]["status"] in TERMINAL:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.manager.unsubscribe(q)
+
+    def _write_line(self, record: dict) -> None:
+        self.wfile.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class DownloadDaemon:
+    """
+    守护进程：JobManager + 本地 HTTP API。HTTP 会话、搜索/链接缓存和指标在任务之间保持；
+    CLI（--submit/--jobs/--cancel）和 GUI 通过 DaemonClient 作为瘦客户端使用；
+    启动时生成访问令牌写入 token_path(port)，客户端读取同一文件。
+
+        daemon = DownloadDaemon(args, host="127.0.0.1", port=8765)
+        daemon.serve_forever()
+    """
+
+    def __init__(self, args, host: str = "127.0.0.1", port: int = 8765, workers: int = 3):
+        self.manager = JobManager(args, workers=workers)
+        self.stopping = Event()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.owner = self  # type: ignore[attr-defined]
+        self.token = _write_token(self.httpd.server_address[1])
+        self._thread: Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def start(self) -> "DownloadDaemon":
+        self._thread = Thread(target=self.httpd.serve_forever, name="libgen-daemon", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        self.manager.shutdown()
+        if self._thread is not None:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+        path = token_path(self.httpd.server_address[1])
+        if read_token(self.httpd.server_address[1]) == self.token:
+            path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class DaemonClient:
+    """守护进程 HTTP API 的精简客户端（不走代理，直连本地地址）。token 默认从 token_path(端口) 读取。"""
+
+    def __init__(self, address: str = DEFAULT_LISTEN, timeout: float = 10, token: str | None = None):
+        self.base_url = address if "://" in address else f"http://{address}"
+        self.base_url = self.base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = token
+        self._opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def _new_request(self, method: str, path: str, data=None) -> urllib.request.Request:
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        token = self.token or read_token(urlparse(self.base_url).port or 80)
+        if token:
+            req.add_header("Authorization", f"Bearer {token}")
+        return req
+
+    def _request(self, method: str, path: str, payload=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        req = self._new_request(method, path, data)
+        if data is not None:
+            req.add_header("Content-Type", "application/json; charset=utf-8")
+        try:
+            with self._opener.open(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read() or b"null")
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read() or b"{}").get("error")
+            except ValueError:
+                message = None
+            raise OSError(f"HTTP {e.code}: {message or e.reason}") from e
+
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    def submit(self, specs) -> list:
+        """提交一个或多个任务 spec，返回任务快照列表。"""
+        if isinstance(specs, dict):
+            specs = [specs]
+        return self._request("POST", "/jobs", {"items": list(specs)})["jobs"]
+
+    def jobs(self) -> list:
+        return self._request("GET", "/jobs")["jobs"]
+
+    def job(self, job_id: str) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def cancel(self, job_id: str) -> bool:
+        return self._request("DELETE", f"/jobs/{job_id}")["cancelled"]
+
+    def events(self, job_id: str | None = None):
+        """逐条产出 /events 的记录（包括 ping 心跳，便于调用方检查自身的取消标志）。"""
+        path = "/events" + (f"?job={job_id}" if job_id else "")
+        req = self._new_request("GET", path)
+        with self._opener.open(req, timeout=max(self.timeout, PING_INTERVAL * 5)) as resp:
+            for line in resp:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def parse_listen(value: str) -> tuple[str, int]:
+    host, _, port = (value or DEFAULT_LISTEN).rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+__all__ = ["DEFAULT_LISTEN", "DaemonClient", "DownloadDaemon", "JobManager", "TERMINAL", "parse_listen", "token_path"]
@@ -0,0 +1,213 @@
+"""
+Disk-space admission control and preallocation for transfers.
+"""
+
+import errno
+import os
+import shutil
+from pathlib import Path
+from threading import Condition
+
+from .errors import DownloadError, InsufficientSpace
+
+DEFAULT_MARGIN = 32 * 1024 * 1024
+WAIT_INTERVAL = 1.0
+FALLOC_FL_KEEP_SIZE = 0x01
+
+
+def _existing(path) -> Path:
+    """path 本身或最近的已存在上级目录（目标目录可能尚未创建）。"""
+    path = Path(path).resolve()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+class Reservation:
+    """
+    一次传输在其涉及的文件系统上（暂存目录与目标目录，同一设备只计一次）预留的字节数。
+    随写入缩小，已经落盘的部分不会与文件系统的已用空间重复计算。
+    """
+
+    def __init__(self, space: "DiskSpace", devices: dict, nbytes: int):
+        self.space = space
+        self.devices = devices  # st_dev -> 用于 disk_usage 的路径
+        self.nbytes = nbytes
+        self.written = 0
+        self.preallocated = False
+
+    @property
+    def outstanding(self) -> int:
+        """尚未落到磁盘上的预留字节数（已预分配的空间已计入文件系统的已用空间）。"""
+        return 0 if self.preallocated else max(0, self.nbytes - self.written)
+
+    def resize(self, nbytes: int) -> None:
+        """得知准确的剩余字节数后调整预留（新一轮传输从 0 开始计数）；即使没有其它预留也放不下时抛出 InsufficientSpace。"""
+        self.space._resize(self, nbytes)
+
+    def release(self) -> None:
+        self.space._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class DiskSpace:
+    """
+    进程内的磁盘空间预留表：reserve() 阻塞直到空间足够（或 cancel_event 被设置），
+    try_reserve() 不等待，供 asyncio 引擎轮询。margin 为每个文件系统始终保留的空闲字节数。
+    空闲空间减去其它活动预留后仍高于 margin 才放行，否则等待其它预留结束；只有已知大小、
+    即使没有其它预留也放不下（free - margin < nbytes）时才抛出 InsufficientSpace。
+    """
+
+    def __init__(self, margin: int = DEFAULT_MARGIN, preallocate: bool = True):
+        self.margin = margin
+        self.preallocate = preallocate
+        self._active: list = []
+        self._cond = Condition()
+
+    def configure(self, margin: int | None = None, preallocate: bool | None = None) -> None:
+        if margin is not None:
+            self.margin = max(0, margin)
+        if preallocate is not None:
+            self.preallocate = preallocate
+
+    def _devices(self, paths) -> dict:
+        devices = {}
+        for path in paths:
+            existing = _existing(path)
+            devices.setdefault(os.stat(existing).st_dev, existing)
+        return devices
+
+    def _shortfall(self, devices: dict, nbytes: int):
+        """返回第一个放不下的 (path, free, reserved)；都放得下时返回 None。"""
+        for dev, path in devices.items():
+            reserved = sum(r.outstanding for r in self._active if dev in r.devices)
+            free = shutil.disk_usage(path).free
+            if free - reserved - nbytes < self.margin:
+                return path, free, reserved
+        return None
+
+    def _never_fits(self, free: int, nbytes: int) -> bool:
+        """已知大小且即使没有其它预留也放不下：等待无济于事。"""
+        return nbytes > 0 and free - self.margin < nbytes
+
+    def try_reserve(self, paths, nbytes: int | None):
+        """
+        空间足够时登记并返回 Reservation；不够但有其它进行中的预留（等它们结束可能就够了）时返回 None；
+        已知大小且 free - margin < nbytes 时抛出 InsufficientSpace。nbytes 未知时不会拒绝，只在余量
+        被其它预留占满时等待。
+        """
+        nbytes = max(0, nbytes or 0)
+        devices = self._devices(paths)
+        with self._cond:
+            shortfall = self._shortfall(devices, nbytes)
+            if shortfall is not None and not self._never_fits(shortfall[1], nbytes):
+                if any(dev in r.devices for r in self._active for dev in devices):
+                    return None
+                shortfall = None
+            if shortfall is None:
+                reservation = Reservation(self, devices, nbytes)
+                self._active.append(reservation)
+                return reservation
+        path, free, _reserved = shortfall
+        raise InsufficientSpace(
+            f"{path} 所在磁盘空间不足：需要 {nbytes / 1024 / 1024:.1f} MB，"
+            f"可用 {free / 1024 / 1024:.1f} MB，保留余量 {self.margin / 1024 / 1024:.0f} MB"
+        )
+
+    def reserve(self, paths, nbytes: int | None, cancel_event=None, on_wait=None) -> Reservation:
+        """阻塞直到预留成功；等待开始时调用一次 on_wait(path, needed, free)。等待中被取消时抛出 DownloadError。"""
+        waited = False
+        while True:
+            reservation = self.try_reserve(paths, nbytes)
+            if reservation is not None:
+                return reservation
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadError("下载已被取消")
+            if not waited and on_wait is not None:
+                devices = self._devices(paths)
+                with self._cond:
+                    shortfall = self._shortfall(devices, max(0, nbytes or 0))
+                if shortfall:
+                    on_wait(str(shortfall[0]), max(0, nbytes or 0), shortfall[1])
+            waited = True
+            with self._cond:
+                self._cond.wait(WAIT_INTERVAL)
+
+    def _resize(self, reservation: Reservation, nbytes: int) -> None:
+        with self._cond:
+            grow = nbytes > reservation.nbytes
+            reservation.nbytes = max(0, nbytes)
+            reservation.written = 0
+            reservation.preallocated = False
+            if not grow:
+                self._cond.notify_all()
+                return
+            self._active.remove(reservation)
+            try:
+                shortfall = self._shortfall(reservation.devices, reservation.nbytes)
+            finally:
+                self._active.append(reservation)
+        if shortfall is not None and self._never_fits(shortfall[1], reservation.nbytes):
+            path, free, _reserved = shortfall
+            raise InsufficientSpace(
+                f"{path} 所在磁盘空间不足：需要 {nbytes / 1024 / 1024:.1f} MB，"
+                f"可用 {free / 1024 / 1024:.1f} MB，保留余量 {self.margin / 1024 / 1024:.0f} MB"
+            )
+
+    def _release(self, reservation: Reservation) -> None:
+        with self._cond:
+            if reservation in self._active:
+                self._active.remove(reservation)
+            self._cond.notify_all()
+
+    def reserved_bytes(self) -> int:
+        with self._cond:
+            return sum(r.outstanding for r in self._active)
+
+
+DISK_SPACE = DiskSpace()
+
+_libc = None
+
+
+def _fallocate():
+    global _libc
+    if _libc is None:
+        import ctypes.util  # ctypes 只在第一次预分配时加载
+
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+            _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc.fallocate if _libc else None
+
+
+def preallocate(fd: int, offset: int, length: int) -> bool:
+    """
+    为 [offset, offset+length) 预分配磁盘空间而不改变文件大小（Linux fallocate + FALLOC_FL_KEEP_SIZE）。
+    不支持的平台/文件系统直接返回 False；空间不足时抛出 InsufficientSpace。
+    os.posix_fallocate 会把文件扩展到目标大小，.part 的长度就不再等于已下载字节数，因此不使用。
+    """
+    if length <= 0 or not DISK_SPACE.preallocate:
+        return False
+    fallocate = _fallocate()
+    if fallocate is None:
+        return False
+    if fallocate(fd, FALLOC_FL_KEEP_SIZE, offset, length) == 0:
+        return True
+    import ctypes
+
+    err = ctypes.get_errno()
+    if err in (errno.ENOSPC, errno.EDQUOT):
+        raise InsufficientSpace(f"预分配 {length / 1024 / 1024:.1f} MB 失败：{os.strerror(err)}")
+    return False  # EOPNOTSUPP 等：文件系统不支持，照常写入
+
+
+__all__ = ["DEFAULT_MARGIN", "DISK_SPACE", "DiskSpace", "Reservation", "preallocate"]
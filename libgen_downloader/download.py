@@ -2,22 +2,54 @@
 Download helpers: filename building, link extraction, mirror retries.
 """
 
+import errno
+import json
 import os
 import re
-import shutil
+import time
 import unicodedata
 from pathlib import Path
 from typing import Iterable, Optional
 from urllib.parse import urljoin
-from http.client import IncompleteRead
 
-import requests
-from bs4 import BeautifulSoup
-from requests.exceptions import ChunkedEncodingError
-from threading import Event
-
-from .config import SESSION
-from .errors import DownloadError
+from threading import Event, Lock
+
+from .cache import ResolvedLinkCache
+from .config import get_session
+from .diskspace import DISK_SPACE, preallocate
+from .errors import DownloadError, InsufficientSpace, TransferStalled
+from .events import (
+    BUS,
+    AlreadyDownloaded,
+    DiskSpaceWait,
+    FilePlanned,
+    FileRenamed,
+    MirrorFailed,
+    MirrorOk,
+    MirrorTried,
+    PartialAdopted,
+    ResolveEmpty,
+    ResolveFailed,
+    ResolveOk,
+    StallDetected,
+    TransferProgress,
+    ValidationFailed,
+    emit,
+)
+from .finalize import claim_part, finalize, find_duplicate, release_part, staging_dir
+from .partials import PARTIALS, part_meta_path
+from .metrics import METRICS, host_of
+from .ranking import MIRROR_HEALTH
+from .stall import DEFAULT_STALL_POLICY, StallPolicy, StallWatchdog
+
+RESOLVE_TIMEOUT = (10, 30)
+# TransferProgress 事件的最小字节间隔（只在有订阅者时发出）
+PROGRESS_STEP = 1024 * 1024
+
+# 入口页(+md5) -> get.php 链接；get 链接通常带时效 key，因此只短期缓存，负结果缓存更短
+LINK_CACHE = ResolvedLinkCache(ttl=600, negative_ttl=120)
+_inflight: dict = {}
+_inflight_lock = Lock()
 
 
 def fetch_download_link_from_page(entry_url: str) -> Optional[str]:
@@ -25,14 +57,34 @@ def fetch_download_link_from_page(entry_url: str) -> Optional[str]:
     打开任意入口页（ads.php、book 页面等），解析出最终 get.php/download 链接。
     如果入口本身直接返回二进制内容（非 HTML），则直接认为入口 URL 就是下载 URL。
     """
-    resp = SESSION.get(entry_url, allow_redirects=True)
-    resp.raise_for_status()
-
-    ct = resp.headers.get("Content-Type", "")
-    if not ct.lower().startswith("text/html"):
-        return resp.url
+    host = host_of(entry_url)
+    outcome = "error"
+    try:
+        with METRICS.timer("resolve", host=host):
+            link = _fetch_download_link(entry_url)
+        outcome = "ok" if link else "no_link"
+        return link
+    finally:
+        METRICS.inc("resolve", host=host, outcome=outcome)
+
+
+def _fetch_download_link(entry_url: str) -> Optional[str]:
+    resp = get_session().get(entry_url, allow_redirects=True, stream=True, timeout=RESOLVE_TIMEOUT)
+    try:
+        resp.raise_for_status()
+        ct = resp.headers.get("Content-Type", "")
+        if not ct.lower().startswith("text/html"):
+            return resp.url
+        html = resp.text
+    finally:
+        resp.close()
+    return extract_download_link(html, resp.url)
+
+
+def extract_download_link(html: str, base_url: str) -> Optional[str]:
+    """从入口页 HTML 中找出 get.php/download 链接（相对链接按 base_url 补全）。"""
+    from bs4 import BeautifulSoup  # 只有解析入口页时才需要，不拖慢 CLI 启动
 
-    html = resp.text
     soup = BeautifulSoup(html, "html.parser")
 
     for a in soup.find_all("a", href=True):
@@ -42,19 +94,117 @@ def fetch_download_link_from_page(entry_url: str) -> Optional[str]:
         if ("get.php" in href_lower or "download" in href_lower) and (
             "GET" in text or "DOWNLOAD" in text or "下载" in text
         ):
-            return urljoin(resp.url, href)
+            return urljoin(base_url, href)
 
     m = re.search(r'href="([^"]*get\.php\?[^"]+)"', html, flags=re.I)
     if m:
-        return urljoin(resp.url, m.group(1))
+        return urljoin(base_url, m.group(1))
 
     m2 = re.search(r'href="([^"]*(?:download|dl|d)\.php\?[^"]+)"', html, flags=re.I)
     if m2:
-        return urljoin(resp.url, m2.group(1))
+        return urljoin(base_url, m2.group(1))
 
     return None
 
 
+def resolve_download_link(entry_url: str, md5: Optional[str] = None, use_cache: bool = True) -> Optional[str]:
+    """
+    带缓存的 fetch_download_link_from_page：命中 LINK_CACHE（包括“入口页没有链接”的负结果）时不再请求入口页；
+    同一入口正被其它线程（如后台预取）解析时等待其结果，避免重复请求。网络错误不缓存。
+    """
+    if not use_cache:
+        return fetch_download_link_from_page(entry_url)
+
+    key = LINK_CACHE.key(entry_url, md5)
+    while True:
+        hit, link = LINK_CACHE.lookup(entry_url, md5)
+        if hit:
+            return link
+        with _inflight_lock:
+            pending = _inflight.get(key)
+            if pending is None:
+                pending = _inflight[key] = Event()
+                owner = True
+            else:
+                owner = False
+        if owner:
+            break
+        if not pending.wait(RESOLVE_TIMEOUT[0] + RESOLVE_TIMEOUT[1]):
+            return fetch_download_link_from_page(entry_url)
+        hit, link = LINK_CACHE.lookup(entry_url, md5)
+        if hit:
+            return link
+        # 其它线程解析时出现网络错误（未写入缓存）：自行重试一次
+
+    try:
+        link = fetch_download_link_from_page(entry_url)
+        LINK_CACHE.store(entry_url, md5, link)
+        return link
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        pending.set()
+
+
+def candidate_entry_urls(result: dict, max_entry_urls: int = 5) -> list[str]:
+    """
+    按优先级列出一个搜索结果可尝试的入口页：ads_url 优先，其后是 mirrors 中的其它链接；
+    最近下载成功率更高的主机（见 ranking.MIRROR_HEALTH）提前。
+    """
+    candidate_urls: list[str] = []
+    if result.get("ads_url"):
+        candidate_urls.append(result["ads_url"])
+    for u in result.get("mirrors") or []:
+        if u not in candidate_urls:
+            candidate_urls.append(u)
+    if len(candidate_urls) > 1:
+        candidate_urls.sort(key=lambda u: -MIRROR_HEALTH.score(u))
+    return candidate_urls[:max_entry_urls]
+
+
+def resolve_first_link(result: dict, max_entry_urls: int = 5, logger=None) -> Optional[tuple[str, str]]:
+    """
+    依次解析结果的入口页，返回第一个可用的 (entry_url, get_url)；全部失败时返回 None。
+    解析结果写入 LINK_CACHE，随后的 download_for_result 可直接命中。
+    """
+    import requests
+
+    for entry_url in candidate_entry_urls(result, max_entry_urls):
+        try:
+            get_url = resolve_download_link(entry_url, result.get("md5"))
+        except requests.RequestException as e:
+            emit(ResolveFailed(entry_url, e), logger=logger)
+            continue
+        if get_url:
+            return entry_url, get_url
+    return None
+
+
+def probe_size(get_url: str, timeout=RESOLVE_TIMEOUT) -> Optional[int]:
+    """
+    用 HEAD 请求获取 get 链接对应文件的准确大小（Content-Length）；服务器不支持 HEAD 或返回 HTML 时
+    再用 Range: bytes=0-0 的 GET 读取 Content-Range 中的总长度。失败时返回 None，不抛出网络异常。
+    """
+    import requests
+
+    session = get_session()
+    host = host_of(get_url)
+    size = None
+    try:
+        with METRICS.timer("size_probe", host=host):
+            resp = session.head(get_url, allow_redirects=True, timeout=timeout)
+            if resp.ok and "text/html" not in resp.headers.get("Content-Type", ""):
+                size, _ = response_total(resp.headers, 0)
+            if size is None:
+                with session.get(get_url, stream=True, allow_redirects=True, timeout=timeout, headers={"Range": "bytes=0-0"}) as resp:
+                    if resp.status_code == 206:
+                        size, _ = response_total(resp.headers, 0)
+    except requests.RequestException:
+        size = None
+    METRICS.inc("size_probe", host=host, outcome="ok" if size else "unknown")
+    return size
+
+
 def clean_filename(name: str, max_length: int = 150) -> str:
     """
     清洗文件名（特别针对 Windows）：Unicode 规范化、移除非法字符、截断过长。
@@ -123,6 +273,286 @@ def build_filename_from_result(result: dict) -> str:
     return filename
 
 
+def response_total(headers, offset: int) -> tuple[Optional[int], int]:
+    """
+    根据响应头得到 (文件总大小, 实际起始偏移)：206 响应按 Content-Range，否则按 Content-Length。
+    """
+    content_range = headers.get("Content-Range")
+    if content_range:
+        m = re.search(r"bytes\s+(\d+)-(\d+)/(\d+)", content_range)
+        if m:
+            start, _end, full = map(int, m.groups())
+            return full, start
+        return None, offset
+    try:
+        length = headers.get("Content-Length")
+        return (int(length) if length else None), offset
+    except ValueError:
+        return None, offset
+
+
+def validate_download(path, expected_ext: str = "") -> bool:
+    """粗略校验下载结果：文件存在、不小于 10KB，且 pdf/epub/zip 的文件头与扩展名一致。"""
+    try:
+        if not os.path.exists(path):
+            return False
+        size = os.path.getsize(path)
+        if size < 10 * 1024:
+            return False
+        with open(path, "rb") as f:
+            sig = f.read(8)
+        if expected_ext == "pdf" and not sig.startswith(b"%PDF"):
+            return False
+        if expected_ext in {"epub", "zip"} and not sig.startswith(b"PK"):
+            return False
+        return True
+    except Exception:
+        return False
+
+
+def resume_offset(temp_path, md5: Optional[str] = None) -> int:
+    """
+    可续传的字节数。元数据记录了另一个 md5 时删除旧的 .part（同名文件来自另一个结果）；
+    没有元数据（旧版本或中断在写入元数据之前）时照常续传，内容不对由完成后的校验发现。
+    """
+    temp_path = Path(temp_path)
+    if not temp_path.exists():
+        return 0
+    if md5:
+        try:
+            meta = json.loads(part_meta_path(temp_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+        recorded = (meta.get("md5") or "").lower()
+        if recorded and recorded != md5.lower():
+            discard_part(temp_path)
+            return 0
+    return temp_path.stat().st_size
+
+
+def write_part_meta(temp_path, md5: Optional[str], url: str, total: Optional[int] = None) -> None:
+    """记录 .part 的来源（md5、链接与预计大小），供续传校验以及 partials 模块按 md5 查找与回收。"""
+    meta = {"md5": md5.lower() if md5 else None, "url": url, "total": total, "started": time.time()}
+    try:
+        part_meta_path(temp_path).write_text(json.dumps(meta), encoding="utf-8")
+    except OSError:
+        pass
+
+
+def discard_part(temp_path) -> None:
+    for p in (Path(temp_path), part_meta_path(temp_path)):
+        try:
+            p.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
+def publish_part(temp_path, final_path, md5: Optional[str] = None, logger=None) -> Path:
+    """
+    发布完成的 .part 并清理其元数据：目标目录中已有内容相同的文件时视为已下载，丢弃 .part 并返回已有文件；
+    否则交给 finalize()（重名时改用带序号的文件名）。
+    """
+    final_path = Path(final_path)
+    existing = find_duplicate(temp_path, final_path, md5)
+    if existing is not None:
+        discard_part(temp_path)
+        emit(AlreadyDownloaded(str(existing)), logger=logger)
+        return existing
+    actual = finalize(temp_path, final_path)
+    discard_part(temp_path)
+    if actual != final_path:
+        emit(FileRenamed(final_path.name, actual.name), logger=logger)
+    return actual
+
+
+class Transfer:
+    """
+    一次 get 链接传输中与 I/O 无关的部分，线程版（download_file_from_get_url）与 asyncio 版（aio.AsyncEngine.download_file）共用：
+    暂存与发布路径、续传偏移、状态码判定、磁盘预留的调整、逐块记账（进度、停滞检测）、指标以及最终抛出哪种错误。
+    调用方只负责发请求、读响应和写文件。
+    """
+
+    def __init__(
+        self,
+        get_url: str,
+        out_dir: str | Path = ".",
+        filename: Optional[str] = None,
+        temp_dir=None,
+        md5: Optional[str] = None,
+        stall: StallPolicy | None = None,
+        expected_size: Optional[int] = None,
+        logger=None,
+        progress_cb=None,
+    ):
+        self.get_url = get_url
+        self.out_path = Path(out_dir)
+        self.tmp_root = staging_dir(self.out_path, temp_dir)
+        self.fname = clean_filename(filename or "download.bin")
+        self.final_path = self.out_path / self.fname
+        self.host = host_of(get_url)
+        self.md5 = md5
+        self.stall = stall or DEFAULT_STALL_POLICY
+        self.expected_size = expected_size
+        self.logger = logger
+        self.progress_cb = progress_cb
+        self.started = time.perf_counter()
+        self.reservation = None
+        self.temp_path = None
+        self.last_exc = None
+        self.offset = self.downloaded = 0
+        self.total = self.exact_total = None
+        self.watchdog = None
+        self._progress_events = False
+        self._next_event = 0
+        PARTIALS.register(self.tmp_root)
+
+    @property
+    def reserve_paths(self) -> list:
+        return [self.out_path, self.tmp_root]
+
+    @property
+    def stall_message(self) -> str:
+        return f"传输速度低于 {self.stall.min_speed / 1024:.1f} KB/s 持续 {self.stall.window:.0f} 秒"
+
+    def on_disk_wait(self, path, needed, free) -> None:
+        emit(DiskSpaceWait(path, needed, free), logger=self.logger)
+
+    def claim(self, reservation) -> None:
+        """磁盘空间预留成功后占用 .part，并接手同一 md5 此前中断留下的 .part。"""
+        self.reservation = reservation
+        self.temp_path = claim_part(self.tmp_root, self.fname)
+        adopted = PARTIALS.adopt(self.temp_path, self.md5)
+        if adopted:
+            emit(PartialAdopted(self.temp_path.name, adopted), logger=self.logger)
+
+    def begin_attempt(self, attempt: int) -> dict:
+        """开始第 attempt 次请求，返回要附加的请求头（有可续传的 .part 时带 Range）。"""
+        if attempt > 1:
+            METRICS.inc("transfer_retries", host=self.host)
+        self.offset = self.downloaded = 0
+        self.offset = resume_offset(self.temp_path, self.md5)
+        return {"Range": f"bytes={self.offset}-"} if self.offset > 0 else {}
+
+    def check_status(self, status: int) -> Optional[bool]:
+        """响应状态码：5xx 返回 True（同一链接重试），4xx 返回 False（放弃该链接），其余返回 None（开始接收）。"""
+        if status < 400:
+            return None
+        kind = "Server" if status >= 500 else "Client"
+        self.error(DownloadError(f"{kind} error: {status}"), f"http_{status}")
+        return status >= 500
+
+    def begin_body(self, headers, status: int) -> str:
+        """按响应头确定总大小与续传偏移（服务器忽略 Range 时从头开始），调整磁盘预留，返回打开 .part 的模式。"""
+        os.makedirs(self.out_path, exist_ok=True)
+        total, offset = response_total(headers, self.offset)
+        if offset > 0 and status == 200:
+            try:
+                self.temp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+            offset = 0
+        self.offset = self.downloaded = offset
+        self.exact_total = total
+        if total is not None:
+            self.reservation.resize(total - offset)
+        elif self.expected_size:
+            total = self.expected_size
+        self.total = total
+        self._progress_events = BUS.wants(TransferProgress)
+        self._next_event = 0
+        self.watchdog = StallWatchdog(self.stall, start_bytes=offset)
+        return "ab" if offset > 0 else "wb"
+
+    def open_part(self, f) -> None:
+        """.part 打开后：新文件（或续传没有元数据的旧 .part）写入元数据，已知准确大小时预分配，并报告起点。"""
+        if self.offset == 0 or not part_meta_path(self.temp_path).exists():
+            write_part_meta(self.temp_path, self.md5, self.get_url, self.exact_total)
+        if self.exact_total and preallocate(f.fileno(), self.offset, self.exact_total - self.offset):
+            self.reservation.preallocated = True
+        self.downloaded = self.offset
+        if self.progress_cb:
+            self.progress_cb(self.downloaded, self.total)  # 先报告起点，BatchETA 只统计之后的增量
+
+    def feed(self, n: int) -> None:
+        """记录写入的 n 字节：更新预留、进度与停滞检测，速度持续过低时抛出 TransferStalled。"""
+        self.downloaded += n
+        self.reservation.written = self.downloaded - self.offset
+        self.watchdog.feed(self.downloaded)
+        if self.watchdog.check_due():
+            raise TransferStalled(self.stall_message)
+        if self.progress_cb:
+            self.progress_cb(self.downloaded, self.total)
+        if self._progress_events and self.downloaded >= self._next_event:
+            emit(TransferProgress(self.get_url, self.downloaded, self.total))
+            self._next_event = self.downloaded + PROGRESS_STEP
+
+    def check_complete(self) -> None:
+        """响应读完后：停滞（监视线程关闭了连接后读取正常结束）或不完整的 .part 不能发布。"""
+        from http.client import IncompleteRead
+
+        if self.watchdog.stalled:
+            raise TransferStalled(self.stall_message)
+        if self.exact_total is not None and self.downloaded < self.exact_total:
+            raise IncompleteRead(b"", self.exact_total - self.downloaded)
+
+    def publish(self) -> str:
+        """发布 .part（见 publish_part）并记录成功，返回实际路径。"""
+        self.final_path = publish_part(self.temp_path, self.final_path, self.md5, logger=self.logger)
+        METRICS.observe("transfer", time.perf_counter() - self.started, host=self.host)
+        METRICS.inc("transfer", host=self.host, outcome="ok")
+        return str(self.final_path)
+
+    def error(self, exc, reason: str) -> None:
+        self.last_exc = exc
+        METRICS.inc("transfer_errors", host=self.host, reason=reason)
+
+    def stalled(self, exc) -> None:
+        """慢速镜像：不在同一链接上重试，保留 .part 交给下一个镜像续传。"""
+        self.error(exc, "stalled")
+        speed = self.watchdog.speed if self.watchdog is not None else None
+        emit(StallDetected(self.get_url, speed or 0.0, self.downloaded), logger=self.logger)
+
+    def write_failed(self, exc: OSError) -> Optional[InsufficientSpace]:
+        """写入 .part 出错：磁盘已满时返回对应的 InsufficientSpace（保留 .part 等空间释放后续传），否则返回 None。"""
+        if exc.errno in (errno.ENOSPC, errno.EDQUOT):
+            return InsufficientSpace(f"写入 {self.temp_path} 失败：{exc.strerror}")
+        return None
+
+    def shorten_name(self) -> None:
+        """文件名过长等：换用较短的文件名（连同 .part）。"""
+        short_base = clean_filename(Path(self.fname).stem)[:80] or "download"
+        alt_name = f"{short_base}{Path(self.fname).suffix or '.bin'}"
+        self.final_path = self.out_path / alt_name
+        release_part(self.temp_path)
+        self.temp_path = claim_part(self.tmp_root, alt_name)
+
+    def discard(self) -> None:
+        # 取消发生在发布之前，final_path 若存在也是别的任务的文件，只删除自己的 .part
+        discard_part(self.temp_path)
+
+    def end_attempt(self) -> None:
+        # 本轮实际收到的字节数（续传时不含已有的 offset）
+        if self.downloaded > self.offset:
+            METRICS.inc("transfer_bytes", self.downloaded - self.offset, host=self.host)
+
+    def raise_failure(self, cancelled: bool = False):
+        """所有尝试都没有成功：按最后的错误抛出 TransferStalled、InsufficientSpace 或 DownloadError。"""
+        if isinstance(self.last_exc, TransferStalled):
+            METRICS.inc("transfer", host=self.host, outcome="stalled")
+            raise TransferStalled(f"下载中止（GET: {self.get_url}）：{self.last_exc}")
+        if isinstance(self.last_exc, InsufficientSpace):
+            METRICS.inc("transfer", host=self.host, outcome="no_space")
+            raise self.last_exc
+        METRICS.inc("transfer", host=self.host, outcome="cancelled" if cancelled else "failed")
+        raise DownloadError(f"下载失败（GET: {self.get_url}）：{self.last_exc}")
+
+    def close(self) -> None:
+        if self.reservation is not None:
+            self.reservation.release()
+        if self.temp_path is not None:
+            release_part(self.temp_path)
+
+
 def download_file_from_get_url(
     get_url: str,
     out_dir: str | Path = ".",
@@ -134,120 +564,144 @@ def download_file_from_get_url(
     cancel_event: Event | None = None,
     stop_event: Event | None = None,
     temp_dir=None,
+    md5: Optional[str] = None,
+    stall: StallPolicy | None = None,
+    expected_size: Optional[int] = None,
 ) -> str:
     """
     针对一个 get.php/download 链接，带重试逻辑：网络/5xx 自动重试，4xx 直接失败。
+    给出 md5 时 .part 只在 md5 一致时续传；stall 策略判定速度过低时抛出 TransferStalled 并保留 .part，
+    由调用方换下一个镜像续传（不在同一链接上重试）。
+    响应没有 Content-Length 时，进度回调以 expected_size（结果页大小或探测值）作为总量。
+    .part 放在与 out_dir 同一文件系统的暂存目录（见 finalize.staging_dir），完成后原子地发布为不与已有文件重名的路径
+    （"name (1).ext" 等），返回实际路径。开始前在 DISK_SPACE 中为目标目录与暂存目录预留 expected_size（空间不足时等待其它传输结束），
+    得知准确大小后调整预留并预分配；磁盘空间不足时抛出 InsufficientSpace。
+    各步骤的判定见 Transfer，这里只负责请求与读写。
     """
-    last_exc = None
-    target_name = filename or "download.bin"
-    out_path = Path(out_dir)
-    tmp_root = Path(temp_dir) if temp_dir else out_path / ".partial"
-    tmp_root.mkdir(parents=True, exist_ok=True)
-    fname = clean_filename(target_name)
-    temp_path = tmp_root / f"{fname}.part"
-    final_path = out_path / fname
-
-    for attempt in range(1, max_retries + 1):
-        try:
-            offset = temp_path.stat().st_size if temp_path.exists() else 0
-            headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
-
-            resp = SESSION.get(
-                get_url,
-                stream=True,
-                allow_redirects=True,
-                timeout=timeout,
-                headers=headers or None,
-            )
-            status = resp.status_code
-
-            if status >= 500:
-                last_exc = requests.HTTPError(f"Server error: {status}", response=resp)
-                continue
-            if status >= 400:
-                raise requests.HTTPError(f"Client error: {status}", response=resp)
-
-            os.makedirs(out_dir, exist_ok=True)
-
-            total = None
-            if "Content-Range" in resp.headers:
-                m = re.search(r"bytes\\s+(\\d+)-(\\d+)/(\\d+)", resp.headers["Content-Range"])
-                if m:
-                    start, end, full = map(int, m.groups())
-                    total = full
-                    offset = start
-            else:
-                total = resp.headers.get("Content-Length")
-                try:
-                    total = int(total) if total else None
-                except ValueError:
-                    total = None
-
-            if offset > 0 and status == 200:
-                try:
-                    temp_path.unlink(missing_ok=True)
-                except Exception:
-                    pass
-                offset = 0
-
-            mode = "ab" if offset > 0 else "wb"
-            downloaded = 0
-
+    from http.client import IncompleteRead
+
+    import requests
+    from requests.exceptions import ChunkedEncodingError
+
+    session = get_session()
+    transfer = Transfer(get_url, out_dir, filename, temp_dir, md5, stall, expected_size, logger, progress_cb)
+    reservation = DISK_SPACE.reserve(
+        transfer.reserve_paths, expected_size, cancel_event=cancel_event, on_wait=transfer.on_disk_wait
+    )
+    try:
+        transfer.claim(reservation)
+        for attempt in range(1, max_retries + 1):
             try:
-                with open(temp_path, mode) as f:
-                    if offset:
-                        downloaded = offset
-                    for chunk in resp.iter_content(chunk_size=8192):
-                        if (cancel_event and cancel_event.is_set()) or (stop_event and stop_event.is_set()):
-                            raise DownloadError("下载已被取消")
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if progress_cb:
-                                progress_cb(downloaded, total)
-            except OSError:
-                short_base = clean_filename(Path(fname).stem)[:80] or "download"
-                ext = Path(fname).suffix or ".bin"
-                alt_name = f"{short_base}{ext}"
-                final_path = out_path / alt_name
-                temp_path = tmp_root / f"{alt_name}.part"
-                with open(temp_path, mode) as f:
-                    if offset:
-                        downloaded = offset
+                headers = transfer.begin_attempt(attempt)
+                with METRICS.timer("transfer_ttfb", host=transfer.host):
+                    resp = session.get(
+                        get_url,
+                        stream=True,
+                        allow_redirects=True,
+                        timeout=timeout,
+                        headers=headers or None,
+                    )
+                retry = transfer.check_status(resp.status_code)
+                if retry is not None:
+                    if retry:
+                        continue
+                    break
+                mode = transfer.begin_body(resp.headers, resp.status_code)
+
+                def copy_body(f):
+                    transfer.open_part(f)
                     for chunk in resp.iter_content(chunk_size=8192):
                         if (cancel_event and cancel_event.is_set()) or (stop_event and stop_event.is_set()):
                             raise DownloadError("下载已被取消")
                         if chunk:
                             f.write(chunk)
-                            downloaded += len(chunk)
-                            if progress_cb:
-                                progress_cb(downloaded, total)
+                            transfer.feed(len(chunk))
+
+                with transfer.watchdog.watch(resp):
+                    try:
+                        with open(transfer.temp_path, mode) as f:
+                            copy_body(f)
+                    except (requests.RequestException, IncompleteRead) as e:
+                        # 监视线程判定停滞后会关闭连接，阻塞中的读取以网络错误的形式返回
+                        if transfer.watchdog.stalled:
+                            raise TransferStalled(transfer.stall_message) from e
+                        raise
+                    except OSError as e:
+                        no_space = transfer.write_failed(e)
+                        if no_space is not None:
+                            raise no_space from e
+                        transfer.shorten_name()
+                        with open(transfer.temp_path, mode) as f:
+                            copy_body(f)
+
+                transfer.check_complete()
+                return transfer.publish()
+
+            except TransferStalled as e:
+                transfer.stalled(e)
+                break
+            except (requests.Timeout, requests.ConnectionError, ChunkedEncodingError, IncompleteRead) as e:
+                transfer.error(e, type(e).__name__)
+                continue
+            except InsufficientSpace as e:
+                transfer.error(e, "no_space")
+                break
+            except DownloadError as e:
+                transfer.last_exc = e
+                if cancel_event or stop_event:
+                    transfer.discard()
+                break
+            finally:
+                transfer.end_attempt()
+
+        cancelled = (cancel_event and cancel_event.is_set()) or (stop_event and stop_event.is_set())
+        transfer.raise_failure(bool(cancelled))
+    finally:
+        transfer.close()
+
+
+def plan_entries(result: dict, max_entry_urls: int = 5, logger=None) -> tuple[str, str, list[str]]:
+    """
+    下载一个结果前的准备（线程版与 asyncio 版共用）：生成文件名并发出 FilePlanned，
+    返回 (文件名, 期望的扩展名, 入口列表)；没有入口时抛出 DownloadError。
+    """
+    filename = build_filename_from_result(result)
+    emit(FilePlanned(filename), logger=logger)
+    entries = candidate_entry_urls(result, max_entry_urls)
+    if not entries:
+        raise DownloadError("没有可用的下载入口链接（既没有 ads_url 也没有 mirrors）")
+    return filename, (result.get("extension") or "").lower(), entries
 
-            try:
-                shutil.move(str(temp_path), str(final_path))
-            except Exception:
-                os.replace(temp_path, final_path)
 
-            return str(final_path)
+def link_resolved(entry_url: str, get_url: Optional[str], logger=None) -> bool:
+    """入口解析完成：发出 ResolveOk 或 ResolveEmpty，返回是否得到了下载链接。"""
+    if not get_url:
+        emit(ResolveEmpty(entry_url), logger=logger)
+        return False
+    emit(ResolveOk(entry_url, get_url), logger=logger)
+    return True
+
+
+def accept_download(path, entry_url: str, result: dict, expected_ext: str, logger=None) -> bool:
+    """
+    校验从 entry_url 下载的文件：通过时发出 MirrorOk 并返回 True；
+    否则删除文件、让该入口的链接缓存失效并返回 False（换下一个镜像）。
+    """
+    if not validate_download(path, expected_ext):
+        emit(ValidationFailed(entry_url, path), logger=logger)
+        LINK_CACHE.invalidate(entry_url, result.get("md5"))
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+    emit(MirrorOk(entry_url, path), logger=logger)
+    return True
 
-        except (requests.Timeout, requests.ConnectionError, ChunkedEncodingError, IncompleteRead) as e:
-            last_exc = e
-            continue
-        except requests.HTTPError as e:
-            last_exc = e
-            break
-        except DownloadError as e:
-            last_exc = e
-            if cancel_event or stop_event:
-                for p in [locals().get("temp_path"), locals().get("final_path")]:
-                    if p and os.path.exists(p):
-                        try:
-                            os.remove(p)
-                        except OSError:
-                            pass
-            break
 
-    raise DownloadError(f"下载失败（GET: {get_url}）：{last_exc}")
+def mirror_failed(entry_url: str, result: dict, error, logger=None) -> None:
+    emit(MirrorFailed(entry_url, error), logger=logger)
+    LINK_CACHE.invalidate(entry_url, result.get("md5"))
 
 
 def download_for_result(
@@ -258,61 +712,29 @@ def download_for_result(
     logger=None,
     progress_cb=None,
     cancel_event: Event | None = None,
+    stall: StallPolicy | None = None,
 ) -> str:
     """
     针对单个搜索结果：尝试多个入口，解析下载链接并执行带重试的下载。
+    某个镜像因速度过低被放弃时，下一个镜像从已下载的 .part（md5 一致）继续。
     """
-    filename = build_filename_from_result(result)
-    _log(f"[*] 计划保存文件名: {filename}", logger=logger)
-    expected_ext = (result.get("extension") or "").lower()
-
-    candidate_urls: list[str] = []
-    if result.get("ads_url"):
-        candidate_urls.append(result["ads_url"])
-    for u in result.get("mirrors") or []:
-        if u not in candidate_urls:
-            candidate_urls.append(u)
-
-    if not candidate_urls:
-        raise DownloadError("没有可用的下载入口链接（既没有 ads_url 也没有 mirrors）")
-
-    entries = candidate_urls[:max_entry_urls]
-
-    def validate_file(path):
-        try:
-            if not os.path.exists(path):
-                return False
-            size = os.path.getsize(path)
-            if size < 10 * 1024:
-                return False
-            with open(path, "rb") as f:
-                sig = f.read(8)
-            if expected_ext == "pdf" and not sig.startswith(b"%PDF"):
-                return False
-            if expected_ext in {"epub", "zip"} and not sig.startswith(b"PK"):
-                return False
-            return True
-        except Exception:
-            return False
+    import requests
 
+    filename, expected_ext, entries = plan_entries(result, max_entry_urls, logger=logger)
     last_err = None
 
     for i, entry_url in enumerate(entries):
-        _log(f"[*] 尝试第 {i+1} 个下载入口: {entry_url}", logger=logger)
+        emit(MirrorTried(i + 1, entry_url), logger=logger)
         try:
-            get_url = fetch_download_link_from_page(entry_url)
+            get_url = resolve_download_link(entry_url, result.get("md5"))
         except requests.RequestException as e:
-            _log(f"[!] 打开入口页失败: {e}", level="error", logger=logger)
+            emit(ResolveFailed(entry_url, e), logger=logger)
             last_err = e
             continue
-
-        if not get_url:
-            _log("[!] 在入口页中没有找到 get/download 链接，尝试下一个入口", level="warning", logger=logger)
+        if not link_resolved(entry_url, get_url, logger=logger):
             continue
 
-        _log(f"[*] 解析到下载链接: {get_url}", logger=logger)
         try:
-            temp_root = Path(out_dir) / ".partial"
             path = download_file_from_get_url(
                 get_url,
                 out_dir=out_dir,
@@ -322,30 +744,18 @@ def download_for_result(
                 progress_cb=progress_cb,
                 cancel_event=cancel_event,
                 stop_event=None,
-                temp_dir=temp_root,
+                temp_dir=Path(out_dir) / ".partial",
+                md5=result.get("md5"),
+                stall=stall,
+                expected_size=result.get("size_bytes"),
             )
-            if not validate_file(path):
-                _log("[!] 下载文件校验失败，尝试其他镜像", level="warning", logger=logger)
-                try:
-                    os.remove(path)
-                except OSError:
-                    pass
-                continue
-            _log(f"[+] 使用入口 {entry_url} 下载成功", level="success", logger=logger)
-            return path
+        except InsufficientSpace:
+            raise
         except DownloadError as e:
-            _log(f"[!] 使用入口 {entry_url} 下载失败: {e}", level="error", logger=logger)
+            mirror_failed(entry_url, result, e, logger=logger)
             last_err = e
             continue
+        if accept_download(path, entry_url, result, expected_ext, logger=logger):
+            return path
 
     raise DownloadError(f"该条目所有尝试的镜像/入口均下载失败: {last_err}")
-
-
-def _log(message, level: str = "info", logger=None):
-    if logger:
-        try:
-            logger(level, message)
-            return
-        except Exception:
-            pass
-    print(message)
@@ -2,4 +2,20 @@ class DownloadError(Exception):
     """Raised when a download or mirror attempt ultimately fails."""
 
 
-__all__ = ["DownloadError"]
+class TransferStalled(DownloadError):
+    """Raised when a transfer stays below the stall speed floor; the .part file is kept for resuming."""
+
+
+class InsufficientSpace(DownloadError):
+    """Raised when the target filesystem cannot hold the transfer; other mirrors or candidates would not help."""
+
+
+class SearchCancelled(Exception):
+    """Raised when an in-flight search is cancelled or superseded."""
+
+
+class SearchError(Exception):
+    """Raised when a search request itself fails (network error, HTTP 5xx), as opposed to finding nothing."""
+
+
+__all__ = ["DownloadError", "InsufficientSpace", "SearchCancelled", "SearchError", "TransferStalled"]
@@ -0,0 +1,518 @@
+"""
+Structured events emitted by the search/download/pipeline helpers.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+from .scheduler import format_bytes, format_eta
+
+
+# scope() 登记的订阅者：只接收当前上下文（线程或 asyncio 任务）中发出的事件
+_SCOPED: ContextVar = ContextVar("libgen_scoped_subscribers", default=())
+
+
+class EventBus:
+    """
+    进程内事件总线，各辅助函数通过它报告进度，不再直接拼日志行：
+    - subscribe(callback, *types)：订阅事件对象（不指定类型则接收全部）
+    - scope(callback, *types)：with 块内只订阅当前线程/任务发出的事件（GUI 的每个 worker 各用一个）
+    - add_text_sink(sink)：注册文本输出 sink(level, message)
+    文本按 logger、sink 的顺序输出；两者都没有且当前上下文没有 scope 订阅者时（库调用方直接使用辅助函数）
+    与旧版一样 print。订阅列表以元组保存，emit 时无需加锁。
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._subscribers = ()
+        self._sinks = ()
+
+    def subscribe(self, callback, *types):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s[0] != callback) + ((callback, types or None),)
+        return callback
+
+    def unsubscribe(self, callback) -> None:
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s[0] != callback)
+
+    @contextmanager
+    def scope(self, callback, *types):
+        token = _SCOPED.set(_SCOPED.get() + ((callback, types or None),))
+        try:
+            yield callback
+        finally:
+            _SCOPED.reset(token)
+
+    def add_text_sink(self, sink) -> None:
+        with self._lock:
+            if sink not in self._sinks:
+                self._sinks = self._sinks + (sink,)
+
+    def remove_text_sink(self, sink) -> None:
+        with self._lock:
+            self._sinks = tuple(s for s in self._sinks if s != sink)
+
+    def has_sinks(self) -> bool:
+        return bool(self._sinks)
+
+    def wants(self, event_type) -> bool:
+        """是否有订阅者会接收该类型的事件（供高频事件在发出前判断）。"""
+        subscribers = self._subscribers + _SCOPED.get()
+        return any(types is None or issubclass(event_type, types) for _cb, types in subscribers)
+
+    def emit(self, event, logger=None) -> None:
+        scoped = _SCOPED.get()
+        for callback, types in self._subscribers + scoped:
+            if types is None or isinstance(event, types):
+                try:
+                    callback(event)
+                except Exception:
+                    pass
+        if event.loggable and (logger is not None or self._sinks or not scoped):
+            self.write(event.level, event.message(), logger=logger)
+
+    def write(self, level: str, message: str, logger=None) -> None:
+        """输出一行文本：优先交给 logger，logger 缺失或出错时交给已注册的 sink，都没有时 print。"""
+        if logger is not None:
+            try:
+                logger(level, message)
+                return
+            except Exception:
+                pass
+        sinks = self._sinks
+        if not sinks:
+            print(message)
+        for sink in sinks:
+            try:
+                sink(level, message)
+            except Exception:
+                pass
+
+
+def print_sink(level: str, message: str) -> None:
+    print(message)
+
+
+class BaseEvent:
+    level = "info"
+    loggable = True
+
+    def message(self) -> str:
+        return type(self).__name__
+
+
+@dataclass
+class SearchStarted(BaseEvent):
+    query: str
+    fallback_level: int
+    language: Optional[str] = None
+    ext: Optional[str] = None
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    author: Optional[str] = None
+
+    def message(self):
+        return (
+            f"[*] 尝试搜索: '{self.query}' (Level {self.fallback_level}) | 语言={self.language}, 格式={self.ext}, "
+            f"年份={self.year_min}-{self.year_max}, 作者={self.author}"
+        )
+
+
+@dataclass
+class SearchFailed(BaseEvent):
+    query: str
+    fallback_level: int
+    error: Exception
+    level = "error"
+
+    def message(self):
+        return f"[!] 搜索请求失败: {self.error}"
+
+
+@dataclass
+class FallbackLevel(BaseEvent):
+    query: str
+    fallback_level: int
+    level = "warning"
+
+    def message(self):
+        return f"[!] Level {self.fallback_level} 无结果，尝试降低过滤要求..."
+
+
+@dataclass
+class SearchDone(BaseEvent):
+    """smart_search 某一级别的最终结果；outcome 为 hit/filtered_out/empty/error，pushed 为交给服务器筛选的条件。"""
+
+    query: str
+    fallback_level: int
+    outcome: str
+    raw: int = 0
+    matched: int = 0
+    pushed: tuple = ()
+    loggable = False
+
+
+@dataclass
+class PushdownDisabled(BaseEvent):
+    """服务器没有按查询语法筛选（忽略了条件，或把它当作普通关键词），之后对该主机改为只在本地筛选。"""
+
+    host: str
+    filters: tuple
+    reason: str
+    level = "warning"
+
+    def message(self):
+        return f"[!] {self.host} 不支持服务器端筛选 {', '.join(self.filters)}（{self.reason}），改为本地筛选"
+
+
+@dataclass
+class SearchSkipped(BaseEvent):
+    """输入已给出 md5，跳过搜索直接解析入口页。"""
+
+    query: str
+    md5: str
+
+    def message(self):
+        return f"[*] 已知 md5 {self.md5}，跳过搜索直接解析下载入口"
+
+
+@dataclass
+class NegativeSkipped(BaseEvent):
+    """条目（查询或 md5）近期反复失败，仍在退避期内，本次跳过或延后。kind 为 not_found/failed。"""
+
+    query: str
+    kind: str
+    failures: int
+    retry_in: float
+
+    def message(self):
+        what = "未找到结果" if self.kind == "not_found" else "所有镜像均下载失败"
+        return f"[*] '{self.query}' 最近 {self.failures} 次{what}，约 {format_eta(self.retry_in)} 后再试"
+
+
+@dataclass
+class ItemStarted(BaseEvent):
+    query: str
+
+    def message(self):
+        return f"[*] 正在处理: {self.query}"
+
+
+@dataclass
+class CandidateTried(BaseEvent):
+    position: int
+    title: str
+
+    def message(self):
+        return f"[*] 尝试第 {self.position} 个候选结果: {self.title}"
+
+
+@dataclass
+class CandidateFailed(BaseEvent):
+    title: str
+    error: Exception
+    level = "error"
+
+    def message(self):
+        return f"[!] 下载失败: {self.error}"
+
+
+@dataclass
+class FilePlanned(BaseEvent):
+    filename: str
+
+    def message(self):
+        return f"[*] 计划保存文件名: {self.filename}"
+
+
+@dataclass
+class FileRenamed(BaseEvent):
+    """目标目录中已有同名文件（或另一个任务刚刚保存了同名文件），改用带序号的文件名。"""
+
+    planned: str
+    actual: str
+
+    def message(self):
+        return f"[*] 已存在同名文件 {self.planned}，保存为: {self.actual}"
+
+
+@dataclass
+class AlreadyDownloaded(BaseEvent):
+    """目标目录中已有内容相同的文件（例如重新运行同一批任务），丢弃刚下载的副本。"""
+
+    path: str
+
+    def message(self):
+        return f"[*] 已存在相同的文件，不再重复保存: {self.path}"
+
+
+@dataclass
+class MirrorTried(BaseEvent):
+    position: int
+    entry_url: str
+
+    def message(self):
+        return f"[*] 尝试第 {self.position} 个下载入口: {self.entry_url}"
+
+
+@dataclass
+class ResolveFailed(BaseEvent):
+    entry_url: str
+    error: Exception
+    level = "error"
+
+    def message(self):
+        return f"[!] 打开入口页失败: {self.error}"
+
+
+@dataclass
+class ResolveEmpty(BaseEvent):
+    entry_url: str
+    level = "warning"
+
+    def message(self):
+        return "[!] 在入口页中没有找到 get/download 链接，尝试下一个入口"
+
+
+@dataclass
+class ResolveOk(BaseEvent):
+    entry_url: str
+    get_url: str
+
+    def message(self):
+        return f"[*] 解析到下载链接: {self.get_url}"
+
+
+@dataclass
+class ValidationFailed(BaseEvent):
+    entry_url: str
+    path: str
+    level = "warning"
+
+    def message(self):
+        return "[!] 下载文件校验失败，尝试其他镜像"
+
+
+@dataclass
+class MirrorOk(BaseEvent):
+    entry_url: str
+    path: str
+    level = "success"
+
+    def message(self):
+        return f"[+] 使用入口 {self.entry_url} 下载成功"
+
+
+@dataclass
+class MirrorFailed(BaseEvent):
+    entry_url: str
+    error: Exception
+    level = "error"
+
+    def message(self):
+        return f"[!] 使用入口 {self.entry_url} 下载失败: {self.error}"
+
+
+@dataclass
+class TransferProgress(BaseEvent):
+    """传输进度（按 PROGRESS_STEP 字节节流，只在有订阅者时发出，不输出文本）。"""
+
+    url: str
+    downloaded: int
+    total: Optional[int]
+    loggable = False
+
+
+@dataclass
+class PartialAdopted(BaseEvent):
+    """接手了同一文件（md5 一致）此前中断留下的 .part，从已下载的位置续传。"""
+
+    filename: str
+    size: int
+
+    def message(self):
+        return f"[*] 找到此前未完成的下载（{format_bytes(self.size)}），续传: {self.filename}"
+
+
+@dataclass
+class DiskSpaceWait(BaseEvent):
+    """目标磁盘的空闲空间扣除进行中传输的预留后不足，本次传输等待其它传输结束。"""
+
+    path: str
+    needed: int
+    free: int
+    level = "warning"
+
+    def message(self):
+        return (
+            f"[!] {self.path} 所在磁盘可用 {format_bytes(self.free)}，扣除进行中下载的预留后不足以容纳 "
+            f"{format_bytes(self.needed)}，等待其它下载完成"
+        )
+
+
+@dataclass
+class StallDetected(BaseEvent):
+    url: str
+    speed: float
+    downloaded: int
+    level = "warning"
+
+    def message(self):
+        return (
+            f"[!] 传输速度 {self.speed / 1024:.1f} KB/s 持续低于下限，放弃当前镜像"
+            f"（保留已下载的 {self.downloaded / 1024 / 1024:.1f} MB 供下一个镜像续传）"
+        )
+
+
+@dataclass
+class StageError(BaseEvent):
+    stage: str
+    query: str
+    error: Exception
+    level = "error"
+
+    def message(self):
+        return f"[!] 处理失败: {self.error}"
+
+
+@dataclass
+class ItemDone(BaseEvent):
+    """一个条目处理结束；status 为 success/not_found/failed/cancelled/skipped，error 为失败原因（如搜索请求失败）。"""
+
+    query: Optional[str]
+    status: str
+    path: Optional[str] = None
+    md5: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def level(self):
+        return {"success": "success", "failed": "error", "skipped": "info"}.get(self.status, "warning")
+
+    def message(self):
+        if self.status == "success":
+            return f"[+] 下载成功: {self.path}"
+        if self.status == "not_found":
+            return f"[!] '{self.query}' 最终未找到匹配结果"
+        if self.status == "cancelled":
+            return "[!] 下载已取消"
+        if self.status == "skipped":
+            return f"[*] 已跳过 '{self.query}'（--force 强制重试）"
+        if self.error:
+            return f"[!] '{self.query}' 处理失败：{self.error}"
+        return "[!] 所有候选结果均下载失败"
+
+
+@dataclass
+class BatchProgress(BaseEvent):
+    """批量传输的按字节进度：每个条目传输结束时发出；seconds 为按平均速度估算的剩余时间。"""
+
+    finished: int
+    pending: int
+    remaining_bytes: int
+    seconds: Optional[float]
+
+    def message(self):
+        return (
+            f"[*] 批次进度：已完成 {self.finished} 个，待传输 {self.pending} 个，"
+            f"剩余约 {format_bytes(self.remaining_bytes)}，预计 {format_eta(self.seconds)}"
+        )
+
+
+@dataclass
+class LinkExported(BaseEvent):
+    """--resolve-only：条目已解析出 get 链接并写入导出文件，不在本进程下载。"""
+
+    query: Optional[str]
+    get_url: str
+    filename: str
+    level = "success"
+
+    def message(self):
+        return f"[+] 已导出下载链接: {self.filename}"
+
+
+@dataclass
+class FileImported(BaseEvent):
+    """外部下载器完成的文件导入结果；status 为 imported/verified/missing/incomplete/size_mismatch/md5_mismatch/invalid/exists。"""
+
+    filename: str
+    status: str
+    path: Optional[str] = None
+
+    @property
+    def level(self):
+        return "success" if self.status in ("imported", "verified") else "warning"
+
+    def message(self):
+        return {
+            "imported": f"[+] 已校验并导入: {self.path}",
+            "verified": f"[+] 已校验: {self.path}",
+            "missing": f"[!] 未找到文件（尚未下载？）: {self.filename}",
+            "incomplete": f"[!] 文件仍在下载中（存在 .aria2 控制文件）: {self.filename}",
+            "size_mismatch": f"[!] 文件大小与记录不符，未导入: {self.path}",
+            "md5_mismatch": f"[!] md5 不一致，未导入: {self.path}",
+            "invalid": f"[!] 文件内容与扩展名不符，未导入: {self.path}",
+            "exists": f"[!] 目标已存在同名文件，未导入: {self.path}",
+        }.get(self.status, f"[!] {self.filename}: {self.status}")
+
+
+BUS = EventBus()
+emit = BUS.emit
+
+
+def item_logger(seq, logger=None):
+    """
+    批量条目用的 logger：文本加 [#序号] 前缀后交给 logger、sink 或 print。
+    当前上下文只有 scope 订阅者（不输出文本）时返回 None，事件消息不会被格式化。
+    """
+    if logger is None and not BUS.has_sinks() and _SCOPED.get():
+        return None
+
+    def write(level, message):
+        BUS.write(level, f"[#{seq}] {message}", logger=logger)
+
+    return write
+
+
+__all__ = [
+    "BUS",
+    "EventBus",
+    "emit",
+    "item_logger",
+    "print_sink",
+    "BaseEvent",
+    "SearchStarted",
+    "SearchFailed",
+    "FallbackLevel",
+    "SearchDone",
+    "PushdownDisabled",
+    "SearchSkipped",
+    "NegativeSkipped",
+    "ItemStarted",
+    "CandidateTried",
+    "CandidateFailed",
+    "FilePlanned",
+    "FileRenamed",
+    "AlreadyDownloaded",
+    "MirrorTried",
+    "ResolveFailed",
+    "ResolveEmpty",
+    "ResolveOk",
+    "ValidationFailed",
+    "MirrorOk",
+    "MirrorFailed",
+    "TransferProgress",
+    "StallDetected",
+    "DiskSpaceWait",
+    "PartialAdopted",
+    "StageError",
+    "ItemDone",
+    "BatchProgress",
+    "LinkExported",
+    "FileImported",
+]
@@ -0,0 +1,238 @@
+"""
+Resolve-only export for external downloaders (aria2 input file or JSONL).
+"""
+
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Event
+
+from .download import build_filename_from_result, resolve_first_link, validate_download
+from .events import FileImported, ItemDone, ItemStarted, LinkExported, ResolveOk, emit, item_logger
+from .finalize import file_md5, finalize
+from .pipeline import search_candidates
+
+EXPORT_FORMATS = ("aria2", "jsonl")
+# 导入时大小预检的相对容差（另见 _size_matches）
+SIZE_TOLERANCE = 0.1
+
+
+def export_record(query: str, result: dict, entry_url: str, get_url: str, out_dir) -> dict:
+    """一个已解析条目的导出记录（aria2 与 JSONL 两种格式共用）。"""
+    return {
+        "query": query,
+        "url": get_url,
+        "entry_url": entry_url,
+        "out": build_filename_from_result(result),
+        "dir": str(Path(out_dir).resolve()),
+        "md5": result.get("md5"),
+        "size_bytes": result.get("size_bytes") or None,
+        "title": result.get("title") or None,
+        "extension": result.get("extension") or None,
+    }
+
+
+def format_aria2(record: dict) -> str:
+    """
+    aria2 输入文件的一个条目：URI 行 + 缩进的选项行（out/dir/checksum）。
+    查询词与列表中的大小写成注释行（导入时用于日志与大小预检），aria2 会忽略。
+    """
+    lines = []
+    if record.get("query"):
+        lines.append(f"# {' '.join(str(record['query']).split())}")
+    if record.get("size_bytes"):
+        lines.append(f"# size_bytes={int(record['size_bytes'])}")
+    lines.append(record["url"])
+    lines.append(f"  out={record['out']}")
+    lines.append(f"  dir={record['dir']}")
+    if record.get("md5"):
+        lines.append(f"  checksum=md5={record['md5']}")
+    return "\n".join(lines) + "\n"
+
+
+def parse_aria2(text: str) -> list[dict]:
+    """解析 format_aria2 写出的输入文件（也能读取手写的 aria2 输入文件中的 out/dir/checksum 选项）。"""
+    records = []
+    current = None
+    query = size = None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith("#"):
+            comment = line[1:].strip()
+            if comment.startswith("size_bytes=") and comment[len("size_bytes="):].isdigit():
+                size = int(comment[len("size_bytes="):])
+            else:
+                query = comment or None
+            continue
+        if line[0].isspace():
+            if current is None or "=" not in line:
+                continue
+            key, value = line.strip().split("=", 1)
+            if key == "checksum" and value.lower().startswith("md5="):
+                current["md5"] = value[4:].lower()
+            elif key in ("out", "dir"):
+                current[key] = value
+            continue
+        uris = line.split("\t")
+        current = {"query": query, "url": uris[0].strip(), "out": None, "dir": None, "md5": None, "size_bytes": size}
+        records.append(current)
+        query = size = None
+    return records
+
+
+def read_export(path) -> list[dict]:
+    """读取导出文件，按内容自动识别 JSONL 或 aria2 格式。"""
+    text = Path(path).read_text(encoding="utf-8")
+    if text.lstrip().startswith("{"):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return parse_aria2(text)
+
+
+def resolve_item(item: dict, args, out_dir, logger=None, cancel_event: Event | None = None) -> dict | None:
+    """搜索（或按 md5/isbn 直达）并解析首个可用候选的 get 链接；返回导出记录，全部失败时返回 None。"""
+    query = item["query"]
+    emit(ItemStarted(query), logger=logger)
+    candidates = search_candidates(
+        query,
+        args,
+        language=item.get("language"),
+        ext=item.get("ext"),
+        year_min=item.get("year_min"),
+        year_max=item.get("year_max"),
+        author=item.get("author"),
+        author_exact=item.get("author_exact"),
+        logger=logger,
+        cancel_event=cancel_event,
+        md5=item.get("md5"),
+        isbn=item.get("isbn"),
+    )
+    for chosen in candidates:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        link = resolve_first_link(chosen, args.max_entry_urls, logger=logger)
+        if link:
+            entry_url, get_url = link
+            emit(ResolveOk(entry_url, get_url), logger=logger)
+            record = export_record(query, chosen, entry_url, get_url, out_dir)
+            emit(LinkExported(query, get_url, record["out"]), logger=logger)
+            return record
+    if candidates:
+        emit(ItemDone(query, "cancelled" if cancel_event is not None and cancel_event.is_set() else "failed"), logger=logger)
+    return None
+
+
+def resolve_only(items, args, path, fmt: str = "aria2", out_dir=None, workers: int = 8, logger=None, cancel_event=None) -> dict:
+    """
+    并行解析全部条目并按输入顺序写出导出文件（逐条 flush，中断时已解析的条目不会丢失），传输交给外部下载器。
+    每条记录包含 get 链接、build_filename_from_result() 生成的文件名、期望的 md5 和列出的大小。
+    同时在途的条目数限制为 workers 的两倍，大 CSV 也不会一次性读入。返回 {"exported": n, "failed": n}。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未知的导出格式：{fmt}")
+    out_dir = out_dir or args.out_dir
+    cancel_event = cancel_event or Event()
+    counts = {"exported": 0, "failed": 0}
+    workers = max(1, workers)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "w", encoding="utf-8") as fh, ThreadPoolExecutor(workers, thread_name_prefix="resolve-only") as pool:
+        pending = deque()
+
+        def drain_one():
+            future = pending.popleft()
+            record = future.result()
+            if record is None:
+                counts["failed"] += 1
+                return
+            if fmt == "aria2":
+                fh.write(format_aria2(record))
+            else:
+                fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+            fh.flush()
+            counts["exported"] += 1
+
+        try:
+            for seq, item in enumerate(items, 1):
+                if cancel_event.is_set():
+                    break
+                item.setdefault("seq", seq)
+                pending.append(pool.submit(_resolve_safely, item, args, out_dir, item_logger(item.get("seq"), logger), cancel_event))
+                if len(pending) >= workers * 2:
+                    drain_one()
+            while pending:
+                drain_one()
+        except KeyboardInterrupt:
+            cancel_event.set()
+            raise
+    return counts
+
+
+def _resolve_safely(item, args, out_dir, logger, cancel_event):
+    try:
+        return resolve_item(item, args, out_dir, logger=logger, cancel_event=cancel_event)
+    except Exception as e:  # noqa: BLE001
+        item["error"] = str(e)
+        emit(ItemDone(item["query"], "failed"), logger=logger)
+        return None
+
+
+def import_downloads(export_path, library_dir, source_dir=None, logger=None) -> dict:
+    """
+    把外部下载器按导出文件下载完成的文件导入 library_dir：md5 一致且内容与扩展名相符才移动；
+    仍有 .aria2 控制文件的视为未完成，大小与记录明显不符的不计算 md5 直接判为 size_mismatch。source_dir 覆盖记录中的 dir（下载器在别的挂载点运行时）。
+    返回各状态的计数。文件已在 library_dir 中时只做校验（verified）。
+    """
+    library = Path(library_dir)
+    counts: dict = {}
+    for record in read_export(export_path):
+        filename = record.get("out") or os.path.basename(record["url"].split("?", 1)[0])
+        src = Path(source_dir or record.get("dir") or library) / filename
+        status, path = _import_one(record, src, library / filename)
+        counts[status] = counts.get(status, 0) + 1
+        emit(FileImported(filename, status, str(path) if path else None), logger=logger)
+    return counts
+
+
+def _import_one(record: dict, src: Path, dest: Path):
+    if Path(f"{src}.aria2").exists():
+        return "incomplete", src
+    if not src.exists():
+        return "missing", None
+    size = record.get("size_bytes")
+    if size and not _size_matches(src.stat().st_size, size):
+        return "size_mismatch", src
+    expected = (record.get("md5") or "").lower()
+    if expected and file_md5(src) != expected:
+        return "md5_mismatch", src
+    ext = (record.get("extension") or Path(src).suffix.lstrip(".")).lower()
+    if not validate_download(src, ext):
+        return "invalid", src
+    if src.resolve() == dest.resolve():
+        return "verified", dest
+    if dest.exists():
+        return "exists", dest
+    return "imported", finalize(src, dest)
+
+
+def _size_matches(actual: int, listed: int) -> bool:
+    # 列表中的大小是按显示单位取整的文本（"1 MB" 可能是 1.0–1.99 MB）：容差取 SIZE_TOLERANCE 与一个显示单位中的较大者
+    unit = 1
+    while unit * 1024 <= listed:
+        unit *= 1024
+    return abs(actual - listed) <= max(listed * SIZE_TOLERANCE, unit)
+
+
+__all__ = [
+    "EXPORT_FORMATS",
+    "export_record",
+    "file_md5",
+    "format_aria2",
+    "import_downloads",
+    "parse_aria2",
+    "read_export",
+    "resolve_item",
+    "resolve_only",
+]
@@ -0,0 +1,186 @@
+"""
+Same-device staging and collision-free atomic finalize for downloads.
+"""
+
+import errno
+import filecmp
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from threading import Lock, get_ident
+
+from .diskspace import _existing
+
+HASH_CHUNK = 1024 * 1024
+_LOCK = Lock()
+_ACTIVE_PARTS: set = set()
+# 硬链接不可用时（FAT/exFAT、部分 SMB 挂载）link 失败的 errno
+_NO_LINK = {errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOSYS, errno.EACCES}
+
+
+def same_device(a, b) -> bool:
+    try:
+        return os.stat(_existing(a)).st_dev == os.stat(_existing(b)).st_dev
+    except OSError:
+        return False
+
+
+def staging_dir(out_dir, temp_dir=None) -> Path:
+    """
+    与 out_dir 位于同一文件系统的临时目录：优先 temp_dir，其次 out_dir/.partial，再次 out_dir/.staging
+    （.partial 是指向其它磁盘的链接时）。结果只取决于路径与挂载情况，重新运行时能找回上次的 .part 续传。
+    跨文件系统时改名会变成整份复制再删除，因此暂存目录必须与目标在同一设备上。
+    """
+    out_path = Path(out_dir)
+    candidates = [Path(temp_dir)] if temp_dir else []
+    candidates += [out_path / ".partial", out_path / ".staging"]
+    for candidate in candidates:
+        if same_device(candidate, out_path):
+            candidate.mkdir(parents=True, exist_ok=True)
+            if same_device(candidate, out_path):  # 新建的目录可能正好是挂载点下的链接
+                return candidate
+    fallback = Path(temp_dir) if temp_dir else out_path / ".partial"
+    fallback.mkdir(parents=True, exist_ok=True)
+    return fallback
+
+
+def numbered(path: Path, n: int) -> Path:
+    """name.ext -> name (n).ext"""
+    return path if n == 0 else path.with_name(f"{path.stem} ({n}){path.suffix}")
+
+
+def claim_part(tmp_root, fname: str) -> Path:
+    """为本进程内的一次传输占用一个 .part 路径；同名文件正在另一个线程中下载时改用 name (n).ext.part。"""
+    with _LOCK:
+        n = 0
+        while True:
+            candidate = Path(tmp_root) / f"{numbered(Path(fname), n).name}.part"
+            if candidate not in _ACTIVE_PARTS:
+                _ACTIVE_PARTS.add(candidate)
+                return candidate
+            n += 1
+
+
+def try_claim(part_path) -> bool:
+    """占用一个已存在的 .part（例如按 md5 找到的旧 .part）；已被本进程的其它传输占用时返回 False。"""
+    part_path = Path(part_path)
+    with _LOCK:
+        if part_path in _ACTIVE_PARTS:
+            return False
+        _ACTIVE_PARTS.add(part_path)
+        return True
+
+
+def is_claimed(part_path) -> bool:
+    with _LOCK:
+        return Path(part_path) in _ACTIVE_PARTS
+
+
+def release_part(part_path) -> None:
+    with _LOCK:
+        _ACTIVE_PARTS.discard(Path(part_path))
+
+
+def file_md5(path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_duplicate(part_path, final_path, md5=None):
+    """
+    final_path 及已有的 "name (n).ext" 中与 part_path 内容相同的文件（重新运行同一批任务时已下载过），没有时返回 None。
+    大小相同才进一步比较：已有文件的 md5 与给出的 md5 一致，或与 part_path 逐字节相同。
+    """
+    part_path = Path(part_path)
+    final_path = Path(final_path)
+    try:
+        size = part_path.stat().st_size
+    except OSError:
+        return None
+    n = 0
+    while True:
+        candidate = numbered(final_path, n)
+        try:
+            if candidate.stat().st_size == size:
+                if (md5 and file_md5(candidate) == md5.lower()) or filecmp.cmp(candidate, part_path, shallow=False):
+                    return candidate
+        except FileNotFoundError:
+            return None
+        except OSError:
+            pass
+        n += 1
+
+
+def finalize(part_path, final_path) -> Path:
+    """
+    把已完成的 part_path 以不覆盖任何已有文件的方式发布为 final_path（重名时依次尝试 "name (n).ext"），
+    返回实际路径。part_path 与目标不在同一文件系统时，先复制到目标目录内的临时文件再改名，
+    发布本身始终是同一目录内的原子操作：用硬链接占用目标名（名称已存在时原子地失败，不会覆盖其它线程或进程的文件），
+    不支持硬链接的文件系统改用 O_EXCL 占位文件，再以 os.replace() 换成完成的文件。
+    """
+    part_path = Path(part_path)
+    final_path = Path(final_path)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    source = part_path
+    if not same_device(part_path, final_path.parent):
+        source = final_path.parent / f".{final_path.name}.{os.getpid()}-{get_ident()}.tmp"
+        shutil.copyfile(part_path, source)
+    try:
+        with _LOCK:
+            n = 0
+            while True:
+                candidate = numbered(final_path, n)
+                if _publish(source, candidate):
+                    break
+                n += 1
+    except BaseException:
+        if source != part_path:
+            source.unlink(missing_ok=True)
+        raise
+    if source != part_path:
+        part_path.unlink(missing_ok=True)
+    return candidate
+
+
+def _publish(source: Path, target: Path) -> bool:
+    """target 不存在时把 source 原子地改名为 target 并返回 True；target 已存在时返回 False。"""
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        return False
+    except OSError as e:
+        if e.errno not in _NO_LINK:
+            raise
+        return _publish_excl(source, target)
+    source.unlink()
+    return True
+
+
+def _publish_excl(source: Path, target: Path) -> bool:
+    try:
+        os.close(os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+    except FileExistsError:
+        return False
+    try:
+        os.replace(source, target)
+    except BaseException:
+        target.unlink(missing_ok=True)
+        raise
+    return True
+
+
+__all__ = [
+    "claim_part",
+    "file_md5",
+    "finalize",
+    "find_duplicate",
+    "is_claimed",
+    "release_part",
+    "same_device",
+    "staging_dir",
+    "try_claim",
+]
@@ -1,16 +1,20 @@
 from libgen_downloader.gui.main_window import MainWindow, main  # noqa: F401
 from libgen_downloader.gui.style import DARK_QSS  # noqa: F401
-from libgen_downloader.gui.dialogs import CSVImportDialog  # noqa: F401
+from libgen_downloader.gui.dialogs import CSVImportDialog, StatsDialog  # noqa: F401
+from libgen_downloader.gui.models import SearchResultsModel  # noqa: F401
 from libgen_downloader.gui.toast import ToastNotification  # noqa: F401
-from libgen_downloader.gui.workers import SearchWorker, TaskWorker, DownloadWorker  # noqa: F401
+from libgen_downloader.gui.workers import SearchWorker, TaskWorker, DownloadWorker, DaemonTaskWorker  # noqa: F401
 
 __all__ = [
     "MainWindow",
     "main",
     "DARK_QSS",
     "CSVImportDialog",
+    "StatsDialog",
+    "SearchResultsModel",
     "ToastNotification",
     "SearchWorker",
     "TaskWorker",
     "DownloadWorker",
+    "DaemonTaskWorker",
 ]
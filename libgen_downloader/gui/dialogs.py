@@ -1,6 +1,7 @@
 import csv
 from pathlib import Path
 
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import (
     QCheckBox,
     QComboBox,
@@ -17,6 +18,9 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
 )
 
+from ..metrics import METRICS
+from ..search import normalize_isbn, normalize_md5
+
 
 class CSVImportDialog(QDialog):
     def __init__(self, parent=None, preset_path=None):
@@ -65,9 +69,15 @@ class CSVImportDialog(QDialog):
         self.combo_ext = QComboBox()
         self.combo_year_min = QComboBox()
         self.combo_year_max = QComboBox()
+        self.combo_md5 = QComboBox()
+        self.combo_isbn = QComboBox()
+        self.combo_md5.setToolTip("有 md5 的行跳过搜索，直接解析下载入口")
+        self.combo_isbn.setToolTip("有 ISBN 的行只按 ISBN 搜索，取第一个结果")
         for i, (label, combo) in enumerate(
             [
                 ("搜索关键词*", self.combo_query),
+                ("md5 列", self.combo_md5),
+                ("ISBN 列", self.combo_isbn),
                 ("作者列", self.combo_author),
                 ("语言列", self.combo_lang),
                 ("格式列", self.combo_ext),
@@ -244,7 +254,16 @@ class CSVImportDialog(QDialog):
         return headers, rows, parse_errors
 
     def _fill_combo_options(self):
-        combos = [self.combo_query, self.combo_author, self.combo_lang, self.combo_ext, self.combo_year_min, self.combo_year_max]
+        combos = [
+            self.combo_query,
+            self.combo_md5,
+            self.combo_isbn,
+            self.combo_author,
+            self.combo_lang,
+            self.combo_ext,
+            self.combo_year_min,
+            self.combo_year_max,
+        ]
         for c in combos:
             c.clear()
             c.addItem("<未选择>")
@@ -260,6 +279,8 @@ class CSVImportDialog(QDialog):
                     return
 
         pick(self.combo_query, ["书名", "标题", "title", "name", "query"])
+        pick(self.combo_md5, ["md5", "hash"])
+        pick(self.combo_isbn, ["isbn", "isbn13", "isbn10", "identifier"])
         pick(self.combo_author, ["作者", "author", "authors"])
         pick(self.combo_lang, ["语言", "language", "lang"])
         pick(self.combo_ext, ["类型", "格式", "ext", "format"])
@@ -280,11 +301,13 @@ class CSVImportDialog(QDialog):
         if not path:
             QMessageBox.warning(self, "提示", "请先选择 CSV/XLSX 文件")
             return
-        if self.combo_query.currentIndex() <= 0:
-            QMessageBox.warning(self, "提示", "必须选择“搜索关键词”列")
+        if self.combo_query.currentIndex() <= 0 and self.combo_md5.currentIndex() <= 0 and self.combo_isbn.currentIndex() <= 0:
+            QMessageBox.warning(self, "提示", "必须选择“搜索关键词”、md5 或 ISBN 列中的至少一个")
             return
 
-        col_query = self.combo_query.currentText()
+        col_query = self.combo_query.currentText() if self.combo_query.currentIndex() > 0 else None
+        col_md5 = self.combo_md5.currentText() if self.combo_md5.currentIndex() > 0 else None
+        col_isbn = self.combo_isbn.currentText() if self.combo_isbn.currentIndex() > 0 else None
         col_author = self.combo_author.currentText() if self.combo_author.currentIndex() > 0 else None
         col_lang = self.combo_lang.currentText() if self.combo_lang.currentIndex() > 0 else None
         col_ext = self.combo_ext.currentText() if self.combo_ext.currentIndex() > 0 else None
@@ -297,7 +320,9 @@ class CSVImportDialog(QDialog):
         try:
             _, rows, parse_errors = self._read_tabular(path, preview_limit=None)
             for row in rows:
-                query = (row.get(col_query) or "").strip()
+                md5 = normalize_md5(row.get(col_md5)) if col_md5 else None
+                isbn = normalize_isbn(row.get(col_isbn)) if col_isbn and not md5 else None
+                query = ((row.get(col_query) or "").strip() if col_query else "") or md5 or isbn
                 if not query:
                     skipped += 1
                     continue
@@ -320,6 +345,8 @@ class CSVImportDialog(QDialog):
                     {
                         "type": "query",
                         "query": query,
+                        "md5": md5,
+                        "isbn": isbn,
                         "author": author or None,
                         "language": lang or None,
                         "ext": ext or None,
@@ -345,3 +372,102 @@ class CSVImportDialog(QDialog):
             return int(str(val).strip()) if str(val).strip() else None
         except ValueError:
             return None
+
+
+class StatsDialog(QDialog):
+    """分阶段耗时/计数统计面板（非模态，每秒刷新一次）"""
+
+    HEADERS = ["指标", "标签", "次数/值", "平均 ms", "p50 ms", "p95 ms", "p99 ms"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("统计面板")
+        self.resize(860, 480)
+
+        layout = QVBoxLayout()
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.NoSelection)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table, 1)
+
+        btn_row = QHBoxLayout()
+        reset_btn = QPushButton("清空")
+        reset_btn.clicked.connect(self.reset_metrics)
+        json_btn = QPushButton("导出 JSON")
+        json_btn.clicked.connect(lambda: self.export("json"))
+        prom_btn = QPushButton("导出 Prometheus")
+        prom_btn.clicked.connect(lambda: self.export("prom"))
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.close)
+        btn_row.addWidget(reset_btn)
+        btn_row.addStretch()
+        btn_row.addWidget(json_btn)
+        btn_row.addWidget(prom_btn)
+        btn_row.addWidget(close_btn)
+        layout.addLayout(btn_row)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        snap = METRICS.snapshot()
+        rows = []
+        for t in snap["timers"]:
+            q = t["quantiles"]
+            avg = t["sum"] / t["count"] if t["count"] else 0.0
+            rows.append(
+                [
+                    t["name"],
+                    self._format_labels(t["labels"]),
+                    str(t["count"]),
+                    f"{avg * 1000:.1f}",
+                    f"{q['0.5'] * 1000:.1f}",
+                    f"{q['0.95'] * 1000:.1f}",
+                    f"{q['0.99'] * 1000:.1f}",
+                ]
+            )
+        for c in snap["counters"]:
+            value = c["value"]
+            text = f"{value:,.0f}" if float(value).is_integer() else f"{value:.3f}"
+            rows.append([c["name"], self._format_labels(c["labels"]), text, "", "", "", ""])
+
+        self.table.setRowCount(len(rows))
+        for r, cells in enumerate(rows):
+            for c, text in enumerate(cells):
+                self.table.setItem(r, c, QTableWidgetItem(text))
+        state = "记录中" if METRICS.enabled else "未启用（在“统计”菜单中开启记录）"
+        self.status_label.setText(f"状态：{state}，计时 {len(snap['timers'])} 项，计数 {len(snap['counters'])} 项")
+
+    def reset_metrics(self):
+        METRICS.reset()
+        self.refresh()
+
+    def export(self, fmt):
+        if fmt == "json":
+            path, _ = QFileDialog.getSaveFileName(self, "导出 JSON", "metrics.json", "JSON Files (*.json)")
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "导出 Prometheus", "libgen.prom", "Prometheus textfile (*.prom)")
+        if not path:
+            return
+        try:
+            if fmt == "json":
+                METRICS.write_json(path)
+            else:
+                METRICS.write_prometheus(path)
+        except OSError as e:
+            QMessageBox.critical(self, "导出失败", f"写入文件出错：{e}")
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
+
+    @staticmethod
+    def _format_labels(labels):
+        return ", ".join(f"{k}={v}" for k, v in sorted(labels.items()))
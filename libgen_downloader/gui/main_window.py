@@ -3,9 +3,10 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
-from PyQt6.QtCore import QThread, Qt, QSettings, QUrl
+from PyQt6.QtCore import QSettings, QSortFilterProxyModel, QThread, Qt, QUrl
 from PyQt6.QtGui import QAction, QDesktopServices, QIcon
 from PyQt6.QtWidgets import (
+    QAbstractItemView,
     QApplication,
     QCheckBox,
     QComboBox,
@@ -23,6 +24,7 @@ from PyQt6.QtWidgets import (
     QPushButton,
     QSpinBox,
     QSplitter,
+    QTableView,
     QTableWidget,
     QTableWidgetItem,
     QTextEdit,
@@ -30,11 +32,18 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
-from .dialogs import CSVImportDialog
+from .dialogs import CSVImportDialog, StatsDialog
+from .models import SearchResultsModel
 from .style import DARK_QSS
 from .toast import ToastNotification
-from .workers import SearchWorker, TaskWorker
-from ..config import set_proxy
+from .workers import DaemonTaskWorker, SearchWorker, TaskWorker
+from ..config import CACHE_DIR, set_proxy
+from ..download import LINK_CACHE
+from ..metrics import METRICS
+from ..pipeline import NEGATIVE_CACHE
+from ..prefetch import LinkPrefetcher
+from ..profiling import Profiler
+from ..scheduler import BatchETA, Scheduler, format_bytes, format_eta
 
 
 class MainWindow(QMainWindow):
@@ -42,12 +51,21 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.setWindowTitle("Libgen GUI 下载器")
         self.settings = QSettings("Roo", "LibgenGUI")
-        self.results = []
-        self.download_queue = []
+        self.results_model = SearchResultsModel()
+        self.results = self.results_model.rows
+        self.download_queue = Scheduler("fifo")
+        self.batch_eta = BatchETA()
         self.active_downloads = []  # [(thread, worker, task)]
+        self.download_threads = set()  # 线程结束前保持引用（任务可能先于线程结束被移出 active_downloads）
         self.row_progress = {}  # queue_row -> (downloaded, total)
         self.queue_tasks = []
         self.notify_mode = "toast_all"  # toast_all | toast_fail | silent
+        self.search_generation = 0
+        self.search_jobs = {}  # generation -> (thread, worker)
+        self.prefetcher = LinkPrefetcher()
+        LINK_CACHE.enable_persistence(CACHE_DIR / "links.json")
+        NEGATIVE_CACHE.enable_persistence(CACHE_DIR / "negative.json")
+        self.prefetch_submitted = 0
 
         self._build_ui()
         self._apply_style()
@@ -72,6 +90,7 @@ class MainWindow(QMainWindow):
 
         search_grid.addWidget(QLabel("关键词:"), 0, 0)
         self.query_edit = QLineEdit()
+        self.query_edit.returnPressed.connect(self.start_search)
         search_grid.addWidget(self.query_edit, 0, 1, 1, 3)
 
         search_grid.addWidget(QLabel("作者:"), 0, 4)
@@ -131,6 +150,13 @@ class MainWindow(QMainWindow):
         self.proxy_edit.setFixedWidth(200)
         config_layout.addWidget(self.proxy_edit)
 
+        config_layout.addWidget(QLabel("守护进程:"))
+        self.daemon_edit = QLineEdit()
+        self.daemon_edit.setPlaceholderText("留空则本地下载")
+        self.daemon_edit.setToolTip("填写 libgen-cli --daemon 的地址（如 127.0.0.1:8765）后，下载任务交给守护进程执行")
+        self.daemon_edit.setFixedWidth(140)
+        config_layout.addWidget(self.daemon_edit)
+
         choose_btn = QPushButton("选择目录")
         choose_btn.clicked.connect(self.choose_directory)
         config_layout.addWidget(choose_btn)
@@ -146,6 +172,15 @@ class MainWindow(QMainWindow):
         self.concurrent_spin.setFixedWidth(60)
         config_layout.addWidget(self.concurrent_spin)
 
+        config_layout.addWidget(QLabel("调度:"))
+        self.schedule_combo = QComboBox()
+        self.schedule_combo.addItem("按顺序", userData="fifo")
+        self.schedule_combo.addItem("小文件优先", userData="sjf")
+        self.schedule_combo.addItem("大小均衡", userData="balanced")
+        self.schedule_combo.setToolTip("排队任务的开始顺序：小文件优先可尽快完成更多条目；大小均衡只让少数并行槽下载大文件")
+        self.schedule_combo.currentIndexChanged.connect(self._on_schedule_changed)
+        config_layout.addWidget(self.schedule_combo)
+
         config_layout.addWidget(QLabel("重试:"))
         self.retry_spin = QSpinBox()
         self.retry_spin.setRange(1, 10)
@@ -161,6 +196,15 @@ class MainWindow(QMainWindow):
         self.notify_combo.setFixedWidth(150)
         config_layout.addWidget(self.notify_combo)
 
+        self.prefetch_cb = QCheckBox("预解析链接")
+        self.prefetch_cb.setToolTip("搜索结果出现后，在后台提前解析前 N 条结果的下载链接")
+        config_layout.addWidget(self.prefetch_cb)
+        self.prefetch_spin = QSpinBox()
+        self.prefetch_spin.setRange(1, 50)
+        self.prefetch_spin.setValue(5)
+        self.prefetch_spin.setFixedWidth(60)
+        config_layout.addWidget(self.prefetch_spin)
+
         self.csv_btn = QPushButton("导入书籍单")
         self.csv_btn.clicked.connect(self.import_csv)
         config_layout.addWidget(self.csv_btn)
@@ -197,10 +241,12 @@ class MainWindow(QMainWindow):
 
         splitter = QSplitter(Qt.Orientation.Vertical)
 
-        self.table = QTableWidget(0, 7)
-        self.table.setHorizontalHeaderLabels(["标题", "作者", "出版社", "年份", "语言", "格式", "大小"])
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
+        self.results_proxy = QSortFilterProxyModel(self)
+        self.results_proxy.setSourceModel(self.results_model)
+        self.table = QTableView()
+        self.table.setModel(self.results_proxy)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.table.setSortingEnabled(True)
         self.table.doubleClicked.connect(self.start_download_selected)
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
@@ -244,6 +290,53 @@ class MainWindow(QMainWindow):
         exit_action.triggered.connect(self.close)
         menu.addAction(exit_action)
 
+        stats_menu = self.menuBar().addMenu("统计")
+        self.metrics_action = QAction("记录统计指标", self, checkable=True)
+        self.metrics_action.toggled.connect(self.toggle_metrics)
+        self.metrics_action.setChecked(METRICS.enabled or bool(int(self.settings.value("metrics_enabled", 0))))
+        stats_menu.addAction(self.metrics_action)
+        panel_action = QAction("统计面板...", self)
+        panel_action.triggered.connect(self.show_stats_dialog)
+        stats_menu.addAction(panel_action)
+        stats_menu.addSeparator()
+        self.profile_action = QAction("性能剖析（所有工作线程）", self, checkable=True)
+        self.profile_action.toggled.connect(self.toggle_profiling)
+        stats_menu.addAction(self.profile_action)
+        self.stats_dialog = None
+        self.profiler = None
+
+    def toggle_metrics(self, enabled):
+        METRICS.enable(enabled)
+        self.settings.setValue("metrics_enabled", 1 if enabled else 0)
+
+    def toggle_profiling(self, enabled):
+        if enabled:
+            self.profiler = Profiler("cprofile").start()
+            self.append_log("已开始性能剖析，之后启动的搜索/下载线程都会被记录")
+            return
+        if self.profiler is None:
+            return
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        default = str(CACHE_DIR / f"gui-{datetime.now().strftime('%Y%m%d-%H%M%S')}.pstats")
+        path, _ = QFileDialog.getSaveFileName(self, "保存剖析结果", default, "pstats (*.pstats);;All Files (*)")
+        if not path:
+            self.append_log("已停止性能剖析（未保存）", level="warning")
+            return
+        try:
+            profiler.write(path)
+        except (OSError, RuntimeError) as e:
+            QMessageBox.critical(self, "保存失败", f"写入剖析结果出错：{e}")
+            return
+        self.append_log(f"剖析结果已保存到 {path}\n{profiler.summary(15)}")
+
+    def show_stats_dialog(self):
+        if self.stats_dialog is None:
+            self.stats_dialog = StatsDialog(self)
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
+        self.stats_dialog.timer.start(1000)
+
     def append_log(self, message, level="info"):
         self.log_view.append(f"[{level.upper()}] {message}")
         self.log_view.ensureCursorVisible()
@@ -267,12 +360,18 @@ class MainWindow(QMainWindow):
         self.author_edit.setText(self.settings.value("last_author", ""))
         self.author_exact_cb.setChecked(bool(int(self.settings.value("author_exact", 0))))
         self.proxy_edit.setText(self.settings.value("proxy_url", ""))
+        self.daemon_edit.setText(self.settings.value("daemon_address", ""))
         self.notify_mode = self.settings.value("notify_mode", "toast_all")
         idx = self.notify_combo.findData(self.notify_mode)
         if idx >= 0:
             self.notify_combo.setCurrentIndex(idx)
         self.concurrent_spin.setValue(int(self.settings.value("concurrent_downloads", 2)))
         self.retry_spin.setValue(int(self.settings.value("download_retries", 3)))
+        self.prefetch_cb.setChecked(bool(int(self.settings.value("prefetch_links", 0))))
+        self.prefetch_spin.setValue(int(self.settings.value("prefetch_top_n", 5)))
+        idx = self.schedule_combo.findData(self.settings.value("schedule_policy", "fifo"))
+        if idx >= 0:
+            self.schedule_combo.setCurrentIndex(idx)
         self._apply_proxy()
 
     def _save_settings(self):
@@ -282,9 +381,13 @@ class MainWindow(QMainWindow):
         self.settings.setValue("last_author", self.author_edit.text())
         self.settings.setValue("author_exact", 1 if self.author_exact_cb.isChecked() else 0)
         self.settings.setValue("proxy_url", self.proxy_edit.text())
+        self.settings.setValue("daemon_address", self.daemon_edit.text())
         self.settings.setValue("notify_mode", self.notify_combo.currentData())
         self.settings.setValue("concurrent_downloads", self.concurrent_spin.value())
         self.settings.setValue("download_retries", self.retry_spin.value())
+        self.settings.setValue("prefetch_links", 1 if self.prefetch_cb.isChecked() else 0)
+        self.settings.setValue("prefetch_top_n", self.prefetch_spin.value())
+        self.settings.setValue("schedule_policy", self.schedule_combo.currentData())
 
     def _apply_proxy(self):
         set_proxy(self.proxy_edit.text().strip())
@@ -304,11 +407,9 @@ class MainWindow(QMainWindow):
         if action == download_act:
             self.start_download_selected()
         elif action == copy_title_act:
-            selected = self.table.selectedItems()
+            selected = self.table.selectionModel().selectedRows()
             if selected:
-                row = selected[0].row()
-                title = self.table.item(row, 0).text()
-                QApplication.clipboard().setText(title)
+                QApplication.clipboard().setText(selected[0].data() or "")
 
     def show_queue_context_menu(self, pos):
         menu = QMenu()
@@ -321,7 +422,8 @@ class MainWindow(QMainWindow):
                 self.queue_table.removeRow(r)
 
     def export_results_csv(self):
-        if self.table.rowCount() == 0:
+        model = self.results_proxy
+        if model.rowCount() == 0:
             QMessageBox.information(self, "提示", "没有搜索结果可导出")
             return
 
@@ -335,12 +437,10 @@ class MainWindow(QMainWindow):
             try:
                 with open(path, "w", encoding="utf-8-sig", newline="") as f:
                     writer = csv.writer(f)
-                    headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
+                    headers = [model.headerData(i, Qt.Orientation.Horizontal) for i in range(model.columnCount())]
                     writer.writerow(headers)
-                    for row in range(self.table.rowCount()):
-                        row_data = [
-                            self.table.item(row, col).text() if self.table.item(row, col) else "" for col in range(self.table.columnCount())
-                        ]
+                    for row in range(model.rowCount()):
+                        row_data = [model.index(row, col).data() or "" for col in range(model.columnCount())]
                         writer.writerow(row_data)
                 QMessageBox.information(self, "成功", f"搜索结果已导出到：\n{path}")
             except Exception as e:
@@ -380,7 +480,16 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "提示", "请输入搜索关键词")
             return
 
-        self.search_btn.setEnabled(False)
+        # 新搜索取代仍在进行中的旧搜索：取消并丢弃其结果
+        for _thread, worker in self.search_jobs.values():
+            worker.cancel()
+        self.search_generation += 1
+        generation = self.search_generation
+        self.results_model.clear()
+        self.download_btn.setEnabled(False)
+        self.prefetcher.cancel_pending()
+        self.prefetch_submitted = 0
+
         self.append_log(f"开始搜索：{query}")
         self._save_settings()
         self._apply_proxy()
@@ -388,8 +497,8 @@ class MainWindow(QMainWindow):
         year_min = self._safe_int(self.year_min_edit.text())
         year_max = self._safe_int(self.year_max_edit.text())
 
-        self.search_thread = QThread()
-        self.search_worker = SearchWorker(
+        thread = QThread()
+        worker = SearchWorker(
             query=query,
             limit=self.limit_spin.value(),
             language=self.lang_edit.text().strip() or None,
@@ -398,41 +507,53 @@ class MainWindow(QMainWindow):
             year_max=year_max,
             author=self.author_edit.text().strip() or None,
             author_exact=self.author_exact_cb.isChecked(),
+            generation=generation,
         )
-        self.search_worker.moveToThread(self.search_thread)
-        self.search_thread.started.connect(self.search_worker.run)
-        self.search_worker.finished.connect(self.on_search_finished)
-        self.search_worker.error.connect(self.on_search_error)
-        self.search_worker.log.connect(self.on_worker_log)
-        self.search_worker.finished.connect(self.search_thread.quit)
-        self.search_worker.finished.connect(self.search_worker.deleteLater)
-        self.search_thread.finished.connect(self.search_thread.deleteLater)
-        self.search_thread.start()
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.rows.connect(self.on_search_rows)
+        worker.finished.connect(self.on_search_finished)
+        worker.error.connect(self.on_search_error)
+        worker.log.connect(self.on_worker_log)
+        for signal in (worker.finished, worker.error, worker.cancelled):
+            signal.connect(thread.quit)
+            signal.connect(worker.deleteLater)
+        thread.finished.connect(lambda g=generation: self.search_jobs.pop(g, None))
+        thread.finished.connect(thread.deleteLater)
+        self.search_jobs[generation] = (thread, worker)
+        thread.start()
 
     def on_worker_log(self, level, message):
         self.append_log(message, level)
 
-    def on_search_finished(self, results):
-        self.search_btn.setEnabled(True)
-        self.results = results
+    def on_search_rows(self, generation, rows):
+        if generation != self.search_generation:
+            return
+        self.results_model.append_rows(rows)
+        self.download_btn.setEnabled(True)
+        self._prefetch_visible()
+
+    def on_search_finished(self, generation, results):
+        if generation != self.search_generation:
+            return
+        if len(results) != self.results_model.rowCount():
+            self.results_model.set_rows(results)
         self.download_btn.setEnabled(bool(results))
-        self.table.setSortingEnabled(False)
-        self.table.setRowCount(len(results))
-        for row, r in enumerate(results):
-            title_item = QTableWidgetItem(r.get("title") or "")
-            title_item.setData(Qt.ItemDataRole.UserRole, row)
-            self.table.setItem(row, 0, title_item)
-            self.table.setItem(row, 1, QTableWidgetItem(r.get("author") or ""))
-            self.table.setItem(row, 2, QTableWidgetItem(r.get("publisher") or ""))
-            self.table.setItem(row, 3, QTableWidgetItem(r.get("year") or ""))
-            self.table.setItem(row, 4, QTableWidgetItem(r.get("language") or ""))
-            self.table.setItem(row, 5, QTableWidgetItem(r.get("extension") or ""))
-            self.table.setItem(row, 6, QTableWidgetItem(r.get("size") or ""))
-        self.table.setSortingEnabled(True)
+        self._prefetch_visible()
         self.append_log(f"搜索完成，获得 {len(results)} 条结果")
 
-    def on_search_error(self, message):
-        self.search_btn.setEnabled(True)
+    def _prefetch_visible(self):
+        if not self.prefetch_cb.isChecked():
+            return
+        top_n = self.prefetch_spin.value()
+        pending = self.results[self.prefetch_submitted : top_n]
+        if pending:
+            self.prefetch_submitted += len(pending)
+            self.prefetcher.submit(pending)
+
+    def on_search_error(self, generation, message):
+        if generation != self.search_generation:
+            return
         self.append_log(f"搜索失败：{message}", level="error")
         QMessageBox.critical(self, "搜索失败", message)
 
@@ -449,20 +570,27 @@ class MainWindow(QMainWindow):
 
         tasks = []
         for index in selected_indices:
-            row = index.row()
-            original_idx = self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
-            if original_idx is not None and original_idx < len(self.results):
-                result_data = self.results[original_idx]
+            result_data = self.results_model.result(self.results_proxy.mapToSource(index).row())
+            if result_data is not None:
                 tasks.append({"type": "result", "result": result_data, "queue_row": self._add_queue_row_from_result(result_data)})
-        self.download_queue.extend(tasks)
-        self.queue_tasks.extend(tasks)
+        self._enqueue(tasks)
         self.append_log(f"准备下载 {len(tasks)} 个条目")
         self.progress_bar.setValue(0)
         self._start_next_download()
 
+    def _enqueue(self, tasks):
+        for task in tasks:
+            size = task["result"].get("size_bytes") if task.get("type") == "result" else None
+            self.download_queue.add(task, size)
+            self.batch_eta.add(task.get("queue_row"), size)
+        self.queue_tasks.extend(tasks)
+
+    def _on_schedule_changed(self, _index):
+        self.download_queue.policy = self.schedule_combo.currentData()
+
     def _start_next_download(self):
         while self.download_queue and len(self.active_downloads) < self.concurrent_spin.value():
-            task = self.download_queue.pop(0)
+            task = self.download_queue.take(slots=self.concurrent_spin.value())
             row = task.get("queue_row")
             self.append_log(f"开始下载：{task.get('query') or task.get('result', {}).get('title')}")
             self._apply_proxy()
@@ -475,19 +603,29 @@ class MainWindow(QMainWindow):
                 self.queue_table.setItem(row, 7, QTableWidgetItem(""))
 
             thread = QThread()
-            worker = TaskWorker(task, out_dir, limit=self.limit_spin.value(), max_retries=self.retry_spin.value())
+            daemon_address = self.daemon_edit.text().strip()
+            if daemon_address:
+                worker = DaemonTaskWorker(task, str(Path(out_dir).resolve()), daemon_address)
+            else:
+                worker = TaskWorker(task, out_dir, limit=self.limit_spin.value(), max_retries=self.retry_spin.value())
             worker.moveToThread(thread)
 
             thread.started.connect(worker.run)
             worker.finished.connect(lambda path, r=row, w=worker, t=thread: self.on_download_finished(r, path))
             worker.error.connect(lambda msg, r=row, w=worker, t=thread: self.on_download_error(r, msg))
+            if isinstance(worker, TaskWorker):
+                worker.deferred.connect(lambda msg, r=row, t=task: self.on_download_deferred(r, t, msg))
+                worker.deferred.connect(thread.quit)
+                worker.deferred.connect(worker.deleteLater)
             worker.log.connect(self.on_worker_log)
             worker.progress.connect(lambda d, tot, r=row: self.on_download_progress_row(r, d, tot))
             worker.finished.connect(thread.quit)
             worker.error.connect(thread.quit)
             worker.finished.connect(worker.deleteLater)
             worker.error.connect(worker.deleteLater)
+            thread.finished.connect(lambda t=thread: self.download_threads.discard(t))
             thread.finished.connect(thread.deleteLater)
+            self.download_threads.add(thread)
             thread.start()
 
             self.active_downloads.append((thread, worker, task))
@@ -496,11 +634,13 @@ class MainWindow(QMainWindow):
         if not self.active_downloads and not self.download_queue:
             self.append_log("下载队列完成")
             self.cancel_btn.setEnabled(False)
+            self.batch_eta = BatchETA()
 
     def on_download_progress_row(self, row, downloaded, total):
         if row is None or row >= self.queue_table.rowCount():
             return
         self.row_progress[row] = (downloaded, total)
+        self.batch_eta.update(row, downloaded, total)
         if total and total > 0:
             percent = int(downloaded / total * 100)
             text = f"{percent}% ({downloaded / 1024 / 1024:.2f}MB / {total / 1024 / 1024:.2f}MB)"
@@ -515,6 +655,7 @@ class MainWindow(QMainWindow):
         self.append_log(f"下载完成：{path}", level="success")
         self._update_queue_status(row, "成功", path)
         self.row_progress.pop(row, None)
+        self.batch_eta.finish(row, ok=True)
         self._notify("success", "下载完成", f"已保存到：\n{path}")
         self._remove_active_by_row(row)
         self._start_next_download()
@@ -523,10 +664,22 @@ class MainWindow(QMainWindow):
         self.append_log(f"下载失败：{message}", level="error")
         self._update_queue_status(row, "失败", message)
         self.row_progress.pop(row, None)
+        self.batch_eta.finish(row, ok=False)
         self._notify("error", "下载失败", message)
         self._remove_active_by_row(row)
         self._start_next_download()
 
+    def on_download_deferred(self, row, task, message):
+        # 近期反复失败的条目放入延后队列：其它任务都开始后才轮到，届时强制执行一次
+        self.append_log(f"延后到队列末尾：{message}", level="warning")
+        self._update_queue_status(row, "已延后", message)
+        self.row_progress.pop(row, None)
+        self._remove_active_by_row(row)
+        task["force"] = True
+        size = task["result"].get("size_bytes") if task.get("type") == "result" else None
+        self.download_queue.defer(task, size)
+        self._start_next_download()
+
     def cancel_download(self):
         if not self.active_downloads:
             return
@@ -539,6 +692,9 @@ class MainWindow(QMainWindow):
         self.cancel_btn.setEnabled(False)
 
     def _remove_active_by_row(self, row):
+        for _t, _w, task in self.active_downloads:
+            if task.get("queue_row") == row:
+                self.download_queue.finish(task)
         self.active_downloads = [(t, w, task) for (t, w, task) in self.active_downloads if task.get("queue_row") != row]
         if not self.active_downloads:
             self.cancel_btn.setEnabled(False)
@@ -555,13 +711,17 @@ class MainWindow(QMainWindow):
         for downloaded, total in self.row_progress.values():
             if total and total > 0:
                 percents.append(max(0, min(100, int(downloaded / total * 100))))
+        eta = self.batch_eta.eta()
+        batch = ""
+        if eta is not None:
+            batch = f"；队列剩余约 {format_bytes(self.batch_eta.remaining_bytes())}，预计 {format_eta(eta)}"
         if percents:
             avg = sum(percents) / len(percents)
             self.progress_bar.setValue(int(avg))
-            self.progress_bar.setFormat(f"并行 {len(self.row_progress)} 个任务，平均 {avg:.0f}%")
+            self.progress_bar.setFormat(f"并行 {len(self.row_progress)} 个任务，平均 {avg:.0f}%{batch}")
         else:
             self.progress_bar.setValue(0)
-            self.progress_bar.setFormat(f"并行 {len(self.row_progress)} 个任务")
+            self.progress_bar.setFormat(f"并行 {len(self.row_progress)} 个任务{batch}")
 
     def _notify(self, level, title, text):
         mode = self.notify_combo.currentData()
@@ -627,11 +787,26 @@ class MainWindow(QMainWindow):
         for t in tasks:
             t["author_exact"] = self.author_exact_cb.isChecked()
             t["queue_row"] = self._add_queue_row_from_query(t)
-        self.download_queue.extend(tasks)
-        self.queue_tasks.extend(tasks)
+        self._enqueue(tasks)
         self.append_log(f"表格导入：入队 {len(tasks)} 条任务，跳过 {dlg.skipped} 条，年份错误 {dlg.year_errors} 条，解析错误 {dlg.parse_errors} 条")
         self._start_next_download()
 
+    def closeEvent(self, event):
+        for _thread, worker in self.search_jobs.values():
+            worker.cancel()
+        self.prefetcher.shutdown()
+        LINK_CACHE.save()
+        NEGATIVE_CACHE.save()
+        if self.profiler is not None:
+            # 退出时仍在剖析：直接保存到缓存目录
+            self.profiler.stop()
+            try:
+                self.profiler.write(CACHE_DIR / f"gui-{datetime.now().strftime('%Y%m%d-%H%M%S')}.pstats")
+            except (OSError, RuntimeError):
+                pass
+            self.profiler = None
+        super().closeEvent(event)
+
     # 拖拽 CSV 支持
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
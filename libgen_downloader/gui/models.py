@@ -0,0 +1,57 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+class SearchResultsModel(QAbstractTableModel):
+    """搜索结果表的数据模型，支持流式追加批次。"""
+
+    COLUMNS = [
+        ("标题", "title"),
+        ("作者", "author"),
+        ("出版社", "publisher"),
+        ("年份", "year"),
+        ("语言", "language"),
+        ("格式", "extension"),
+        ("大小", "size"),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        key = self.COLUMNS[index.column()][1]
+        return self.rows[index.row()].get(key) or ""
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section][0]
+        return section + 1
+
+    def result(self, row):
+        return self.rows[row] if 0 <= row < len(self.rows) else None
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows[:] = rows
+        self.endResetModel()
+
+    def clear(self):
+        self.set_rows([])
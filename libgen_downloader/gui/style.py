@@ -19,7 +19,7 @@ DARK_QSS = """
     QCheckBox::indicator { width: 16px; height: 16px; }
     QCheckBox::indicator:unchecked { border: 1px solid #777; background: #3c3f41; }
     QCheckBox::indicator:checked { border: 1px solid #777; background: #0078d4; }
-    QTableWidget { background-color: #2b2b2b; border: 1px solid #555; gridline-color: #444; color: #efefef; selection-background-color: #004a8d; selection-color: #ffffff; }
+    QTableView { background-color: #2b2b2b; border: 1px solid #555; gridline-color: #444; color: #efefef; selection-background-color: #004a8d; selection-color: #ffffff; }
     QHeaderView::section { background-color: #3c3f41; padding: 6px; border: 1px solid #555; color: #aaa; }
     QProgressBar { border: 1px solid #555; border-radius: 4px; text-align: center; background-color: #3c3f41; color: white; }
     QProgressBar::chunk { background-color: #28a745; width: 10px; }
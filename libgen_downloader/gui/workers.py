@@ -1,20 +1,55 @@
+import time
 from threading import Event
 
 from PyQt6.QtCore import QObject, pyqtSignal
 
-from ..errors import DownloadError
-from ..pipeline import process_single_item
-from ..search import smart_search
+from ..daemon import TERMINAL, DaemonClient
+from ..cache import NegativeCache
+from ..errors import DownloadError, InsufficientSpace, SearchCancelled
+from ..events import BUS, ItemDone, NegativeSkipped, SearchSkipped, TransferProgress, emit
+from ..pipeline import NEGATIVE_CACHE, negative_entry, negative_key, process_single_item, record_failed_candidates
+from ..profiling import profiled
+from ..ranking import preferred_exts, rank_results
+from ..search import result_from_md5, smart_search
 from ..download import download_for_result
 
 
+class _EventForwarder:
+    """
+    worker 线程内的事件订阅（BUS.scope）：可输出的事件转成 log 信号，TransferProgress 转成 progress 信号，
+    ItemDone 转成 finished/error 信号。取代逐层传递的文本 logger 与进度回调。
+    """
+
+    def __init__(self, worker, cancel_event=None):
+        self.worker = worker
+        self.cancel_event = cancel_event
+
+    def __call__(self, event):
+        worker = self.worker
+        if isinstance(event, ItemDone):
+            if event.status == "success":
+                worker.finished.emit(event.path)
+            else:
+                worker.error.emit(event.error or ("未找到匹配结果" if event.status == "not_found" else event.message()))
+        elif isinstance(event, TransferProgress):
+            worker.progress.emit(event.downloaded, event.total if event.total is not None else -1)
+        elif event.loggable and not (self.cancel_event is not None and self.cancel_event.is_set()):
+            worker.log.emit(event.level, event.message())
+
+
 class SearchWorker(QObject):
-    finished = pyqtSignal(list)
-    error = pyqtSignal(str)
+    """执行一次搜索；generation 用于让界面丢弃被新搜索取代的过期结果。"""
+
+    rows = pyqtSignal(int, list)  # generation, 流式到达的结果批次
+    finished = pyqtSignal(int, list)  # generation, results
+    error = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
     log = pyqtSignal(str, str)  # level, message
 
-    def __init__(self, query, limit, language, ext, year_min, year_max, author=None, author_exact=False):
+    def __init__(self, query, limit, language, ext, year_min, year_max, author=None, author_exact=False, generation=0):
         super().__init__()
+        self.generation = generation
+        self.cancel_event = Event()
         self.query = query
         self.limit = limit
         self.language = language or None
@@ -24,25 +59,36 @@ class SearchWorker(QObject):
         self.author = author or None
         self.author_exact = author_exact
 
+    def cancel(self):
+        self.cancel_event.set()
+
+    @profiled
     def run(self):
-        def logger(level, message):
-            self.log.emit(level, message)
+        def on_rows(batch):
+            if not self.cancel_event.is_set():
+                self.rows.emit(self.generation, batch)
 
         try:
-            results = smart_search(
-                self.query,
-                limit=self.limit,
-                language=self.language,
-                ext=self.ext,
-                year_min=self.year_min,
-                year_max=self.year_max,
-                author=self.author,
-                author_exact=self.author_exact,
-                logger=logger,
-            )
-            self.finished.emit(results)
+            with BUS.scope(_EventForwarder(self, self.cancel_event)):
+                results = smart_search(
+                    self.query,
+                    limit=self.limit,
+                    language=self.language,
+                    ext=self.ext,
+                    year_min=self.year_min,
+                    year_max=self.year_max,
+                    author=self.author,
+                    author_exact=self.author_exact,
+                    cancel_event=self.cancel_event,
+                    on_rows=on_rows,
+                )
+            if self.cancel_event.is_set():
+                raise SearchCancelled("搜索已取消")
+            self.finished.emit(self.generation, results)
+        except SearchCancelled:
+            self.cancelled.emit(self.generation)
         except Exception as e:  # noqa: BLE001
-            self.error.emit(str(e))
+            self.error.emit(self.generation, str(e))
 
 
 class DownloadWorker(QObject):
@@ -62,35 +108,35 @@ class DownloadWorker(QObject):
     def cancel(self):
         self.cancel_event.set()
 
+    @profiled
     def run(self):
-        def logger(level, message):
-            self.log.emit(level, message)
-
-        def progress_cb(downloaded, total):
-            self.progress.emit(downloaded, total if total is not None else -1)
-
-        try:
-            path = download_for_result(
-                self.result,
-                out_dir=self.out_dir,
-                max_entry_urls=self.max_entry_urls,
-                max_get_retries=self.max_retries,
-                logger=logger,
-                progress_cb=progress_cb,
-                cancel_event=self.cancel_event,
-            )
-            if self.cancel_event.is_set():
-                raise DownloadError("下载已被取消")
-            self.finished.emit(path)
-        except Exception as e:  # noqa: BLE001
-            self.error.emit(str(e))
+        title = self.result.get("title")
+        with BUS.scope(_EventForwarder(self)):
+            try:
+                path = download_for_result(
+                    self.result,
+                    out_dir=self.out_dir,
+                    max_entry_urls=self.max_entry_urls,
+                    max_get_retries=self.max_retries,
+                    cancel_event=self.cancel_event,
+                )
+                if self.cancel_event.is_set():
+                    raise DownloadError("下载已被取消")
+                emit(ItemDone(title, "success", path=path, md5=self.result.get("md5")))
+            except Exception as e:  # noqa: BLE001
+                emit(ItemDone(title, "cancelled" if self.cancel_event.is_set() else "failed", error=str(e)))
 
 
 class TaskWorker(QObject):
-    """统一处理两类任务：已有搜索结果 or 仅有查询参数"""
+    """
+    统一处理两类任务：已有搜索结果 or 仅有查询参数。
+    近期反复失败的条目（NEGATIVE_CACHE 退避期内）不执行，发出 deferred 由界面放入延后队列（其它任务之后）；
+    任务带 force 时（已延后过一次）照常执行。
+    """
 
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
+    deferred = pyqtSignal(str)
     progress = pyqtSignal(int, int)
     log = pyqtSignal(str, str)
 
@@ -106,46 +152,165 @@ class TaskWorker(QObject):
     def cancel(self):
         self.cancel_event.set()
 
+    @profiled
     def run(self):
-        def logger(level, message):
-            self.log.emit(level, message)
-
-        def progress_cb(downloaded, total):
-            self.progress.emit(downloaded, total if total is not None else -1)
+        with BUS.scope(_EventForwarder(self)):
+            self._run()
 
+    def _run(self):
+        label = self.task.get("query") or self.task.get("result", {}).get("title")
         try:
             if self.task.get("type") == "result":
                 result = self.task["result"]
             else:
-                result = self._search_first_match(logger)
+                key = self._negative_key()
+                if self._defer(NEGATIVE_CACHE.lookup(key)):
+                    return
+                result = self._search_first_match()
                 if not result:
-                    raise DownloadError("未找到匹配结果")
-
-            path = download_for_result(
-                result,
-                out_dir=self.out_dir,
-                max_entry_urls=self.max_entry_urls,
-                max_get_retries=self.max_retries,
-                logger=logger,
-                progress_cb=progress_cb,
-                cancel_event=self.cancel_event,
-            )
+                    if self.cancel_event.is_set():
+                        raise DownloadError("下载已被取消")
+                    NEGATIVE_CACHE.record(key, "not_found", label=self.task["query"])
+                    emit(ItemDone(label, "not_found"))
+                    return
+                NEGATIVE_CACHE.forget(key)
+            if self._defer(negative_entry(result)):
+                return
+
+            try:
+                path = download_for_result(
+                    result,
+                    out_dir=self.out_dir,
+                    max_entry_urls=self.max_entry_urls,
+                    max_get_retries=self.max_retries,
+                    cancel_event=self.cancel_event,
+                )
+            except InsufficientSpace:
+                raise
+            except DownloadError:
+                if not self.cancel_event.is_set():
+                    record_failed_candidates([result], self.task.get("query"))
+                raise
             if self.cancel_event.is_set():
                 raise DownloadError("下载已被取消")
-            self.finished.emit(path)
+            if result.get("md5"):
+                NEGATIVE_CACHE.forget(NegativeCache.md5_key(result["md5"]))
+            emit(ItemDone(label, "success", path=path, md5=result.get("md5")))
         except Exception as e:  # noqa: BLE001
-            self.error.emit(str(e))
+            emit(ItemDone(label, "cancelled" if self.cancel_event.is_set() else "failed", error=str(e)))
+
+    def _negative_key(self):
+        task = self.task
+        return negative_key(
+            task["query"],
+            language=task.get("language"),
+            ext=task.get("ext"),
+            year_min=task.get("year_min"),
+            year_max=task.get("year_max"),
+            author=task.get("author"),
+            author_exact=task.get("author_exact"),
+            md5=task.get("md5"),
+            isbn=task.get("isbn"),
+        )
+
+    def _defer(self, entry) -> bool:
+        if entry is None or self.task.get("force"):
+            return False
+        label = self.task.get("query") or self.task.get("result", {}).get("title") or ""
+        event = NegativeSkipped(label, entry["kind"], entry["failures"], entry["next"] - time.time())
+        emit(event)
+        self.deferred.emit(event.message())
+        return True
 
-    def _search_first_match(self, logger):
+    def _search_first_match(self):
+        md5 = self.task.get("md5")
+        if md5:
+            emit(SearchSkipped(self.task["query"], md5))
+            title = self.task["query"] if self.task["query"].lower() != md5 else None
+            return result_from_md5(md5, title=title, extension=self.task.get("ext"))
+        isbn = self.task.get("isbn")
         res = smart_search(
-            self.task["query"],
+            isbn or self.task["query"],
             limit=self.limit,
+            columns=["i"] if isbn else None,
             language=self.task.get("language"),
             ext=self.task.get("ext"),
             year_min=self.task.get("year_min"),
             year_max=self.task.get("year_max"),
             author=self.task.get("author"),
             author_exact=self.task.get("author_exact", False),
-            logger=logger,
+            stop_after=1 if isbn else None,
+            raise_errors=True,  # 镜像故障时报错，不当作“未找到”记入 NEGATIVE_CACHE
         )
-        return res[0] if res else None
+        if not res:
+            return None
+        ranked = rank_results(
+            res,
+            self.task["query"],
+            author=self.task.get("author"),
+            preferred=preferred_exts(None, self.task.get("ext")),
+        )
+        return ranked[0]
+
+
+class DaemonTaskWorker(QObject):
+    """瘦客户端模式：把任务提交给守护进程执行，并把其日志/进度/结果转发为与 TaskWorker 相同的信号"""
+
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+    log = pyqtSignal(str, str)
+
+    def __init__(self, task, out_dir, address):
+        super().__init__()
+        self.task = task
+        self.out_dir = out_dir
+        self.client = DaemonClient(address)
+        self.cancel_event = Event()
+        self.job_id = None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _spec(self):
+        if self.task.get("type") == "result":
+            # 守护进程只接受 md5，入口链接由它自己构造
+            result = self.task["result"]
+            return {"md5": result.get("md5"), "query": result.get("title"), "ext": result.get("extension"), "out_dir": self.out_dir}
+        spec = {k: self.task.get(k) for k in ("query", "md5", "isbn", "language", "ext", "year_min", "year_max", "author", "author_exact")}
+        spec["out_dir"] = self.out_dir
+        return spec
+
+    def run(self):
+        try:
+            events = self.client.events()
+            next(events)  # 订阅生效后再提交，搜索阶段的日志也不会丢失
+            self.job_id = self.client.submit(self._spec())[0]["id"]
+            self.log.emit("info", f"[*] 已提交到守护进程 {self.client.base_url}，任务 #{self.job_id}")
+            cancel_sent = False
+            for record in events:
+                if self.cancel_event.is_set() and not cancel_sent:
+                    self.client.cancel(self.job_id)
+                    cancel_sent = True
+                if record.get("job") != self.job_id:
+                    continue
+                kind = record.get("type")
+                if kind == "log":
+                    self.log.emit(record["level"], record["message"])
+                elif kind == "progress":
+                    total = record.get("total")
+                    self.progress.emit(record["downloaded"], total if total is not None else -1)
+                elif kind == "job" and record["data"]["status"] in TERMINAL:
+                    job = record["data"]
+                    if job["status"] == "success":
+                        self.finished.emit(job["path"])
+                    elif job["status"] == "not_found":
+                        self.error.emit("未找到匹配结果")
+                    elif job["status"] == "cancelled":
+                        self.error.emit("下载已被取消")
+                    else:
+                        self.error.emit(job.get("error") or "守护进程任务失败")
+                    return
+            self.error.emit("与守护进程的连接意外断开")
+        except Exception as e:  # noqa: BLE001
+            self.error.emit(f"守护进程请求失败：{e}")
@@ -0,0 +1,221 @@
+"""
+Lightweight timers and counters for search/resolve/transfer phases.
+"""
+
+import json
+import math
+import os
+import random
+import time
+from threading import Lock
+from urllib.parse import urlparse
+
+from .events import BUS, ItemDone, SearchDone, ValidationFailed
+
+MAX_SAMPLES = 10000
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _Series:
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = []
+
+
+class Metrics:
+    """
+    线程安全的指标注册表：
+    - inc(name, value, **labels)：计数器（次数、字节数等）
+    - observe(name, seconds, **labels) / timer(name, **labels)：耗时分布（保留有限样本用于分位数）
+    导出为 JSON 或 Prometheus textfile 格式。
+    默认关闭：记录调用直接返回，timer() 返回共享的空上下文管理器，埋点处只多一次属性检查。
+    """
+
+    def __init__(self, prefix: str = "libgen"):
+        self.prefix = prefix
+        self.enabled = False
+        self._lock = Lock()
+        self._counters: dict = {}
+        self._timers: dict = {}
+        self._rng = random.Random(0)
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        # 条目结果、回退级别等离散结果从事件总线获取；耗时仍由调用处直接计时
+        if enabled:
+            BUS.subscribe(self._on_event, ItemDone, SearchDone, ValidationFailed)
+        else:
+            BUS.unsubscribe(self._on_event)
+
+    def _on_event(self, event) -> None:
+        if isinstance(event, ItemDone):
+            self.inc("items", outcome=event.status)
+        elif isinstance(event, SearchDone):
+            self.inc("smart_search", level=event.fallback_level, outcome=event.outcome, pushed=",".join(event.pushed) or "none")
+        elif isinstance(event, ValidationFailed):
+            self.inc("validate_failed", host=host_of(event.entry_url))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._timers.get(key)
+            if series is None:
+                series = self._timers[key] = _Series()
+            series.count += 1
+            series.total += seconds
+            if len(series.samples) < MAX_SAMPLES:
+                series.samples.append(seconds)
+            else:
+                # 蓄水池抽样：样本数封顶，分位数仍代表全部观测
+                j = self._rng.randrange(series.count)
+                if j < MAX_SAMPLES:
+                    series.samples[j] = seconds
+
+    def timer(self, name: str, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def samples(self, name: str) -> list:
+        """合并所有标签组合后的耗时样本（用于基准报告）。"""
+        with self._lock:
+            out = []
+            for (series_name, _labels), series in self._timers.items():
+                if series_name == name:
+                    out.extend(series.samples)
+            return out
+
+    def counter_total(self, name: str, **match) -> float:
+        """汇总名称为 name 且标签包含 match 的计数器之和。"""
+        with self._lock:
+            total = 0
+            for (counter_name, labels), value in self._counters.items():
+                if counter_name == name and all(dict(labels).get(k) == v for k, v in match.items()):
+                    total += value
+            return total
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [{"name": n, "labels": dict(labels), "value": v} for (n, labels), v in sorted(self._counters.items())]
+            timers = []
+            for (n, labels), series in sorted(self._timers.items()):
+                ordered = sorted(series.samples)
+                timers.append(
+                    {
+                        "name": n,
+                        "labels": dict(labels),
+                        "count": series.count,
+                        "sum": series.total,
+                        "quantiles": {str(q): _quantile(ordered, q) for q in QUANTILES},
+                    }
+                )
+        return {"counters": counters, "timers": timers}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        lines = []
+        seen = set()
+        for c in snap["counters"]:
+            metric = f"{self.prefix}_{c['name']}_total"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            lines.append(f"{metric}{_labels(c['labels'])} {c['value']}")
+        for t in snap["timers"]:
+            metric = f"{self.prefix}_{t['name']}_seconds"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} summary")
+                seen.add(metric)
+            for q, v in t["quantiles"].items():
+                lines.append(f"{metric}{_labels(dict(t['labels'], quantile=q))} {v}")
+            lines.append(f"{metric}_sum{_labels(t['labels'])} {t['sum']}")
+            lines.append(f"{metric}_count{_labels(t['labels'])} {t['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path) -> None:
+        _atomic_write(path, self.to_json())
+
+    def write_prometheus(self, path) -> None:
+        _atomic_write(path, self.to_prometheus())
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc or "unknown"
+
+
+def _quantile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    k = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[k]
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in sorted(labels.items()):
+        value = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _atomic_write(path, text: str) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+METRICS = Metrics()
+
+
+__all__ = ["METRICS", "Metrics", "host_of"]
@@ -0,0 +1,238 @@
+"""
+Index, reuse and garbage collection of unfinished downloads.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+
+from .finalize import is_claimed, release_part, same_device, try_claim
+
+PART_SUFFIX = ".part"
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = 14 * 24 * 3600
+# 最近写入过的 .part 可能正被另一个进程使用，不回收
+ACTIVE_GRACE = 300
+# 守护进程中自动回收的最小间隔
+GC_INTERVAL = 600
+
+
+def part_meta_path(temp_path) -> Path:
+    """.part 文件旁的元数据文件（记录所属 md5、来源链接与预计大小）。"""
+    return Path(f"{temp_path}.json")
+
+
+def partial_roots(out_dir) -> list[Path]:
+    """out_dir 下可能存放 .part 的暂存目录（见 finalize.staging_dir）；out_dir 本身就是暂存目录时返回它。"""
+    out_path = Path(out_dir)
+    if out_path.name in (".partial", ".staging"):
+        return [out_path]
+    return [out_path / ".partial", out_path / ".staging"]
+
+
+@dataclass
+class PartialFile:
+    path: Path
+    size: int
+    mtime: float
+    md5: str | None = None
+    url: str | None = None
+    total: int | None = None
+
+    @property
+    def completion(self) -> float:
+        """已下载比例；预计大小未知时按 0 计。"""
+        return min(1.0, self.size / self.total) if self.total else 0.0
+
+    def remove(self) -> None:
+        for p in (self.path, part_meta_path(self.path)):
+            try:
+                p.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+
+def read_partial(path) -> PartialFile | None:
+    path = Path(path)
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    try:
+        meta = json.loads(part_meta_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        meta = {}
+    return PartialFile(
+        path=path,
+        size=st.st_size,
+        mtime=st.st_mtime,
+        md5=(meta.get("md5") or "").lower() or None,
+        url=meta.get("url"),
+        total=meta.get("total") or None,
+    )
+
+
+class PartialStore:
+    """
+    本进程用过的暂存目录与其中 .part 的索引：register(root) 登记目录，find(md5) 按 md5 查找，
+    adopt(temp_path, md5) 把同一文件的旧 .part 接过来续传，gc() 按预算回收。
+    取消、失败或停滞的传输留下 .part 与 .part.json；之后同一文件的任务即使计划了别的文件名，也从最大的匹配 .part 续传。
+    本进程正在使用或最近几分钟内写入过的 .part 不会被回收。
+    """
+
+    def __init__(self):
+        self._roots: set = set()
+        self._lock = Lock()
+        self._last_gc: dict = {}
+
+    def register(self, root) -> None:
+        with self._lock:
+            self._roots.add(Path(root))
+
+    def roots(self) -> list[Path]:
+        with self._lock:
+            return sorted(self._roots)
+
+    def scan(self, roots=None) -> list[PartialFile]:
+        partials = []
+        for root in roots if roots is not None else self.roots():
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(PART_SUFFIX) and entry.is_file():
+                    partial = read_partial(entry.path)
+                    if partial is not None:
+                        partials.append(partial)
+        return partials
+
+    def find(self, md5: str, roots=None) -> list[PartialFile]:
+        """md5 一致的 .part，按已下载字节数从大到小排列。"""
+        md5 = md5.lower()
+        return sorted((p for p in self.scan(roots) if p.md5 == md5), key=lambda p: p.size, reverse=True)
+
+    def adopt(self, temp_path, md5: str | None) -> int:
+        """
+        同一 md5 在已登记的暂存目录（与 temp_path 同一文件系统）中有更大的 .part 时，把它改名为 temp_path
+        以便续传，返回接手的字节数；没有可用的 .part 时返回 0。temp_path 应已被调用方占用（claim_part）。
+        """
+        if not md5:
+            return 0
+        temp_path = Path(temp_path)
+        current = read_partial(temp_path)
+        have = current.size if current is not None and current.md5 == md5.lower() else 0
+        roots = [root for root in self.roots() if same_device(root, temp_path.parent)]
+        for candidate in self.find(md5, roots):
+            if candidate.path == temp_path or candidate.size <= have:
+                break
+            if not try_claim(candidate.path):
+                continue  # 正在被本进程的另一个传输使用
+            try:
+                os.replace(candidate.path, temp_path)
+                try:
+                    os.replace(part_meta_path(candidate.path), part_meta_path(temp_path))
+                except OSError:
+                    pass
+                return candidate.size
+            except OSError:
+                continue
+            finally:
+                release_part(candidate.path)
+        return 0
+
+    def gc(self, roots=None, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, dry_run: bool = False, now=None) -> dict:
+        """
+        回收 .part：先删除超过 max_age 秒未写入的，再按完成度从低到高（相同时先旧后新）删除，直到总量不超过 max_bytes。
+        同时删除没有对应 .part 的孤立元数据文件。返回 {"removed": [...], "freed": 字节数, "kept": 个数, "kept_bytes": 字节数}。
+        """
+        now = time.time() if now is None else now
+        roots = list(roots) if roots is not None else self.roots()
+        removed = []
+        candidates = []
+        kept_bytes = 0
+        kept = 0
+        for partial in self.scan(roots):
+            busy = is_claimed(partial.path) or now - partial.mtime < ACTIVE_GRACE
+            if busy:
+                kept += 1
+                kept_bytes += partial.size
+            elif max_age is not None and now - partial.mtime > max_age:
+                removed.append((partial, "age"))
+            else:
+                candidates.append(partial)
+        candidates.sort(key=lambda p: (p.completion, p.mtime))
+        budget_used = kept_bytes + sum(p.size for p in candidates)
+        for partial in candidates:
+            if max_bytes is not None and budget_used > max_bytes:
+                removed.append((partial, "size"))
+                budget_used -= partial.size
+            else:
+                kept += 1
+                kept_bytes += partial.size
+
+        if not dry_run:
+            for partial, _reason in removed:
+                partial.remove()
+            for root in roots:
+                _remove_orphan_meta(root)
+        return {
+            "removed": [
+                {"path": str(p.path), "size": p.size, "md5": p.md5, "completion": p.completion, "reason": reason}
+                for p, reason in removed
+            ],
+            "freed": sum(p.size for p, _reason in removed),
+            "kept": kept,
+            "kept_bytes": kept_bytes,
+        }
+
+    def maybe_gc(self, roots, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, interval: float = GC_INTERVAL):
+        """与 gc() 相同，但同一组目录 interval 秒内只回收一次（供守护进程在任务结束后调用）；跳过时返回 None。"""
+        key = tuple(sorted(str(r) for r in roots))
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_gc.get(key, float("-inf")) < interval:
+                return None
+            self._last_gc[key] = now
+        return self.gc(roots, max_bytes=max_bytes, max_age=max_age)
+
+
+def budget_from_args(args) -> tuple:
+    """从 CLI 参数（--partials-max-size MB、--partials-max-age 天）得到 (max_bytes, max_age)；0 表示不限制该项。"""
+    size_mb = getattr(args, "partials_max_size", None)
+    age_days = getattr(args, "partials_max_age", None)
+    max_bytes = DEFAULT_MAX_BYTES if size_mb is None else (int(size_mb * 1024 * 1024) or None)
+    max_age = DEFAULT_MAX_AGE if age_days is None else (age_days * 24 * 3600 or None)
+    return max_bytes, max_age
+
+
+def _remove_orphan_meta(root) -> None:
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.endswith(f"{PART_SUFFIX}.json") and not os.path.exists(entry.path[: -len(".json")]):
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+PARTIALS = PartialStore()
+
+
+__all__ = [
+    "DEFAULT_MAX_AGE",
+    "DEFAULT_MAX_BYTES",
+    "PARTIALS",
+    "PartialFile",
+    "PartialStore",
+    "budget_from_args",
+    "part_meta_path",
+    "partial_roots",
+    "read_partial",
+]
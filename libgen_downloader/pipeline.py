@@ -2,14 +2,86 @@
 High level orchestration helpers used by CLI/GUI.
 """
 
-from threading import Event
+import time
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Iterable
 
-from .download import download_for_result
-from .errors import DownloadError
-from .search import smart_search
+from .cache import NegativeCache
+from .download import download_for_result, probe_size, resolve_first_link
+from .errors import DownloadError, InsufficientSpace, SearchError
+from .events import (
+    BatchProgress,
+    CandidateFailed,
+    CandidateTried,
+    ItemDone,
+    ItemStarted,
+    NegativeSkipped,
+    SearchSkipped,
+    StageError,
+    emit,
+    item_logger,
+)
+from .ranking import dedupe_results, preferred_exts, rank_results
+from .scheduler import BatchETA, Scheduler, SchedulingQueue
+from .search import result_from_md5, smart_search
+from .stall import policy_from_args
 
+# 反复失败的查询/md5（CLI 的 --negative-cache 与 GUI 会启用持久化）
+NEGATIVE_CACHE = NegativeCache()
 
-def process_single_item(
+
+def negative_key(query, args=None, language=None, ext=None, year_min=None, year_max=None, author=None, author_exact=None, md5=None, isbn=None) -> str:
+    """
+    条目在 NEGATIVE_CACHE 中的键：有 md5 时按 md5，否则按查询词与实际生效的筛选条件
+    （未给出的条件取 args 中的全局值，与 search_candidates 一致；GUI 没有 args，只用任务自身的条件）。
+    """
+    if md5:
+        return NegativeCache.md5_key(md5)
+    return NegativeCache.query_key(
+        isbn or query,
+        isbn=bool(isbn),
+        language=language or getattr(args, "language", None),
+        ext=ext or getattr(args, "ext", None),
+        year_min=year_min or getattr(args, "year_min", None),
+        year_max=year_max or getattr(args, "year_max", None),
+        author=author if author is not None else getattr(args, "author", None),
+        author_exact=author_exact if author_exact is not None else getattr(args, "author_exact", False),
+    )
+
+
+def skip_negative(query, args, key=None, candidates=None, logger=None) -> bool:
+    """
+    条目的键（或全部候选结果的 md5）仍在 NEGATIVE_CACHE 的退避期内且未指定 --force 时，发出 NegativeSkipped
+    与 ItemDone(skipped) 并返回 True。
+    """
+    if getattr(args, "force", False):
+        return False
+    if key is not None:
+        entries = [NEGATIVE_CACHE.lookup(key)]
+    else:
+        entries = [negative_entry(chosen) for chosen in candidates or []]
+    if not entries or not all(entries):
+        return False
+    entry = min(entries, key=lambda e: e["next"])
+    emit(NegativeSkipped(query, entry["kind"], entry["failures"], entry["next"] - time.time()), logger=logger)
+    emit(ItemDone(query, "skipped"), logger=logger)
+    return True
+
+
+def negative_entry(result: dict):
+    """搜索结果的 md5 仍在退避期内时返回其失败记录。"""
+    return NEGATIVE_CACHE.lookup(NegativeCache.md5_key(result["md5"])) if result.get("md5") else None
+
+
+def record_failed_candidates(candidates, query=None) -> None:
+    """所有候选结果都下载失败：记录各自的 md5（取消或磁盘空间不足导致的失败不应调用）。"""
+    for chosen in candidates:
+        if chosen.get("md5"):
+            NEGATIVE_CACHE.record(NegativeCache.md5_key(chosen["md5"]), "failed", label=query or chosen.get("title"))
+
+
+def search_params(
     query: str,
     args,
     language=None,
@@ -18,15 +90,16 @@ def process_single_item(
     year_max=None,
     author=None,
     author_exact: bool | None = None,
-    logger=None,
-    progress_cb=None,
-    cancel_event: Event | None = None,
-):
-    """处理单个条目的搜索与下载逻辑"""
-    filtered = smart_search(
-        query,
+    isbn: str | None = None,
+) -> dict:
+    """
+    条目的 smart_search 参数（线程版与 asyncio 版共用）：条目自身的筛选条件优先，未给出的取 args 中的全局值；
+    有 isbn 时只在 ISBN 列搜索，并在解析到足够的候选行后停止读取结果页。
+    """
+    return dict(
+        query=isbn or query,
         limit=args.limit,
-        columns=args.columns,
+        columns=["i"] if isbn else args.columns,
         objects=args.objects,
         topics=args.topics,
         order=args.order,
@@ -38,26 +111,136 @@ def process_single_item(
         year_max=year_max or args.year_max,
         author=author if author is not None else getattr(args, "author", None),
         author_exact=author_exact if author_exact is not None else getattr(args, "author_exact", False),
-        logger=logger,
+        stop_after=max(1, args.max_fallback_results) if isbn else None,
+        raise_errors=True,
     )
 
+
+def md5_candidates(query: str, md5: str, args, ext=None, logger=None) -> list:
+    """条目带 md5：不搜索，直接以 ads.php?md5= 为入口的唯一候选。"""
+    emit(SearchSkipped(query, md5), logger=logger)
+    title = query if query and query.lower() != md5.lower() else None
+    return [result_from_md5(md5, title=title, extension=ext or args.ext)]
+
+
+def candidates_from_search(filtered: list, query: str, args, key: str, author=None, ext=None, cancel_event=None, logger=None) -> list:
+    """
+    由搜索结果得到候选（见 pick_candidates）。没有结果时记入 NEGATIVE_CACHE（已取消的除外）、发出 ItemDone(not_found)
+    并返回空列表；有结果时清除该键此前的失败记录。
+    """
     if not filtered:
-        _log(f"[!] '{query}' 最终未找到匹配结果", level="warning", logger=logger)
-        return False
+        if cancel_event is None or not cancel_event.is_set():
+            NEGATIVE_CACHE.record(key, "not_found", label=query)
+        emit(ItemDone(query, "not_found"), logger=logger)
+        return []
+    NEGATIVE_CACHE.forget(key)
+    return pick_candidates(filtered, args, query, author=author, ext=ext)
+
+
+def search_candidates(
+    query: str,
+    args,
+    language=None,
+    ext=None,
+    year_min=None,
+    year_max=None,
+    author=None,
+    author_exact: bool | None = None,
+    logger=None,
+    cancel_event: Event | None = None,
+    md5: str | None = None,
+    isbn: str | None = None,
+):
+    """
+    搜索并按优先级返回最多 max_fallback_results 个候选结果（首选在前）。
+    给出 md5 时不搜索，直接以 ads.php?md5= 为入口；给出 isbn 时只在 ISBN 列搜索，
+    并在解析到足够的候选行后停止读取结果页。
+    搜索请求失败（网络错误、5xx）时抛出 SearchError：只有确实没有结果才记入 NEGATIVE_CACHE。
+    """
+    if md5:
+        return md5_candidates(query, md5, args, ext=ext, logger=logger)
 
-    idx = args.index
-    if idx < 0 or idx >= len(filtered):
-        idx = 0
+    filtered = smart_search(
+        **search_params(query, args, language, ext, year_min, year_max, author, author_exact, isbn=isbn),
+        logger=logger,
+        cancel_event=cancel_event,
+    )
+    key = negative_key(query, args, language, ext, year_min, year_max, author, author_exact, isbn=isbn)
+    return candidates_from_search(filtered, query, args, key, author=author, ext=ext, cancel_event=cancel_event, logger=logger)
 
-    candidate_indices = [idx] + [i for i in range(len(filtered)) if i != idx]
-    candidate_indices = candidate_indices[: args.max_fallback_results]
 
-    last_err = None
-    for pos, i in enumerate(candidate_indices):
-        chosen = filtered[i]
+def pick_candidates(filtered: list, args, query: str, author=None, ext=None) -> list:
+    """
+    对搜索结果去重、排序（见 ranking.rank_results；--no-rank 时只合并相同 md5，保持页面顺序），
+    截取前 max_fallback_results 个候选。--index 指定的结果（按页面顺序编号）排在首位。
+    md5 仍在 NEGATIVE_CACHE 退避期内的结果排到最后（--force 时不调整），让其它版本先补上候选名额。
+    """
+    idx = getattr(args, "index", None)
+    pinned = filtered[idx] if idx is not None and 0 <= idx < len(filtered) else None
+    if getattr(args, "no_rank", False):
+        ordered = dedupe_results(filtered)
+    else:
+        ordered = rank_results(
+            filtered,
+            query,
+            author=author if author is not None else getattr(args, "author", None),
+            preferred=preferred_exts(args, ext),
+        )
+    if pinned is not None:
+        md5 = (pinned.get("md5") or "").lower()
+        for pos, r in enumerate(ordered):
+            if r is pinned or (md5 and (r.get("md5") or "").lower() == md5):
+                ordered.insert(0, ordered.pop(pos))
+                break
+    if not getattr(args, "force", False):
+        ordered.sort(key=lambda r: negative_entry(r) is not None)
+    candidates = ordered[: args.max_fallback_results]
+    for chosen in candidates:
         if not (chosen.get("title") or "").strip():
             chosen["_fallback_title"] = query
-        _log(f"[*] 尝试第 {pos+1} 个候选结果: {chosen['title']}", logger=logger)
+    return candidates
+
+
+def candidate_succeeded(chosen: dict, query, path, logger=None) -> None:
+    """某个候选下载成功：清除其 md5 此前的失败记录并发出 ItemDone(success)。"""
+    if chosen.get("md5"):
+        NEGATIVE_CACHE.forget(NegativeCache.md5_key(chosen["md5"]))
+    emit(ItemDone(query, "success", path=path, md5=chosen.get("md5")), logger=logger)
+
+
+def candidate_failed(chosen: dict, error, cancel_event=None, logger=None) -> bool:
+    """某个候选下载失败：发出 CandidateFailed，返回是否应停止尝试其余候选（磁盘空间不足或已取消）。"""
+    emit(CandidateFailed(chosen["title"], error), logger=logger)
+    return isinstance(error, InsufficientSpace) or (cancel_event is not None and cancel_event.is_set())
+
+
+def candidates_failed(candidates, query, exhausted: bool, cancel_event=None, logger=None) -> str:
+    """
+    没有候选下载成功：全部尝试过（exhausted）时记录各自的 md5（见 record_failed_candidates），
+    发出 ItemDone 并返回条目状态（failed 或 cancelled）。
+    """
+    if exhausted:
+        record_failed_candidates(candidates, query)
+    status = "cancelled" if cancel_event is not None and cancel_event.is_set() else "failed"
+    emit(ItemDone(query, status), logger=logger)
+    return status
+
+
+def download_candidates(
+    candidates,
+    args,
+    logger=None,
+    progress_cb=None,
+    cancel_event: Event | None = None,
+    query: str | None = None,
+):
+    """
+    依次尝试候选结果直到某个下载成功，返回保存路径；全部失败返回 None。
+    结束时发出 ItemDone（query 仅用于事件记录）。
+    """
+    exhausted = True
+    for pos, chosen in enumerate(candidates):
+        emit(CandidateTried(pos + 1, chosen["title"] or chosen.get("_fallback_title", "")), logger=logger)
         try:
             path = download_for_result(
                 chosen,
@@ -67,21 +250,252 @@ def process_single_item(
                 logger=logger,
                 progress_cb=progress_cb,
                 cancel_event=cancel_event,
+                stall=policy_from_args(args),
             )
-            _log(f"[+] 下载成功: {path}", level="success", logger=logger)
-            return True
         except DownloadError as e:
-            _log(f"[!] 下载失败: {e}", level="error", logger=logger)
-            last_err = e
+            if candidate_failed(chosen, e, cancel_event, logger=logger):
+                exhausted = False
+                break
             continue
-    return False
+        candidate_succeeded(chosen, query, path, logger=logger)
+        return path
+    candidates_failed(candidates, query, exhausted, cancel_event, logger=logger)
+    return None
+
+
+def process_single_item(
+    query: str,
+    args,
+    language=None,
+    ext=None,
+    year_min=None,
+    year_max=None,
+    author=None,
+    author_exact: bool | None = None,
+    logger=None,
+    progress_cb=None,
+    cancel_event: Event | None = None,
+    md5: str | None = None,
+    isbn: str | None = None,
+):
+    """处理单个条目的搜索与下载逻辑；近期反复失败的条目（见 NEGATIVE_CACHE）除非 --force 否则跳过"""
+    key = negative_key(query, args, language, ext, year_min, year_max, author, author_exact, md5=md5, isbn=isbn)
+    if skip_negative(query, args, key=key, logger=logger):
+        return False
+    try:
+        candidates = search_candidates(
+            query,
+            args,
+            language=language,
+            ext=ext,
+            year_min=year_min,
+            year_max=year_max,
+            author=author,
+            author_exact=author_exact,
+            logger=logger,
+            md5=md5,
+            isbn=isbn,
+        )
+    except SearchError as e:
+        # 镜像故障不记入 NEGATIVE_CACHE；批量下载继续处理后续条目
+        emit(ItemDone(query, "failed", error=str(e)), logger=logger)
+        return False
+    if not candidates or skip_negative(query, args, candidates=candidates, logger=logger):
+        return False
+    path = download_candidates(
+        candidates,
+        args,
+        logger=logger,
+        progress_cb=progress_cb,
+        cancel_event=cancel_event,
+        query=query,
+    )
+    return path is not None
+
+
+SCHEDULE_WINDOW = 64
+
+
+class BatchPipeline:
+    """
+    批量任务的三级流水线：search → resolve → transfer。
+    每一级有独立的线程池与有界队列，下游满时上游阻塞（背压），
+    因此后续条目的搜索与入口页解析会与当前条目的传输重叠进行。
+    条目为 dict：query/language/ext/year_min/year_max/author/author_exact（可选 md5/isbn），
+    运行后写入 status（success/not_found/failed/cancelled）、path、error、size_bytes。
+    传输队列按 schedule 策略（fifo/sjf/balanced，见 scheduler.py）取出条目；非 fifo 时队列放宽到
+    SCHEDULE_WINDOW 个，让调度有可选的余地。probe_sizes 为 True 时解析阶段用 HEAD 探测准确大小。
+    """
 
+    def __init__(
+        self,
+        args,
+        search_workers: int = 4,
+        resolve_workers: int = 8,
+        transfer_workers: int = 3,
+        logger=None,
+        cancel_event: Event | None = None,
+        schedule: str = "fifo",
+        probe_sizes: bool = False,
+    ):
+        self.args = args
+        self.schedule = schedule
+        self.probe_sizes = probe_sizes
+        self.eta = BatchETA()
+        self.search_workers = max(1, search_workers)
+        self.resolve_workers = max(1, resolve_workers)
+        self.transfer_workers = max(1, transfer_workers)
+        self.logger = logger
+        self.cancel_event = cancel_event or Event()
 
-def _log(message, level: str = "info", logger=None):
-    if logger:
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self, items: Iterable[dict]) -> list[dict]:
+        search_q: Queue = Queue(maxsize=self.search_workers * 2)
+        resolve_q: Queue = Queue(maxsize=self.resolve_workers * 2)
+        window = self.transfer_workers * 2 if self.schedule == "fifo" else max(self.transfer_workers * 2, SCHEDULE_WINDOW)
+        transfer_q = self._transfer_q = SchedulingQueue(Scheduler(self.schedule, slots=self.transfer_workers), maxsize=window)
+
+        stages = [
+            ("search", self._search_stage, search_q, resolve_q, self.search_workers, self.resolve_workers),
+            ("resolve", self._resolve_stage, resolve_q, transfer_q, self.resolve_workers, self.transfer_workers),
+            ("transfer", self._transfer_stage, transfer_q, None, self.transfer_workers, 0),
+        ]
+        threads = []
+        for name, handler, in_q, out_q, count, downstream in stages:
+            remaining = [count]
+            lock = Lock()
+            for n in range(count):
+                t = Thread(
+                    target=self._stage_loop,
+                    args=(name, handler, in_q, out_q, downstream, remaining, lock),
+                    name=f"pipeline-{name}-{n}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        fed = []
         try:
-            logger(level, message)
-            return
-        except Exception:
-            pass
-    print(message)
+            for item in items:
+                if self.cancel_event.is_set():
+                    break
+                item.setdefault("seq", len(fed) + 1)
+                fed.append(item)
+                search_q.put(item)
+            for _ in range(self.search_workers):
+                search_q.put(None)
+
+            for t in threads:
+                t.join()
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        return fed
+
+    def _stage_loop(
+        self, stage: str, handler, in_q, out_q, downstream: int, remaining: list, lock: Lock
+    ):
+        while True:
+            item = in_q.get()
+            if item is None:
+                break
+            if self.cancel_event.is_set():
+                item["status"] = "cancelled"
+                emit(ItemDone(item["query"], "cancelled"), logger=item_logger(item.get("seq"), self.logger))
+                continue
+            try:
+                forward = handler(item)
+            except Exception as e:  # noqa: BLE001
+                item["status"] = "cancelled" if self.cancel_event.is_set() else "failed"
+                item["error"] = str(e)
+                emit(StageError(stage, item["query"], e), logger=item_logger(item.get("seq"), self.logger))
+                emit(ItemDone(item["query"], item["status"]))
+                forward = False
+            if forward and out_q is not None:
+                out_q.put(item)
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and out_q is not None:
+            for _ in range(downstream):
+                out_q.put(None)
+
+    def _search_stage(self, item: dict) -> bool:
+        logger = item_logger(item.get("seq"), self.logger)
+        emit(ItemStarted(item["query"]), logger=logger)
+        key = negative_key(
+            item["query"],
+            self.args,
+            item.get("language"),
+            item.get("ext"),
+            item.get("year_min"),
+            item.get("year_max"),
+            item.get("author"),
+            item.get("author_exact"),
+            md5=item.get("md5"),
+            isbn=item.get("isbn"),
+        )
+        if skip_negative(item["query"], self.args, key=key, logger=logger):
+            item["status"] = "skipped"
+            return False
+        candidates = search_candidates(
+            item["query"],
+            self.args,
+            language=item.get("language"),
+            ext=item.get("ext"),
+            year_min=item.get("year_min"),
+            year_max=item.get("year_max"),
+            author=item.get("author"),
+            author_exact=item.get("author_exact"),
+            logger=logger,
+            cancel_event=self.cancel_event,
+            md5=item.get("md5"),
+            isbn=item.get("isbn"),
+        )
+        if not candidates:
+            item["status"] = "not_found"
+            return False
+        if skip_negative(item["query"], self.args, candidates=candidates, logger=logger):
+            item["status"] = "skipped"
+            return False
+        item["candidates"] = candidates
+        return True
+
+    def _resolve_stage(self, item: dict) -> bool:
+        # 预先解析首个可用候选的下载链接（写入 LINK_CACHE）；传输阶段命中缓存后直接开始传输
+        chosen = item["candidates"][0]
+        for candidate in item["candidates"]:
+            link = resolve_first_link(candidate, self.args.max_entry_urls, logger=item_logger(item.get("seq"), self.logger))
+            if link:
+                chosen = candidate
+                if self.probe_sizes:
+                    chosen["size_bytes"] = probe_size(link[1]) or chosen.get("size_bytes")
+                break
+        item["size_bytes"] = chosen.get("size_bytes")
+        self.eta.add(item["seq"], item["size_bytes"])
+        return True
+
+    def _transfer_stage(self, item: dict) -> bool:
+        seq = item["seq"]
+        path = None
+        try:
+            path = download_candidates(
+                item["candidates"],
+                self.args,
+                logger=item_logger(item.get("seq"), self.logger),
+                progress_cb=lambda downloaded, total: self.eta.update(seq, downloaded, total),
+                cancel_event=self.cancel_event,
+                query=item["query"],
+            )
+        finally:
+            self._transfer_q.finish(item)
+            self.eta.finish(seq, ok=path is not None)
+        item["path"] = path
+        item["status"] = "success" if path else ("cancelled" if self.cancel_event.is_set() else "failed")
+        emit(
+            BatchProgress(self.eta.finished, self.eta.pending, self.eta.remaining_bytes(), self.eta.eta()),
+            logger=self.logger,
+        )
+        return False
@@ -0,0 +1,69 @@
+"""
+Background resolution of download links for search results that are on screen.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlparse
+
+import requests
+
+from .download import LINK_CACHE, candidate_entry_urls, resolve_download_link
+
+
+class LinkPrefetcher:
+    """
+    在用户点击下载前，后台依次解析搜索结果的入口页（ads.php / mirrors），
+    把得到的 get 链接写入 LINK_CACHE，下载时即可直接开始传输。
+    每个主机同时最多 per_host 个请求，避免对单个镜像造成压力。
+    """
+
+    def __init__(self, max_workers: int = 4, per_host: int = 2, max_entry_urls: int = 5):
+        self.per_host = per_host
+        self.max_entry_urls = max_entry_urls
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="link-prefetch")
+        self._host_slots = defaultdict(lambda: BoundedSemaphore(self.per_host))
+        self._lock = Lock()
+        self._generation = 0
+
+    def submit(self, results) -> None:
+        """为给定结果排队预解析（通常是界面上最先展示的前 N 条）。"""
+        generation = self._generation
+        for result in results:
+            self._executor.submit(self._prefetch_result, result, generation)
+
+    def cancel_pending(self) -> None:
+        """放弃尚未开始的预解析（例如开始了新的搜索）。已缓存的链接保留。"""
+        with self._lock:
+            self._generation += 1
+
+    def shutdown(self) -> None:
+        self.cancel_pending()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _host_slot(self, url: str) -> BoundedSemaphore:
+        with self._lock:
+            return self._host_slots[urlparse(url).netloc]
+
+    def _prefetch_result(self, result, generation: int) -> None:
+        for entry_url in candidate_entry_urls(result, self.max_entry_urls):
+            if generation != self._generation:
+                return
+            hit, link = LINK_CACHE.lookup(entry_url, result.get("md5"))
+            if hit:
+                if link:
+                    return
+                continue
+            with self._host_slot(entry_url):
+                if generation != self._generation:
+                    return
+                try:
+                    link = resolve_download_link(entry_url, result.get("md5"))
+                except requests.RequestException:
+                    continue
+            if link:
+                return
+
+
+__all__ = ["LinkPrefetcher"]
@@ -0,0 +1,238 @@
+"""
+Built-in profiler covering every worker thread, not just the main one.
+"""
+
+import cProfile
+import functools
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+# cprofile：每个线程一个 cProfile.Profile，stop 时合并为一个 pstats 文件；
+# sample：后台线程定时采样 sys._current_frames()，输出折叠栈（flamegraph.pl / speedscope）
+MODES = ("cprofile", "sample")
+# 采样模式下按函数拆分墙钟时间时关注的模块
+BREAKDOWN_MODULES = ("search.py", "download.py")
+
+_active = None
+
+
+class Profiler:
+    """
+    进程级剖析器：start() 后经 threading 新建的线程自动纳入剖析（QThread 通过 profile_thread()/profiled 接入），stop() 汇总所有线程，
+    write(path) 写出 pstats（cprofile）或折叠栈文本（sample），summary(top) 返回前 N 项摘要。
+    """
+
+    def __init__(self, mode: str = "cprofile", interval: float = 0.005):
+        if mode not in MODES:
+            raise ValueError(f"未知的剖析模式: {mode}（可选 {', '.join(MODES)}）")
+        self.mode = mode
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._profiles = {}  # thread ident -> cProfile.Profile
+        self._finished = []
+        self._shared = False  # Python 3.12+ 中单个 cProfile 即覆盖所有线程
+        self._stacks = Counter()
+        self._breakdown = Counter()
+        self._samples = 0
+        self._ticks = 0
+        self._sampler = None
+        self._stop = threading.Event()
+        self.started_at = None
+        self.elapsed = 0.0
+
+    # --- 生命周期 ---
+    def start(self) -> "Profiler":
+        global _active
+        self.started_at = time.perf_counter()
+        if self.mode == "cprofile":
+            threading.setprofile(self._bootstrap_thread)
+            self.attach_current_thread()
+        else:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+        _active = self
+        return self
+
+    def stop(self) -> None:
+        global _active
+        if _active is self:
+            _active = None
+        if self.started_at is None:
+            return
+        self.elapsed = time.perf_counter() - self.started_at
+        if self.mode == "cprofile":
+            threading.setprofile(None)
+            self.detach_current_thread()
+        else:
+            self._stop.set()
+            if self._sampler is not None:
+                self._sampler.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    # --- cProfile 模式 ---
+    def _bootstrap_thread(self, frame, event, arg):
+        # threading.setprofile 的钩子在新线程的第一次调用时触发：换成该线程自己的 cProfile
+        sys.setprofile(None)
+        self.attach_current_thread()
+
+    def attach_current_thread(self) -> bool:
+        """为当前线程启用独立的 cProfile；已启用或无需启用时返回 False。"""
+        if self.mode != "cprofile" or self._shared:
+            return False
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._profiles:
+                return False
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # 3.12+ 的 cProfile 基于 sys.monitoring，同一时间只允许一个实例，且已覆盖所有线程
+            self._shared = True
+            return False
+        with self._lock:
+            self._profiles[ident] = prof
+        return True
+
+    def detach_current_thread(self) -> None:
+        with self._lock:
+            prof = self._profiles.pop(threading.get_ident(), None)
+        if prof is not None:
+            prof.disable()
+            with self._lock:
+                self._finished.append(prof)
+
+    def stats(self):
+        """合并所有线程的 cProfile 数据；仍在运行的线程按当前已记录的数据计入。"""
+        with self._lock:
+            profiles = self._finished + list(self._profiles.values())
+        merged = None
+        for prof in profiles:
+            try:
+                if merged is None:
+                    merged = pstats.Stats(prof)
+                else:
+                    merged.add(prof)
+            except TypeError:  # 没有任何记录的线程
+                continue
+        return merged
+
+    # --- 采样模式 ---
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._ticks += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                owner = None
+                while frame is not None:
+                    code = frame.f_code
+                    filename = code.co_filename
+                    stack.append(f"{code.co_name} ({Path(filename).name}:{code.co_firstlineno})")
+                    if owner is None and filename.endswith(BREAKDOWN_MODULES) and "libgen_downloader" in filename:
+                        owner = f"{Path(filename).name}:{code.co_name}"
+                    frame = frame.f_back
+                stack.reverse()
+                with self._lock:
+                    self._stacks[";".join(stack)] += 1
+                    if owner:
+                        self._breakdown[owner] += 1
+                    self._samples += 1
+
+    # --- 输出 ---
+    def write(self, path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.mode == "cprofile":
+            stats = self.stats()
+            if stats is None:
+                raise RuntimeError("没有记录到任何剖析数据")
+            stats.dump_stats(str(path))
+            return
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def summary(self, top: int = 20) -> str:
+        if self.mode == "cprofile":
+            stats = self.stats()
+            if stats is None:
+                return "[!] 没有记录到任何剖析数据"
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(top)
+            return out.getvalue()
+
+        with self._lock:
+            total = self._samples
+            own = Counter()
+            for stack, count in self._stacks.items():
+                own[stack.rsplit(";", 1)[-1]] += count
+            breakdown = self._breakdown.most_common(top)
+        if not total:
+            return "[!] 没有采集到样本"
+        # 每次采样代表的实际墙钟时间（采样本身有开销，实际间隔会略大于设定值）
+        scale = self.elapsed / self._ticks if self._ticks else self.interval
+        lines = [
+            f"采样 {self._ticks} 轮、{total} 个线程栈（间隔 {self.interval * 1000:.1f} ms，运行 {self.elapsed:.2f}s）",
+            "",
+            "栈顶函数（所有线程，含等待 I/O）：",
+        ]
+        for name, count in own.most_common(top):
+            lines.append(f"{count / total:>7.1%}  {count * scale:>8.2f}s  {name}")
+        if breakdown:
+            lines += ["", "search.py / download.py 函数墙钟时间（按最内层的库函数归属）："]
+            for name, count in breakdown:
+                lines.append(f"{count * scale:>8.2f}s  {name}")
+        return "\n".join(lines) + "\n"
+
+
+def active():
+    """当前正在运行的 Profiler（没有则为 None）。"""
+    return _active
+
+
+@contextmanager
+def profile_thread():
+    """
+    在非 threading 模块创建的线程（如 QThread）中把当前线程纳入剖析；
+    剖析器未启动时不做任何事。
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    attached = profiler.attach_current_thread()
+    try:
+        yield
+    finally:
+        if attached:
+            profiler.detach_current_thread()
+
+
+def profiled(func):
+    """装饰器版本的 profile_thread()，用于 QThread worker 的 run 方法。"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_thread():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+__all__ = ["MODES", "Profiler", "active", "profile_thread", "profiled"]
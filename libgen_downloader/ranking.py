@@ -0,0 +1,203 @@
+"""
+Deduplication and ranking of search results before fallback candidates are chosen.
+"""
+
+import re
+import time
+from difflib import SequenceMatcher
+from threading import Lock
+
+from .events import BUS, MirrorFailed, MirrorOk, ResolveEmpty, ResolveFailed, ValidationFailed
+from .metrics import host_of
+
+DEFAULT_PREFERRED_EXTS = ("pdf", "epub", "mobi", "azw3", "djvu")
+# 小于该大小的文件多半是残缺的扫描或占位文件
+MIN_PLAUSIBLE_SIZE = 100 * 1024
+# 镜像成功/失败记录的半衰期（秒）：镜像恢复后，旧的失败记录逐渐失去影响
+HEALTH_HALF_LIFE = 1800
+# 同一 edition 已有文件入选后，其它文件的扣分（得分范围 0~1）
+EDITION_PENALTY = 0.15
+WEIGHTS = {"title": 0.4, "author": 0.15, "ext": 0.15, "size": 0.1, "health": 0.2}
+
+
+class MirrorHealth:
+    """
+    按入口主机统计最近的下载结果（随时间指数衰减），score(host) 返回估计成功率：
+    没有记录时为 0.5，成功越多越接近 1，失败越多越接近 0。通过事件总线接收 MirrorOk/MirrorFailed 等事件。
+    """
+
+    def __init__(self, half_life: float = HEALTH_HALF_LIFE, clock=time.monotonic):
+        self.half_life = half_life
+        self.clock = clock
+        self._hosts: dict = {}  # host -> [ok, failed, 更新时间]
+        self._lock = Lock()
+
+    def _decayed(self, host: str, now: float) -> list:
+        entry = self._hosts.get(host)
+        if entry is None:
+            return [0.0, 0.0, now]
+        factor = 0.5 ** ((now - entry[2]) / self.half_life) if self.half_life else 1.0
+        return [entry[0] * factor, entry[1] * factor, now]
+
+    def record(self, url: str, ok: bool) -> None:
+        host = host_of(url)
+        with self._lock:
+            now = self.clock()
+            entry = self._decayed(host, now)
+            entry[0 if ok else 1] += 1
+            self._hosts[host] = entry
+
+    def score(self, url: str) -> float:
+        with self._lock:
+            ok, failed, _t = self._decayed(host_of(url), self.clock())
+        return (ok + 1) / (ok + failed + 2)
+
+    def result_score(self, result: dict, max_entry_urls: int = 5) -> float:
+        """结果的任一入口能成功的估计概率（按各入口相互独立计算）。没有入口时为 0。"""
+        from .download import candidate_entry_urls
+
+        miss = 1.0
+        for url in candidate_entry_urls(result, max_entry_urls):
+            miss *= 1 - self.score(url)
+        return 1 - miss
+
+    def on_event(self, event) -> None:
+        self.record(event.entry_url, isinstance(event, MirrorOk))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hosts.clear()
+
+
+MIRROR_HEALTH = MirrorHealth()
+BUS.subscribe(MIRROR_HEALTH.on_event, MirrorOk, MirrorFailed, ResolveFailed, ResolveEmpty, ValidationFailed)
+
+
+def dedupe_results(results: list) -> list:
+    """
+    合并 md5 相同的结果：保留最先出现的一行，其它行的入口链接并入它的 mirrors（合并时复制该行，不修改原结果）。
+    没有 md5 的结果原样保留。
+    """
+    merged: list = []
+    by_md5: dict = {}
+    copied: set = set()
+    for r in results:
+        md5 = (r.get("md5") or "").lower()
+        if not md5:
+            merged.append(r)
+            continue
+        pos = by_md5.get(md5)
+        if pos is None:
+            by_md5[md5] = len(merged)
+            merged.append(r)
+            continue
+        if pos not in copied:
+            merged[pos] = merged[pos].copy()
+            copied.add(pos)
+        first = merged[pos]
+        mirrors = list(first.get("mirrors") or [])
+        for url in [r.get("ads_url")] + list(r.get("mirrors") or []):
+            if url and url != first.get("ads_url") and url not in mirrors:
+                mirrors.append(url)
+        first["mirrors"] = mirrors
+        if not first.get("size_bytes") and r.get("size_bytes"):
+            first["size_bytes"] = r["size_bytes"]
+    return merged
+
+
+def _tokens(text: str) -> set:
+    return {t for t in re.split(r"[\W_]+", text.lower()) if t}
+
+
+def text_similarity(query: str, text: str) -> float:
+    """0~1：difflib 相似度与查询词覆盖率中的较大者（查询里常带作者或副标题，单看相似度会偏低）。"""
+    query = " ".join(str(query or "").lower().split())
+    text = " ".join(str(text or "").lower().split())
+    if not query or not text:
+        return 0.0
+    ratio = SequenceMatcher(None, query, text, autojunk=False).ratio()
+    query_tokens = _tokens(query)
+    coverage = len(query_tokens & _tokens(text)) / len(query_tokens) if query_tokens else 0.0
+    return max(ratio, coverage)
+
+
+def ext_score(extension: str | None, preferred) -> float:
+    """preferred 中越靠前得分越高（第一个为 1），不在列表中为 0。"""
+    extension = (extension or "").lower()
+    if not preferred or extension not in preferred:
+        return 0.0
+    return 1 - preferred.index(extension) / len(preferred)
+
+
+def size_score(size_bytes: int | None) -> float:
+    if not size_bytes:
+        return 0.5
+    if size_bytes < MIN_PLAUSIBLE_SIZE:
+        return 0.0
+    return 1.0
+
+
+def score_result(result: dict, query: str, author: str | None = None, preferred=DEFAULT_PREFERRED_EXTS, health=None) -> float:
+    """0~1 的加权得分：标题相似度（给定作者时另加作者相似度）、偏好扩展名、大小是否可信、入口主机的健康度。"""
+    health = MIRROR_HEALTH if health is None else health
+    parts = {
+        "title": max(
+            text_similarity(query, result.get("title")),
+            text_similarity(query, f"{result.get('title') or ''} {result.get('author') or ''}"),
+        ),
+        "ext": ext_score(result.get("extension"), preferred),
+        "size": size_score(result.get("size_bytes")),
+        "health": health.result_score(result),
+    }
+    if author:
+        author_parts = [p for p in re.split(r"[;,/&|]+", result.get("author") or "") if p.strip()]
+        parts["author"] = max((text_similarity(author, p) for p in author_parts), default=0.0)
+    total = sum(WEIGHTS[k] for k in parts)
+    return sum(WEIGHTS[k] * v for k, v in parts.items()) / total
+
+
+def rank_results(results: list, query: str, author: str | None = None, preferred=None, health=None) -> list:
+    """
+    去重后按得分从高到低排列（同分保持页面顺序），避免按页面顺序取前 N 行时反复重试同一个失败的文件；已有文件入选的 edition，其它文件的得分减去 EDITION_PENALTY，
+    使不同版本优先补上候选名额。preferred 为偏好的扩展名列表（小写），None 时使用 DEFAULT_PREFERRED_EXTS。
+    """
+    preferred = tuple(DEFAULT_PREFERRED_EXTS if preferred is None else preferred)
+    unique = dedupe_results(results)
+    pending = [(score_result(r, query, author, preferred, health), i, r) for i, r in enumerate(unique)]
+    ranked = []
+    seen_editions: set = set()
+    while pending:
+        best = max(
+            range(len(pending)),
+            key=lambda k: (
+                pending[k][0] - (EDITION_PENALTY if pending[k][2].get("edition_id") in seen_editions else 0),
+                -pending[k][1],
+            ),
+        )
+        _score, _i, r = pending.pop(best)
+        if r.get("edition_id"):
+            seen_editions.add(r["edition_id"])
+        ranked.append(r)
+    return ranked
+
+
+def preferred_exts(args, ext: str | None = None) -> tuple:
+    """本次搜索的扩展名偏好：明确要求的格式在前，其后是 --prefer-ext（默认 DEFAULT_PREFERRED_EXTS）。"""
+    prefer = getattr(args, "prefer_ext", None)
+    order = [e.strip().lower() for e in (prefer.split(",") if prefer else DEFAULT_PREFERRED_EXTS) if e.strip()]
+    wanted = (ext or getattr(args, "ext", None) or "").lower()
+    if wanted:
+        order = [wanted] + [e for e in order if e != wanted]
+    return tuple(order)
+
+
+__all__ = [
+    "DEFAULT_PREFERRED_EXTS",
+    "MIRROR_HEALTH",
+    "MirrorHealth",
+    "dedupe_results",
+    "preferred_exts",
+    "rank_results",
+    "score_result",
+    "text_similarity",
+]
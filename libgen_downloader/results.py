@@ -0,0 +1,270 @@
+"""
+Compact records for parsed search results.
+"""
+
+import sys
+from collections.abc import MutableMapping
+
+FIELDS = (
+    "title",
+    "edition_id",
+    "edition_url",
+    "author",
+    "publisher",
+    "year",
+    "language",
+    "pages",
+    "size",
+    "size_bytes",
+    "extension",
+    "file_id",
+    "md5",
+    "ads_url",
+    "mirrors",
+)
+# 在大量结果之间重复出现的字段，构造时 intern
+INTERNED = frozenset({"publisher", "year", "language", "pages", "size", "extension"})
+_FIELD_SET = frozenset(FIELDS)
+_MD5_MARK = "\0"
+# 旧代码中附加在结果上的键，保留为具名属性
+FALLBACK_TITLE = "_fallback_title"
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _pack_url(url, md5):
+    if not url:
+        return url
+    if md5 and md5 in url:
+        return sys.intern(url.replace(md5, _MD5_MARK))
+    return url
+
+
+def _unpack_url(packed, md5):
+    if packed and md5 and _MD5_MARK in packed:
+        return packed.replace(_MD5_MARK, md5)
+    return packed
+
+
+class SearchResult(MutableMapping):
+    """
+    一条搜索结果。字段见 FIELDS；mirrors 以元组保存（读取时返回新的列表），
+    其它附加键（如 "_fallback_title"、GUI 或守护进程带来的字段）放在 extra 中。
+    字段保存在 __slots__ 中，行间重复的值（语言、扩展名、年份、大小文本、出版社）会被 intern；
+    镜像链接去掉 md5 后保存为共享模板，读取时再填回。用法与原来的 dict 相同（r["title"]、r.get()、dict(r)）。
+    """
+
+    __slots__ = (
+        "title",
+        "edition_id",
+        "edition_url",
+        "author",
+        "publisher",
+        "year",
+        "language",
+        "pages",
+        "size",
+        "size_bytes",
+        "extension",
+        "file_id",
+        "md5",
+        "_ads_url",
+        "_mirrors",
+        "fallback_title",
+        "extra",
+    )
+
+    def __init__(
+        self,
+        title="",
+        edition_id=None,
+        edition_url=None,
+        author="",
+        publisher="",
+        year="",
+        language="",
+        pages="",
+        size="",
+        size_bytes=None,
+        extension="",
+        file_id=None,
+        md5=None,
+        ads_url=None,
+        mirrors=(),
+        fallback_title=None,
+        extra=None,
+    ):
+        self.title = title
+        self.edition_id = edition_id
+        self.edition_url = edition_url
+        self.author = author
+        self.publisher = _intern(publisher)
+        self.year = _intern(year)
+        self.language = _intern(language)
+        self.pages = _intern(pages)
+        self.size = _intern(size)
+        self.size_bytes = size_bytes
+        self.extension = _intern(extension)
+        self.file_id = file_id
+        self.md5 = md5
+        self._ads_url = _pack_url(ads_url, md5)
+        self._mirrors = tuple(_pack_url(u, md5) for u in mirrors or ())
+        self.fallback_title = fallback_title
+        self.extra = extra or None
+
+    # --- 链接（按 md5 模板保存） ---
+    @property
+    def ads_url(self):
+        return _unpack_url(self._ads_url, self.md5)
+
+    @ads_url.setter
+    def ads_url(self, value):
+        self._ads_url = _pack_url(value, self.md5)
+
+    @property
+    def mirrors(self) -> list:
+        md5 = self.md5
+        return [_unpack_url(u, md5) for u in self._mirrors]
+
+    @mirrors.setter
+    def mirrors(self, value):
+        self._mirrors = tuple(_pack_url(u, self.md5) for u in value or ())
+
+    # --- 与 dict 兼容的访问 ---
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        if key == FALLBACK_TITLE and self.fallback_title is not None:
+            return self.fallback_title
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            if key == "md5":
+                ads_url, mirrors = self.ads_url, self.mirrors
+                self.md5 = value
+                self.ads_url, self.mirrors = ads_url, mirrors
+            else:
+                setattr(self, key, _intern(value) if key in INTERNED else value)
+        elif key == FALLBACK_TITLE:
+            self.fallback_title = value
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key == FALLBACK_TITLE and self.fallback_title is not None:
+            self.fallback_title = None
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)  # 固定字段不能删除
+
+    def __iter__(self):
+        yield from FIELDS
+        if self.fallback_title is not None:
+            yield FALLBACK_TITLE
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(FIELDS) + (self.fallback_title is not None) + len(self.extra or ())
+
+    def __contains__(self, key):
+        return key in _FIELD_SET or (key == FALLBACK_TITLE and self.fallback_title is not None) or bool(self.extra and key in self.extra)
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"SearchResult(title={self.title!r}, md5={self.md5!r}, extension={self.extension!r})"
+
+    # --- 复制与序列化 ---
+    def copy(self) -> "SearchResult":
+        clone = SearchResult.__new__(SearchResult)
+        for name in SearchResult.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.extra = dict(self.extra) if self.extra else None
+        return clone
+
+    def to_dict(self) -> dict:
+        return dict(self)
+
+    def to_tuple(self) -> tuple:
+        """紧凑的序列化形式（链接仍为模板），用于缓存与 pickle。"""
+        return (
+            self.title,
+            self.edition_id,
+            self.edition_url,
+            self.author,
+            self.publisher,
+            self.year,
+            self.language,
+            self.pages,
+            self.size,
+            self.size_bytes,
+            self.extension,
+            self.file_id,
+            self.md5,
+            self._ads_url,
+            self._mirrors,
+            self.fallback_title,
+            dict(self.extra) if self.extra else None,
+        )
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> "SearchResult":
+        """to_tuple() 的逆操作。重复的字符串在同一次 pickle 中只保存一份，载入后仍然共享，无需再次 intern。"""
+        record = cls.__new__(cls)
+        (
+            record.title,
+            record.edition_id,
+            record.edition_url,
+            record.author,
+            record.publisher,
+            record.year,
+            record.language,
+            record.pages,
+            record.size,
+            record.size_bytes,
+            record.extension,
+            record.file_id,
+            record.md5,
+            record._ads_url,
+            record._mirrors,
+            record.fallback_title,
+            record.extra,
+        ) = values
+        if record.extra:
+            record.extra = dict(record.extra)  # 缓存中的元组可能被多次取出
+        return record
+
+    @classmethod
+    def from_dict(cls, data) -> "SearchResult":
+        """由 dict（例如 JSON 中的搜索结果）构造；未知键放入 extra。"""
+        if isinstance(data, cls):
+            return data.copy()
+        known = {k: data[k] for k in FIELDS if k in data}
+        extra = {k: v for k, v in data.items() if k not in _FIELD_SET and k != FALLBACK_TITLE}
+        return cls(**known, fallback_title=data.get(FALLBACK_TITLE), extra=extra)
+
+    def __reduce__(self):
+        return (SearchResult.from_tuple, (self.to_tuple(),))
+
+
+def as_dict(result) -> dict:
+    """把 SearchResult（或普通 dict）转成可 JSON 序列化的 dict。"""
+    return result.to_dict() if isinstance(result, SearchResult) else dict(result)
+
+
+__all__ = ["FIELDS", "SearchResult", "as_dict"]
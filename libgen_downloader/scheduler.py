@@ -0,0 +1,264 @@
+"""
+Size-aware ordering of download tasks and batch ETA.
+"""
+
+import itertools
+import statistics
+import time
+from threading import Condition, Lock
+
+# fifo：按输入顺序；sjf：最短任务优先，单位时间完成的条目最多；
+# balanced：最多四分之一的槽位（至少一个）运行大文件，其余槽位继续处理小文件
+POLICIES = ("fifo", "sjf", "balanced")
+# 大小未知且队列中没有任何已知大小时的估计值
+DEFAULT_SIZE = 20 * 1024 * 1024
+# balanced 策略中视为“大文件”的阈值
+LARGE_SIZE = 100 * 1024 * 1024
+
+
+class Scheduler:
+    """
+    待执行任务的集合：add(task, size) 入队，take() 按策略取出下一个并记为运行中，任务结束后调用 finish(task)。
+    defer(task, size) 放入延后队列：不论策略，只有普通任务全部取完后才按入队顺序取出。
+    大小未知的任务按队列中已知大小的中位数估计。线程安全；任务可以是任意对象（按 id 跟踪）。
+    """
+
+    def __init__(self, policy: str = "fifo", slots: int = 1, large_size: int = LARGE_SIZE):
+        self.policy = policy
+        self.slots = max(1, slots)
+        self.large_size = large_size
+        self._pending: list = []  # [seq, size, task]
+        self._deferred: list = []  # 同上，按入队顺序
+        self._running: dict = {}  # id(task) -> 估计大小
+        self._seq = itertools.count()
+        self._lock = Lock()
+
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    @policy.setter
+    def policy(self, value: str) -> None:
+        if value not in POLICIES:
+            raise ValueError(f"未知的调度策略：{value}（可选 {', '.join(POLICIES)}）")
+        self._policy = value
+
+    def add(self, task, size: int | None = None) -> None:
+        with self._lock:
+            self._pending.append([next(self._seq), size if size and size > 0 else None, task])
+
+    def defer(self, task, size: int | None = None) -> None:
+        with self._lock:
+            self._deferred.append([next(self._seq), size if size and size > 0 else None, task])
+
+    def extend(self, tasks, size_of=lambda task: None) -> None:
+        for task in tasks:
+            self.add(task, size_of(task))
+
+    def take(self, slots: int | None = None):
+        """取出下一个任务（队列为空时返回 None）；slots 覆盖构造时的并行数（例如界面上调整了并行数）。"""
+        with self._lock:
+            if not self._pending and not self._deferred:
+                return None
+            if slots:
+                self.slots = max(1, slots)
+            if self._pending:
+                _seq, size, task = self._pending.pop(self._pick())
+            else:
+                _seq, size, task = self._deferred.pop(0)
+            self._running[id(task)] = size if size is not None else self._estimate_unknown()
+            return task
+
+    def finish(self, task) -> None:
+        with self._lock:
+            self._running.pop(id(task), None)
+
+    def remove(self, task) -> bool:
+        with self._lock:
+            for entries in (self._pending, self._deferred):
+                for i, entry in enumerate(entries):
+                    if entry[2] is task:
+                        del entries[i]
+                        return True
+        return False
+
+    def pending_bytes(self) -> int:
+        with self._lock:
+            unknown = self._estimate_unknown()
+            return sum(size if size is not None else unknown for _seq, size, _task in self._pending + self._deferred)
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._deferred)
+
+    def __bool__(self) -> bool:
+        return bool(self._pending or self._deferred)
+
+    def __iter__(self):
+        """按取出顺序的大致次序遍历待执行的任务（快照）：普通任务按入队顺序，其后是延后的任务。"""
+        with self._lock:
+            return iter([task for _seq, _size, task in self._pending + self._deferred])
+
+    # --- 策略 ---
+    def _estimate_unknown(self) -> int:
+        known = [size for _seq, size, _task in self._pending if size is not None]
+        return int(statistics.median(known)) if known else DEFAULT_SIZE
+
+    def _pick(self) -> int:
+        if self._policy == "fifo" or len(self._pending) == 1:
+            return 0  # _pending 按入队顺序排列
+        unknown = self._estimate_unknown()
+        sizes = [(size if size is not None else unknown, seq, i) for i, (seq, size, _task) in enumerate(self._pending)]
+        if self._policy == "sjf":
+            return min(sizes)[2]
+
+        large = [entry for entry in sizes if entry[0] >= self.large_size]
+        small = [entry for entry in sizes if entry[0] < self.large_size]
+        large_running = sum(1 for size in self._running.values() if size >= self.large_size)
+        if large and (large_running < max(1, self.slots // 4) or not small):
+            return min(large, key=lambda e: e[1])[2]  # 最早入队的大文件，尽早开始与小文件并行
+        return min(small)[2]
+
+
+class SchedulingQueue:
+    """
+    把 Scheduler 包装成与 queue.Queue 相同的 put/get 接口（有界，满时 put 阻塞），供流水线各级之间使用。
+    put(None) 是结束标记：get() 只有在队列取空后才返回 None。取出的任务处理完后调用 finish(item)。
+    """
+
+    def __init__(self, scheduler: Scheduler, maxsize: int = 0, size_of=lambda item: item.get("size_bytes")):
+        self.scheduler = scheduler
+        self.maxsize = maxsize
+        self.size_of = size_of
+        self._closed = 0
+        self._cond = Condition()
+
+    def put(self, item) -> None:
+        with self._cond:
+            if item is None:
+                self._closed += 1
+            else:
+                while self.maxsize and len(self.scheduler) >= self.maxsize:
+                    self._cond.wait()
+                self.scheduler.add(item, self.size_of(item))
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            while not self.scheduler and not self._closed:
+                self._cond.wait()
+            if self.scheduler:
+                item = self.scheduler.take()
+                self._cond.notify_all()
+                return item
+            self._closed -= 1
+            return None
+
+    def finish(self, item) -> None:
+        self.scheduler.finish(item)
+
+
+class BatchETA:
+    """
+    按字节估算整批任务的剩余时间：add(key, size) 登记任务（大小未知时按已知任务的中位数估计），
+    update(key, downloaded, total) 记录进度，finish(key, ok) 结束任务。速度取整批开始传输以来的平均值。
+    每个任务的第一次 update 视为起点（续传时为已有 .part 的大小），只有之后的增量计入传输字节，
+    否则续传的偏移量会被当成刚下载的字节，速度偏高、剩余时间偏短。
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._sizes: dict = {}
+        self._done: dict = {}
+        self._finished = 0
+        self._transferred = 0
+        self._started = None
+        self._lock = Lock()
+
+    def add(self, key, size: int | None = None) -> None:
+        with self._lock:
+            self._sizes[key] = size if size and size > 0 else None
+            self._done.setdefault(key, None)  # None：尚未报告起点
+
+    def update(self, key, downloaded: int, total: int | None = None) -> None:
+        with self._lock:
+            if key not in self._sizes:
+                return
+            if self._started is None:
+                self._started = self.clock()
+            previous = self._done.get(key)
+            if previous is not None:
+                self._transferred += max(0, downloaded - previous)
+            self._done[key] = downloaded
+            if total and total > 0:
+                self._sizes[key] = total
+
+    def finish(self, key, ok: bool = True) -> None:
+        with self._lock:
+            if key not in self._sizes:
+                return
+            del self._sizes[key]
+            self._done.pop(key, None)
+            if ok:
+                self._finished += 1
+
+    @property
+    def finished(self) -> int:
+        return self._finished
+
+    @property
+    def pending(self) -> int:
+        return len(self._sizes)
+
+    def remaining_bytes(self) -> int:
+        with self._lock:
+            known = [size for size in self._sizes.values() if size]
+            unknown = int(statistics.median(known)) if known else DEFAULT_SIZE
+            return sum(max(0, (size or unknown) - (self._done.get(key) or 0)) for key, size in self._sizes.items())
+
+    def rate(self) -> float | None:
+        with self._lock:
+            if self._started is None:
+                return None
+            elapsed = self.clock() - self._started
+            return self._transferred / elapsed if elapsed > 0 and self._transferred else None
+
+    def eta(self) -> float | None:
+        """剩余秒数；尚无传输速度时返回 None。"""
+        rate = self.rate()
+        return self.remaining_bytes() / rate if rate else None
+
+
+def format_bytes(n: int | None) -> str:
+    if n is None:
+        return "?"
+    if n < 1024:
+        return f"{n} B"
+    value = n / 1024
+    for unit in ("KB", "MB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def format_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return "未知"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
+
+
+__all__ = [
+    "POLICIES",
+    "BatchETA",
+    "Scheduler",
+    "SchedulingQueue",
+    "format_bytes",
+    "format_eta",
+]
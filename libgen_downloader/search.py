@@ -2,15 +2,25 @@
 Search related helpers for Libgen.
 """
 
+import codecs
 import re
-from typing import Iterable, List, Optional
+import time
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from threading import Event, Lock
+from typing import Iterable, Iterator, List, Optional
 from urllib.parse import parse_qs, urljoin, urlparse
 
-import requests
-from bs4 import BeautifulSoup
+from .cache import TTLCache
+from .config import BASE_URL, get_session
+from .errors import DownloadError, SearchCancelled, SearchError
+from .events import FallbackLevel, PushdownDisabled, SearchDone, SearchFailed, SearchStarted, emit
+from .metrics import METRICS, host_of
+from .results import SearchResult
 
-from .config import BASE_URL, SESSION
-from .errors import DownloadError
+# 相同参数的搜索在短时间内直接复用解析结果，避免反复请求镜像站（保存 SearchResult.to_tuple()，命中时重建）
+SEARCH_CACHE = TTLCache(ttl=300, maxsize=128)
+SEARCH_TIMEOUT = (10, 30)
 
 
 def search(
@@ -22,10 +32,220 @@ def search(
     order: Optional[str] = None,
     ordermode: Optional[str] = None,
     filesuns: str = "all",
+    cancel_event: Event | None = None,
+    use_cache: bool = True,
+    on_rows=None,
+    stop_after: int | None = None,
+    plan: "SearchPlan | None" = None,
 ):
     """
     调用 index.php 做搜索，支持自定义 columns/objects/topics/order/filesuns 等参数。
+    cancel_event 被设置时中断正在读取的响应（关闭连接）并抛出 SearchCancelled；
+    use_cache 为 True 时优先返回 SEARCH_CACHE 中未过期的结果。
+    on_rows(rows) 在每个网络分块解析出新行时被调用，便于界面边下载边展示。
+    stop_after 给出时，解析到这么多行后即关闭连接、不再读取剩余页面（如按 ISBN 查找）。
+    plan（PLANNER.plan() 的结果）带有下推条件时按 plan.req 搜索；下推后没有结果则按原查询重新搜索
+    并设置 plan.retried。服务器是否真的按条件筛选由 PLANNER 检查，调用方仍需在本地筛选。
     """
+    args = (limit, columns, objects, topics, order, ordermode, filesuns, cancel_event, use_cache, on_rows, stop_after)
+    if plan is not None and plan.pushed:
+        try:
+            results = _search_req(plan.req, *args)
+            if results:
+                PLANNER.check(plan, results)
+                return results
+            plan.retried = True
+            results = _search_req(query, *args)
+            PLANNER.check_retry(plan, results)
+            return results
+        finally:
+            PLANNER.release(plan)
+    return _search_req(query, *args)
+
+
+def _search_req(req, limit, columns, objects, topics, order, ordermode, filesuns, cancel_event, use_cache, on_rows, stop_after):
+    params = build_search_params(req, limit, columns, objects, topics, order, ordermode, filesuns)
+    cache_key = search_cache_key(params)
+    if stop_after:
+        cache_key += (("stop_after", stop_after),)
+    if use_cache:
+        cached = SEARCH_CACHE.get(cache_key)
+        if cached is not None:
+            METRICS.inc("search", host=host_of(BASE_URL), outcome="cached")
+            results = [SearchResult.from_tuple(t) for t in cached]
+            if on_rows and results:
+                on_rows(results)
+            return results
+
+    url = urljoin(BASE_URL, "/index.php")
+    host = host_of(url)
+    results = []
+    outcome = "error"
+    chunks = _iter_text(url, params, cancel_event)
+    try:
+        with METRICS.timer("search", host=host):
+            for batch in iter_search_results(chunks):
+                if stop_after:
+                    batch = batch[: stop_after - len(results)]
+                results.extend(batch)
+                if on_rows:
+                    on_rows(batch)
+                if stop_after and len(results) >= stop_after:
+                    break
+        outcome = "ok" if results else "empty"
+    except SearchCancelled:
+        outcome = "cancelled"
+        raise
+    finally:
+        chunks.close()
+        METRICS.inc("search", host=host, outcome=outcome)
+    METRICS.inc("search_rows", len(results), host=host)
+    if use_cache:
+        SEARCH_CACHE.set(cache_key, [r.to_tuple() for r in results])
+    return results
+
+
+@dataclass
+class SearchPlan:
+    """
+    一次搜索的执行计划：req 为实际发送的查询串，pushed 为写入查询串、交给服务器筛选的条件
+    （ext/lang/year），retried 表示下推后没有结果、已按原查询重新搜索；probe 表示这次搜索在试探
+    主机是否支持尚未确认的条件。
+    """
+
+    query: str
+    req: str
+    pushed: tuple = ()
+    filters: dict = field(default_factory=dict)
+    host: str = ""
+    retried: bool = False
+    probe: bool = False
+
+    @property
+    def effective(self) -> tuple:
+        """实际生效的下推条件（重新搜索后为空）。"""
+        return () if self.retried else self.pushed
+
+
+class PushdownPlanner:
+    """
+    把扩展名、语言与年份筛选写成 index.php 的查询语法（"ext:pdf lang:English year:2001-2005"），
+    让服务器只返回匹配的行，减少下载与解析的字节数。本地筛选仍照常进行。
+    该语法并非 Libgen 公开支持的接口，学到的主机能力也只保存在内存中（每个新进程都要重新试探），
+    因此默认关闭，--pushdown 开启（适用于确认支持该语法的镜像，或长时间运行的批量/守护进程）。
+    按主机记录服务器不支持的条件：下推后返回了明显不满足该条件的行（服务器忽略了它），
+    或下推后没有结果、原查询却有结果（服务器多半把它当作普通关键词）；之后不再下推这些条件，
+    各回退级别都用原查询搜索，共享 SEARCH_CACHE，不再每级多发一次请求。
+    条件得到确认（下推后返回的结果都满足）之前，每个主机同一时间只有一个搜索试探下推，
+    并发的其它搜索先用原查询，避免每个条目都多发一次请求。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._unsupported: dict = {}  # host -> 不支持的条件集合
+        self._supported: dict = {}  # host -> 已确认支持的条件集合
+        self._probing: set = set()  # 正在试探的主机
+        self._lock = Lock()
+
+    def plan(self, query: str, columns=None, language=None, ext=None, year_min=None, year_max=None) -> SearchPlan:
+        host = host_of(BASE_URL)
+        filters = {}
+        probe = False
+        # ISBN 查找只在 ISBN 列搜索，查询串里不能混入其它词
+        if self.enabled and not (columns and set(columns) == {"i"}):
+            with self._lock:
+                unsupported = self._unsupported.get(host, set())
+                if ext and "ext" not in unsupported:
+                    filters["ext"] = ext.lower()
+                if language and "lang" not in unsupported:
+                    filters["lang"] = language
+                if (year_min is not None or year_max is not None) and "year" not in unsupported:
+                    filters["year"] = (year_min, year_max)
+                if filters and not set(filters) <= self._supported.get(host, set()):
+                    if host in self._probing:
+                        filters = {}  # 另一个搜索正在试探，先用原查询
+                    else:
+                        self._probing.add(host)
+                        probe = True
+        tokens = []
+        for name, value in filters.items():
+            if name == "year":
+                lo, hi = value
+                value = str(lo) if lo is not None and lo == hi else f"{'' if lo is None else lo}-{'' if hi is None else hi}"
+            tokens.append(f"{name}:{value}" if " " not in str(value) else f'{name}:"{value}"')
+        req = " ".join([query] + tokens)
+        return SearchPlan(query=query, req=req, pushed=tuple(filters), filters=filters, host=host, probe=probe)
+
+    def check(self, plan: SearchPlan, results: list) -> None:
+        """下推搜索有结果：找出服务器没有遵守的条件。"""
+        ignored = tuple(name for name in plan.pushed if any(_violates(r, name, plan.filters[name]) for r in results))
+        METRICS.inc("search_pushdown", host=plan.host, outcome="ignored" if ignored else "hit")
+        if ignored:
+            self._disable(plan.host, ignored, "返回了不满足条件的结果")
+        else:
+            with self._lock:
+                self._supported.setdefault(plan.host, set()).update(plan.pushed)
+
+    def check_retry(self, plan: SearchPlan, results: list) -> None:
+        """
+        下推搜索没有结果、已按原查询重新搜索：原查询有结果时停止下推这些条件。即使原结果都不满足条件
+        （服务器可能确实支持该语法），继续下推也只会让每个回退级别多发一次请求。
+        """
+        METRICS.inc("search_pushdown", host=plan.host, outcome="unsupported" if results else "retried")
+        if results:
+            self._disable(plan.host, plan.pushed, "下推后没有结果，原查询有结果")
+
+    def release(self, plan: SearchPlan) -> None:
+        """下推搜索结束（包括出错）：试探中的主机允许下一个搜索继续试探。"""
+        if plan.probe:
+            with self._lock:
+                self._probing.discard(plan.host)
+
+    def _disable(self, host: str, filters: tuple, reason: str) -> None:
+        with self._lock:
+            unsupported = self._unsupported.setdefault(host, set())
+            new = tuple(f for f in filters if f not in unsupported)
+            unsupported.update(new)
+        if new:
+            emit(PushdownDisabled(host, new, reason))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._unsupported.clear()
+            self._supported.clear()
+            self._probing.clear()
+
+
+def _violates(row: dict, name: str, value) -> bool:
+    """row 是否明显不满足下推条件。字段缺失或无法解析时不算违反（服务器可能按其它字段筛选）。"""
+    if name == "ext":
+        actual = (row.get("extension") or "").lower()
+        return bool(actual) and actual != value
+    if name == "lang":
+        actual = (row.get("language") or "").lower()
+        return bool(actual) and actual != value.lower()
+    lo, hi = value
+    try:
+        year = int((row.get("year") or "").strip())
+    except ValueError:
+        return False
+    return (lo is not None and year < lo) or (hi is not None and year > hi)
+
+
+PLANNER = PushdownPlanner()
+
+
+def build_search_params(
+    query: str,
+    limit: int = 25,
+    columns: Optional[Iterable[str]] = None,
+    objects: Optional[Iterable[str]] = None,
+    topics: Optional[Iterable[str]] = None,
+    order: Optional[str] = None,
+    ordermode: Optional[str] = None,
+    filesuns: str = "all",
+) -> dict:
+    """构建 index.php 的查询参数（线程与 asyncio 引擎共用）。"""
     params = {
         "req": query,
         "res": str(limit),
@@ -44,16 +264,53 @@ def search(
         params["order"] = order
     if ordermode:
         params["ordermode"] = ordermode
+    return params
 
-    url = urljoin(BASE_URL, "/index.php")
-    resp = SESSION.get(url, params=params)
-    resp.raise_for_status()
-    return parse_search_results(resp.text)
+
+def search_cache_key(params: dict) -> tuple:
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple)) else v) for k, v in params.items()))
+
+
+def _iter_text(url: str, params: dict, cancel_event: Event | None = None) -> Iterator[str]:
+    """
+    以流式方式读取页面并逐块解码，每个分块之间检查取消标志；
+    取消或调用方提前停止迭代时直接关闭底层连接。
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise SearchCancelled("搜索已取消")
+    host = host_of(url)
+    with METRICS.timer("search_ttfb", host=host):
+        resp = get_session().get(url, params=params, stream=True, timeout=SEARCH_TIMEOUT)
+    try:
+        resp.raise_for_status()
+        decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+        for chunk in resp.iter_content(chunk_size=16384):
+            if cancel_event is not None and cancel_event.is_set():
+                raise SearchCancelled("搜索已取消")
+            METRICS.inc("search_bytes", len(chunk), host=host)
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    finally:
+        resp.close()
 
 
 def parse_search_results(html: str, base_url: str = BASE_URL):
     """
-    从搜索结果页面 HTML 中解析结果列表。
+    从搜索结果页面 HTML 中解析结果列表（一次性输入完整页面）。
+    """
+    results: List[SearchResult] = []
+    for batch in iter_search_results([html], base_url=base_url):
+        results.extend(batch)
+    return results
+
+
+def iter_search_results(chunks: Iterable[str], base_url: str = BASE_URL) -> Iterator[List[SearchResult]]:
+    """
+    增量解析搜索结果页：每喂入一个 HTML 文本分块，就产出该分块内已闭合的结果行（可能为空批次被跳过）。
     每行结构（9 列）：
     0: 标题(+ISBN+badge+edition 链接)
     1: 作者
@@ -65,96 +322,269 @@ def parse_search_results(html: str, base_url: str = BASE_URL):
     7: 扩展名
     8: mirrors（含 ads.php?md5=... 及其它镜像链接）
     """
-    soup = BeautifulSoup(html, "html.parser")
-    table = soup.find("table", id="tablelibgen")
-    if not table:
-        return []
-    body = table.find("tbody")
-    if not body:
-        return []
+    parser = _ResultTableParser(base_url)
+    # 只统计解析本身的耗时（不含等待网络分块的时间），未启用指标时不计时
+    timed = METRICS.enabled
+    spent = 0.0
+    try:
+        for chunk in chunks:
+            if timed:
+                t0 = time.perf_counter()
+                parser.feed(chunk)
+                spent += time.perf_counter() - t0
+            else:
+                parser.feed(chunk)
+            batch = parser.pop_rows()
+            if batch:
+                yield batch
+            if parser.done:
+                return
+        parser.close()
+        batch = parser.pop_rows()
+        if batch:
+            yield batch
+    finally:
+        if timed and spent:
+            METRICS.observe("parse", spent)
 
-    results: List[dict] = []
-    for row in body.find_all("tr"):
-        cols = row.find_all("td")
-        if len(cols) != 9:
-            continue
 
-        col0 = cols[0]
-        title_link = col0.find("a", href=lambda x: x and "edition.php" not in x)
-        if title_link:
-            raw_title = title_link.get_text(" ", strip=True)
-        else:
-            for s in col0(["script", "style"]):
-                s.decompose()
-            raw_title = col0.get_text(" ", strip=True)
-
-        title = " ".join(raw_title.split())
-        title = re.split(r"ISBN[:\s]", title, flags=re.I)[0].strip()
-
-        edition_id = None
-        edition_url = None
-        for a in col0.find_all("a", href=True):
-            href = a["href"]
-            if "edition.php" in href:
-                edition_url = urljoin(base_url, href)
-                qs = parse_qs(urlparse(edition_url).query)
-                edition_id = qs.get("id", [None])[0]
-                break
-
-        author = cols[1].get_text(" ", strip=True)
-        publisher = cols[2].get_text(" ", strip=True)
-        year = cols[3].get_text(" ", strip=True)
-        language = cols[4].get_text(" ", strip=True)
-        pages = cols[5].get_text(" ", strip=True)
-
-        col_size = cols[6]
-        size_link = col_size.find("a", href=True)
-        if size_link:
-            size_text = size_link.get_text(" ", strip=True)
-            href = size_link["href"]
-            file_id = parse_qs(urlparse(href).query).get("id", [None])[0]
-        else:
-            size_text = col_size.get_text(" ", strip=True)
-            file_id = None
-
-        extension = cols[7].get_text(" ", strip=True)
-
-        mirrors_col = cols[8]
-        md5 = None
-        ads_url = None
-        mirrors = []
-        for a in mirrors_col.find_all("a", href=True):
-            href = a["href"]
-            full = urljoin(base_url, href)
-            mirrors.append(full)
-            if "ads.php?md5=" in href and not ads_url:
-                ads_url = full
-                qs = parse_qs(urlparse(ads_url).query)
-                md5 = qs.get("md5", [md5])[0]
-            if not md5 and "/book/" in href:
-                m = re.search(r"/book/([0-9a-f]{32})", href)
-                if m:
-                    md5 = m.group(1)
-
-        results.append(
-            {
-                "title": title,
-                "edition_id": edition_id,
-                "edition_url": edition_url,
-                "author": author,
-                "publisher": publisher,
-                "year": year,
-                "language": language,
-                "pages": pages,
-                "size": size_text,
-                "extension": extension,
-                "file_id": file_id,
-                "md5": md5,
-                "ads_url": ads_url,
-                "mirrors": mirrors,
-            }
-        )
-    return results
+class _Cell:
+    __slots__ = ("texts", "anchors")
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.anchors: List[tuple] = []  # (href, texts)
+
+    def text(self) -> str:
+        return " ".join(self.texts)
+
+
+class _ResultTableParser(HTMLParser):
+    """
+    只关注 table#tablelibgen 的第一个 tbody，按 tr/td 收集文本与链接；
+    文本规则与 BeautifulSoup 的 get_text(" ", strip=True) 一致（忽略 script/style/注释）。
+    """
+
+    def __init__(self, base_url: str):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.done = False
+        self._rows: List[SearchResult] = []
+        self._table_depth = 0  # >0 表示位于目标表内，嵌套 table 时递增
+        self._body_seen = False
+        self._in_body = False
+        self._cells: Optional[List[_Cell]] = None
+        self._cell: Optional[_Cell] = None
+        self._open_anchors: List[tuple] = []
+        self._skip_depth = 0
+        self._pending: List[str] = []  # 同一文本节点可能被分块切开，遇到标签边界再合并
+
+    def pop_rows(self) -> List[SearchResult]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        self._flush_text()
+        if tag == "table":
+            if self._table_depth:
+                self._table_depth += 1
+            elif dict(attrs).get("id") == "tablelibgen":
+                self._table_depth = 1
+            return
+        if not self._table_depth:
+            return
+        if self._cell is not None:
+            if tag in ("script", "style"):
+                self._skip_depth += 1
+                return
+            if tag == "a":
+                anchor = (dict(attrs).get("href"), [])
+                self._cell.anchors.append(anchor)
+                self._open_anchors.append(anchor)
+                return
+        if self._table_depth != 1:
+            return
+        if tag == "tbody" and not self._body_seen:
+            self._body_seen = True
+            self._in_body = True
+        elif not self._in_body:
+            return
+        elif tag == "tr":
+            self._end_row()
+            self._cells = []
+        elif tag == "td" and self._cells is not None:
+            self._end_cell()
+            self._cell = _Cell()
+            self._cells.append(self._cell)
+
+    def handle_endtag(self, tag):
+        if self.done or not self._table_depth:
+            return
+        self._flush_text()
+        if tag == "table":
+            self._table_depth -= 1
+            if not self._table_depth:
+                self._end_row()
+                self.done = True
+            return
+        if tag in ("script", "style"):
+            if self._skip_depth:
+                self._skip_depth -= 1
+            return
+        if tag == "a":
+            if self._open_anchors:
+                self._open_anchors.pop()
+            return
+        if self._table_depth != 1 or not self._in_body:
+            return
+        if tag == "tbody":
+            self._end_row()
+            self._in_body = False
+        elif tag == "tr":
+            self._end_row()
+        elif tag == "td":
+            self._end_cell()
+
+    def handle_data(self, data):
+        if self._cell is not None and not self._skip_depth:
+            self._pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def close(self):
+        super().close()
+        self._end_row()
+
+    def _flush_text(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending).strip()
+        self._pending = []
+        if not text or self._cell is None:
+            return
+        self._cell.texts.append(text)
+        for _href, texts in self._open_anchors:
+            texts.append(text)
+
+    def _end_cell(self):
+        self._flush_text()
+        self._cell = None
+        self._open_anchors = []
+        self._skip_depth = 0
+
+    def _end_row(self):
+        self._end_cell()
+        cells, self._cells = self._cells, None
+        if cells is not None and len(cells) == 9:
+            self._rows.append(_row_from_cells(cells, self.base_url))
+
+
+_SIZE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*([kmgt]?)(?:i?b|bytes?)?\b", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(text) -> Optional[int]:
+    """把结果页的大小文本（"12 MB"、"834 kB"、"1,5 GB"、"523 bytes"）换算为字节数；无法识别时返回 None。"""
+    m = _SIZE_RE.search(str(text or ""))
+    if not m:
+        return None
+    return int(float(m.group(1).replace(",", ".")) * _SIZE_UNITS[m.group(2).lower()])
+
+
+def normalize_md5(value) -> Optional[str]:
+    """规范化 md5（32 位十六进制，转小写）；格式不对时返回 None。"""
+    text = str(value or "").strip().lower()
+    return text if re.fullmatch(r"[0-9a-f]{32}", text) else None
+
+
+def normalize_isbn(value) -> Optional[str]:
+    """去掉连字符/空格等，得到 10 位或 13 位 ISBN（末位可为 X）；格式不对时返回 None。"""
+    text = re.sub(r"[^0-9Xx]", "", str(value or "")).upper()
+    if re.fullmatch(r"\d{9}[\dX]|\d{13}", text):
+        return text
+    return None
+
+
+def result_from_md5(md5: str, title: Optional[str] = None, extension: Optional[str] = None, base_url: str = BASE_URL) -> SearchResult:
+    """
+    已知 md5 时直接构造与搜索结果同结构的条目（入口为 ads.php?md5=...），无需搜索和解析结果页。
+    title/extension 来自输入表格，用于文件名与下载后的格式校验。
+    """
+    md5 = md5.lower()
+    ads_url = urljoin(base_url, f"/ads.php?md5={md5}")
+    return SearchResult(
+        title=title or "",
+        extension=(extension or "").strip().lstrip(".").lower(),
+        md5=md5,
+        ads_url=ads_url,
+        mirrors=(ads_url,),
+        fallback_title=title or md5,
+    )
+
+
+def _row_from_cells(cols: List[_Cell], base_url: str) -> SearchResult:
+    col0 = cols[0]
+    title_link = next((texts for href, texts in col0.anchors if href and "edition.php" not in href), None)
+    raw_title = " ".join(title_link) if title_link is not None else col0.text()
+
+    title = " ".join(raw_title.split())
+    title = re.split(r"ISBN[:\s]", title, flags=re.I)[0].strip()
+
+    edition_id = None
+    edition_url = None
+    for href, _texts in col0.anchors:
+        if href is not None and "edition.php" in href:
+            edition_url = urljoin(base_url, href)
+            qs = parse_qs(urlparse(edition_url).query)
+            edition_id = qs.get("id", [None])[0]
+            break
+
+    size_link = next(((href, texts) for href, texts in cols[6].anchors if href is not None), None)
+    if size_link:
+        href, texts = size_link
+        size_text = " ".join(texts)
+        file_id = parse_qs(urlparse(href).query).get("id", [None])[0]
+    else:
+        size_text = cols[6].text()
+        file_id = None
+
+    md5 = None
+    ads_url = None
+    mirrors = []
+    for href, _texts in cols[8].anchors:
+        if href is None:
+            continue
+        full = urljoin(base_url, href)
+        mirrors.append(full)
+        if "ads.php?md5=" in href and not ads_url:
+            ads_url = full
+            qs = parse_qs(urlparse(ads_url).query)
+            md5 = qs.get("md5", [md5])[0]
+        if not md5 and "/book/" in href:
+            m = re.search(r"/book/([0-9a-f]{32})", href)
+            if m:
+                md5 = m.group(1)
+
+    return SearchResult(
+        title=title,
+        edition_id=edition_id,
+        edition_url=edition_url,
+        author=cols[1].text(),
+        publisher=cols[2].text(),
+        year=cols[3].text(),
+        language=cols[4].text(),
+        pages=cols[5].text(),
+        size=size_text,
+        size_bytes=parse_size(size_text),
+        extension=cols[7].text(),
+        file_id=file_id,
+        md5=md5,
+        ads_url=ads_url,
+        mirrors=mirrors,
+    )
 
 
 def filter_results(
@@ -219,19 +649,43 @@ def smart_search(
     author_exact: bool = False,
     fallback_level: int = 0,
     logger=None,
+    cancel_event: Event | None = None,
+    on_rows=None,
+    stop_after: int | None = None,
+    raise_errors: bool = False,
 ):
     """
     智能搜索：如果当前参数组合没有结果，则尝试减少过滤条件。
+    on_rows(rows) 会收到当前回退级别下已通过本地筛选的结果批次；
+    只有某一级别产生了匹配才会回调，因此界面收到的批次拼接起来即为最终结果。
     fallback_level:
     0: 原始参数
     1: 忽略年份限制
     2: 忽略扩展名限制
     3: 忽略语言限制
+    stop_after 透传给 search()。
+    搜索请求失败（网络错误、5xx）时默认返回空列表；raise_errors=True 时抛出 SearchError，
+    调用方据此区分“镜像故障”与“确实没有结果”（后者才记入 NEGATIVE_CACHE）。
+    启用 --pushdown 时扩展名/语言/年份条件由 PLANNER 尽量下推到服务器（见 PushdownPlanner），本地筛选照常进行；
+    未下推时回退级别之间的搜索参数相同，会直接命中 SEARCH_CACHE。
     """
-    _log(
-        f"[*] 尝试搜索: '{query}' (Level {fallback_level}) | 语言={language}, 格式={ext}, 年份={year_min}-{year_max}, 作者={author}",
-        logger=logger,
-    )
+    import requests
+
+    emit(SearchStarted(query, fallback_level, language, ext, year_min, year_max, author), logger=logger)
+    plan = PLANNER.plan(query, columns, language, ext, year_min, year_max)
+
+    def emit_filtered(rows):
+        matched = filter_results(
+            rows,
+            language=language,
+            ext=ext,
+            year_min=year_min,
+            year_max=year_max,
+            author=author,
+            author_exact=author_exact,
+        )
+        if matched:
+            on_rows(matched)
 
     try:
         results = search(
@@ -243,12 +697,20 @@ def smart_search(
             order=order,
             ordermode=ordermode,
             filesuns=filesuns,
+            cancel_event=cancel_event,
+            on_rows=emit_filtered if on_rows else None,
+            stop_after=stop_after,
+            plan=plan,
         )
     except requests.RequestException as e:
-        _log(f"[!] 搜索请求失败: {e}", level="error", logger=logger)
+        emit(SearchFailed(query, fallback_level, e), logger=logger)
+        emit(SearchDone(query, fallback_level, "error", pushed=plan.effective))
+        if raise_errors:
+            raise SearchError(f"搜索请求失败：{e}") from e
         return []
 
     if not results:
+        emit(SearchDone(query, fallback_level, "empty", pushed=plan.effective))
         return []
 
     filtered = filter_results(
@@ -262,7 +724,8 @@ def smart_search(
     )
 
     if not filtered and fallback_level < 3:
-        _log(f"[!] Level {fallback_level} 无结果，尝试降低过滤要求...", level="warning", logger=logger)
+        emit(SearchDone(query, fallback_level, "filtered_out", raw=len(results), pushed=plan.effective))
+        emit(FallbackLevel(query, fallback_level), logger=logger)
         if fallback_level == 0:
             return smart_search(
                 query,
@@ -281,6 +744,10 @@ def smart_search(
                 author_exact,
                 fallback_level + 1,
                 logger=logger,
+                cancel_event=cancel_event,
+                on_rows=on_rows,
+                stop_after=stop_after,
+                raise_errors=raise_errors,
             )
         if fallback_level == 1:
             return smart_search(
@@ -300,6 +767,10 @@ def smart_search(
                 author_exact,
                 fallback_level + 2,
                 logger=logger,
+                cancel_event=cancel_event,
+                on_rows=on_rows,
+                stop_after=stop_after,
+                raise_errors=raise_errors,
             )
         if fallback_level == 2:
             return smart_search(
@@ -319,20 +790,24 @@ def smart_search(
                 author_exact,
                 fallback_level + 3,
                 logger=logger,
+                cancel_event=cancel_event,
+                on_rows=on_rows,
+                stop_after=stop_after,
+                raise_errors=raise_errors,
             )
 
+    emit(
+        SearchDone(
+            query,
+            fallback_level,
+            "hit" if filtered else "filtered_out",
+            raw=len(results),
+            matched=len(filtered),
+            pushed=plan.effective,
+        )
+    )
     return filtered
 
 
-def _log(message, level: str = "info", logger=None):
-    if logger:
-        try:
-            logger(level, message)
-            return
-        except Exception:
-            pass
-    print(message)
-
-
 def _normalize_text(text: str) -> str:
     return " ".join(str(text).lower().split())
@@ -0,0 +1,278 @@
+"""
+Deterministic sharding of batch inputs plus mergeable per-shard journals.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from threading import Lock
+
+from .events import BUS, ItemDone
+
+JOURNAL_VERSION = 1
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """解析 "i/N"（1 ≤ i ≤ N）。"""
+    try:
+        index, count = (int(part) for part in value.split("/", 1))
+    except ValueError as e:
+        raise ValueError(f"分片格式应为 i/N，例如 1/4：{value}") from e
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"分片编号超出范围：{value}")
+    return index, count
+
+
+def normalize_key(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def shard_key(item: dict) -> str:
+    """分片键：有 md5 时按 md5，否则按规范化后的查询词。"""
+    md5 = (item.get("md5") or "").strip().lower()
+    return f"md5:{md5}" if md5 else f"q:{normalize_key(item.get('query') or '')}"
+
+
+def shard_of(key: str, count: int) -> int:
+    """稳定哈希（不受 PYTHONHASHSEED 影响），返回 1..count。各节点用同一 CSV 加 --shard i/N，只处理落在自己分片的条目。"""
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def journal_paths(directory, index: int, count: int) -> tuple[Path, Path]:
+    base = Path(directory) / f"shard-{index}-of-{count}"
+    return base.with_suffix(".jsonl"), base.with_suffix(".manifest.json")
+
+
+class ShardJournal:
+    """
+    订阅 ItemDone 事件，把每个条目的结果追加到 JSONL 日志（逐行 flush，进程中断也不会丢失已完成的记录），
+    close() 时写出 manifest。已成功的键可通过 done_keys 跳过。
+    """
+
+    def __init__(self, directory, index: int = 1, count: int = 1, source=None, out_dir=None):
+        self.index = index
+        self.count = count
+        self.source = str(source) if source else None
+        self.out_dir = Path(out_dir) if out_dir else None
+        self.path, self.manifest_path = journal_paths(directory, index, count)
+        self.node = socket.gethostname()
+        self.started = time.time()
+        self.counts: dict = {}
+        self.selected = 0
+        self.skipped = 0
+        self._lock = Lock()
+        self._keys: dict = {}  # query -> 分片键（按 md5 分片的条目，ItemDone 只带 query）
+        self.done_keys = self._load_done()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        BUS.subscribe(self._on_item_done, ItemDone)
+
+    def _load_done(self) -> set:
+        done = set()
+        for record in read_journal(self.path):
+            if record.get("status") == "success":
+                done.add(record["key"])
+        return done
+
+    def accepts(self, item: dict) -> bool:
+        """该条目是否属于本分片且尚未成功完成（同时统计数量）。"""
+        key = shard_key(item)
+        if shard_of(key, self.count) != self.index:
+            return False
+        if key in self.done_keys:
+            self.skipped += 1
+            return False
+        self.selected += 1
+        self._keys[item.get("query")] = key
+        return True
+
+    def _on_item_done(self, event: ItemDone) -> None:
+        size = None
+        if event.path:
+            try:
+                size = os.path.getsize(event.path)
+            except OSError:
+                pass
+        record = {
+            "key": self._keys.get(event.query) or shard_key({"query": event.query}),
+            "query": event.query,
+            "status": event.status,
+            "md5": event.md5,
+            "file": os.path.basename(event.path) if event.path else None,
+            "size": size,
+            "shard": f"{self.index}/{self.count}",
+            "node": self.node,
+            "ts": time.time(),
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._fh.write(line + "\n")
+            self._fh.flush()
+            self.counts[event.status] = self.counts.get(event.status, 0) + 1
+            if event.status == "success":
+                self.done_keys.add(record["key"])
+
+    def close(self) -> None:
+        BUS.unsubscribe(self._on_item_done)
+        with self._lock:
+            self._fh.close()
+        manifest = {
+            "version": JOURNAL_VERSION,
+            "shard": f"{self.index}/{self.count}",
+            "node": self.node,
+            "source": self.source,
+            "out_dir": str(self.out_dir) if self.out_dir else None,
+            "journal": self.path.name,
+            "started": self.started,
+            "finished": time.time(),
+            "selected": self.selected,
+            "skipped_done": self.skipped,
+            "counts": self.counts,
+        }
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_journal(path):
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 中断时可能留下半行
+
+
+def _expand(paths) -> list[Path]:
+    files = []
+    for p in paths:
+        p = Path(p)
+        if p.is_dir():
+            files.extend(sorted(p.glob("shard-*-of-*.jsonl")))
+        else:
+            files.append(p)
+    return files
+
+
+def merge_journals(paths) -> tuple[list[dict], dict]:
+    """
+    合并多个分片日志。每个键保留一条最终记录（优先 success，其次最新的一条），返回 (merged, report)：
+    - duplicates：同一键在多个节点/分片都下载成功，或不同键下载到了同一 md5
+    - conflicts：同一键成功下载了不同 md5 的文件
+    - misplaced：记录所在分片与键的哈希分片不一致（分片数或键规则不一致）
+    - missing_shards：manifest 声明了 N 个分片但缺少其中某些
+    """
+    files = _expand(paths)
+    by_key: dict = {}
+    shard_counts = set()
+    seen_shards = set()
+    misplaced = []
+    for file in files:
+        manifest = file.with_suffix(".manifest.json")
+        if manifest.exists():
+            try:
+                info = json.loads(manifest.read_text(encoding="utf-8"))
+                index, count = parse_shard(info["shard"])
+                shard_counts.add(count)
+                seen_shards.add((index, count))
+            except (ValueError, KeyError, json.JSONDecodeError):
+                pass
+        for record in read_journal(file):
+            record["journal"] = str(file)
+            by_key.setdefault(record["key"], []).append(record)
+            try:
+                index, count = parse_shard(record.get("shard") or "1/1")
+            except ValueError:
+                continue
+            if shard_of(record["key"], count) != index:
+                misplaced.append(record)
+
+    merged = []
+    duplicates = []
+    conflicts = []
+    by_md5: dict = {}
+    for key, records in by_key.items():
+        successes = [r for r in records if r.get("status") == "success"]
+        best = successes[0] if successes else max(records, key=lambda r: r.get("ts") or 0)
+        best = dict(best, attempts=len(records))
+        merged.append(best)
+        origins = {(r.get("node"), r.get("shard"), r.get("journal")) for r in successes}
+        if len(origins) > 1:
+            duplicates.append({"key": key, "reason": "same_key", "records": successes})
+        md5s = {r.get("md5") for r in successes if r.get("md5")}
+        if len(md5s) > 1:
+            conflicts.append({"key": key, "reason": "different_md5", "md5s": sorted(md5s), "records": successes})
+        for md5 in md5s:
+            by_md5.setdefault(md5, set()).add(key)
+    for md5, keys in by_md5.items():
+        if len(keys) > 1:
+            duplicates.append({"md5": md5, "reason": "same_md5", "keys": sorted(keys)})
+
+    missing = []
+    for count in shard_counts:
+        missing.extend(f"{i}/{count}" for i in range(1, count + 1) if (i, count) not in seen_shards)
+
+    counts: dict = {}
+    for record in merged:
+        counts[record.get("status")] = counts.get(record.get("status"), 0) + 1
+    report = {
+        "journals": [str(f) for f in files],
+        "keys": len(merged),
+        "counts": counts,
+        "duplicates": duplicates,
+        "conflicts": conflicts,
+        "misplaced": misplaced,
+        "missing_shards": sorted(missing),
+    }
+    merged.sort(key=lambda r: r["key"])
+    return merged, report
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"[*] 合并 {len(report['journals'])} 个日志，共 {report['keys']} 个条目："
+        + "，".join(f"{k} {v}" for k, v in sorted(report["counts"].items(), key=lambda kv: str(kv[0]))),
+    ]
+    if report["missing_shards"]:
+        lines.append(f"[!] 缺少分片: {', '.join(report['missing_shards'])}")
+    for dup in report["duplicates"]:
+        if dup["reason"] == "same_key":
+            where = ", ".join(f"{r.get('node')}:{r.get('journal')}" for r in dup["records"])
+            lines.append(f"[!] 重复下载: {dup['key']} 在 {where}")
+        else:
+            lines.append(f"[!] 同一文件 md5={dup['md5']} 被多个条目下载: {', '.join(dup['keys'])}")
+    for conflict in report["conflicts"]:
+        lines.append(f"[!] 冲突: {conflict['key']} 下载了不同的文件 {', '.join(conflict['md5s'])}")
+    if report["misplaced"]:
+        lines.append(f"[!] {len(report['misplaced'])} 条记录不属于其声明的分片（各节点分片数或输入不一致？）")
+    if not (report["duplicates"] or report["conflicts"] or report["misplaced"] or report["missing_shards"]):
+        lines.append("[+] 没有重复或冲突")
+    return "\n".join(lines)
+
+
+__all__ = [
+    "ShardJournal",
+    "format_report",
+    "journal_paths",
+    "merge_journals",
+    "parse_shard",
+    "read_journal",
+    "shard_key",
+    "shard_of",
+]
@@ -0,0 +1,181 @@
+"""
+Throughput watchdog for transfers.
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+MONITOR_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class StallPolicy:
+    """min_speed 为字节/秒（<=0 表示关闭），window 为判定窗口（秒），grace 为起步宽限期（秒）。"""
+
+    min_speed: float = 1024
+    window: float = 60
+    grace: float = 30
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_speed > 0 and self.window > 0
+
+
+DEFAULT_STALL_POLICY = StallPolicy()
+
+
+def policy_from_args(args) -> StallPolicy:
+    """从 CLI 参数（--stall-speed KB/s、--stall-seconds、--stall-grace）构建策略；缺少参数时使用默认策略。"""
+    if getattr(args, "stall_speed", None) is None:
+        return DEFAULT_STALL_POLICY
+    return StallPolicy(
+        min_speed=args.stall_speed * 1024,
+        window=getattr(args, "stall_seconds", DEFAULT_STALL_POLICY.window),
+        grace=getattr(args, "stall_grace", DEFAULT_STALL_POLICY.grace),
+    )
+
+
+class StallWatchdog:
+    """
+    单个传输的速度监视：读取方调用 feed(已下载字节数)，check() 按滑动窗口计算平均速度，
+    宽限期后窗口内平均速度低于下限即置 stalled。check() 可由监视线程或读取方调用。
+    读超时只在完全没有数据时触发，每秒只送几个字节的镜像会让传输一直挂着，因此需要按速度判断。
+    """
+
+    def __init__(self, policy: StallPolicy, start_bytes: int = 0, clock=time.monotonic):
+        self.policy = policy
+        self.clock = clock
+        self.started = clock()
+        self.bytes = start_bytes
+        self.speed = None
+        self.stalled = False
+        self._samples = deque()
+        self._last_check = self.started
+        self._abort = None
+        self._lock = threading.Lock()
+
+    def feed(self, total_bytes: int) -> None:
+        self.bytes = total_bytes
+
+    def check(self, now: float | None = None) -> bool:
+        if not self.policy.enabled or self.stalled:
+            return self.stalled
+        now = self.clock() if now is None else now
+        with self._lock:
+            self._last_check = now
+            sample = (now, self.bytes)
+            if now - self.started < self.policy.grace:
+                # 宽限期内不判定，只保留最新的基准点
+                self._samples.clear()
+                self._samples.append(sample)
+                return False
+            self._samples.append(sample)
+            horizon = now - self.policy.window
+            while len(self._samples) > 1 and self._samples[1][0] <= horizon:
+                self._samples.popleft()
+            t0, b0 = self._samples[0]
+            if t0 > horizon:
+                return False  # 宽限期后的数据还不满一个窗口
+            self.speed = (self.bytes - b0) / (now - t0)
+            if self.speed < self.policy.min_speed:
+                self.stalled = True
+        if self.stalled and self._abort is not None:
+            try:
+                self._abort()
+            except Exception:
+                pass
+        return self.stalled
+
+    def check_due(self) -> bool:
+        """读取方在每个分块后调用：距上次检查超过 MONITOR_INTERVAL 才真正计算。"""
+        if self.clock() - self._last_check >= MONITOR_INTERVAL:
+            return self.check()
+        return self.stalled
+
+    def watch(self, resp):
+        """在监视线程中登记该 requests 响应；判定停滞时关闭其底层连接，使阻塞中的读取立即出错。"""
+        return _Watch(self, resp)
+
+
+class _Watch:
+    def __init__(self, watchdog: StallWatchdog, resp):
+        self.watchdog = watchdog
+        self.resp = resp
+
+    def __enter__(self):
+        if self.watchdog.policy.enabled:
+            self.watchdog._abort = lambda: _shutdown_response(self.resp)
+            MONITOR.register(self.watchdog)
+        return self.watchdog
+
+    def __exit__(self, *exc):
+        MONITOR.unregister(self.watchdog)
+        self.watchdog._abort = None
+        return False
+
+
+def _response_socket(resp):
+    raw = getattr(resp, "raw", None)
+    connection = getattr(raw, "connection", None) or getattr(raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        return sock
+    # Connection: close / HTTP/1.0 响应：http.client 已把 HTTPConnection.sock 置空，
+    # 套接字只能经由响应的文件对象（socket.makefile() 返回的 BufferedReader -> SocketIO）找到
+    fp = getattr(getattr(raw, "_fp", None), "fp", None)
+    return getattr(getattr(fp, "raw", None), "_sock", None)
+
+
+def _shutdown_response(resp) -> None:
+    # 跨线程 close() 不一定能唤醒阻塞在 recv 上的读取，shutdown() 可以
+    sock = _response_socket(resp)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+            return
+        except OSError:
+            pass
+    resp.close()
+
+
+class _Monitor:
+    """
+    所有进行中传输共用的监视线程：每 MONITOR_INTERVAL 秒检查一次，没有传输时退出。
+    判定停滞后关闭响应 socket 打断阻塞的读取，调用方换下一个镜像并从 .part 续传。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watchdogs = set()
+        self._thread = None
+
+    def register(self, watchdog: StallWatchdog) -> None:
+        with self._lock:
+            self._watchdogs.add(watchdog)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="stall-watchdog", daemon=True)
+                self._thread.start()
+
+    def unregister(self, watchdog: StallWatchdog) -> None:
+        with self._lock:
+            self._watchdogs.discard(watchdog)
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(MONITOR_INTERVAL)
+            with self._lock:
+                if not self._watchdogs:
+                    self._thread = None
+                    return
+                watchdogs = list(self._watchdogs)
+            for watchdog in watchdogs:
+                watchdog.check()
+
+
+MONITOR = _Monitor()
+
+
+__all__ = ["DEFAULT_STALL_POLICY", "StallPolicy", "StallWatchdog", "policy_from_args"]